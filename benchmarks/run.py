@@ -0,0 +1,257 @@
+"""Microbenchmarks for caveclaw's hot paths.
+
+Standalone (no pytest-benchmark needed):
+
+    python benchmarks/run.py                     # 1K and 100K-line sessions
+    python benchmarks/run.py --full              # adds 1M-line sessions
+    python benchmarks/run.py --output new.json --compare old.json
+    python benchmarks/run.py -k split            # only cases whose name contains "split"
+
+All data is generated from fixed seeds into a scratch CAVECLAW_DIR, so results
+are comparable between commits. Each case reports the best and median of
+several repeats, per call.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+from collections.abc import Callable
+from pathlib import Path
+
+# Must be set before caveclaw.config computes its paths
+SCRATCH = Path(tempfile.mkdtemp(prefix="caveclaw-microbench-"))
+os.environ["CAVECLAW_DIR"] = str(SCRATCH)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from caveclaw import db, session  # noqa: E402
+from caveclaw.agent import _build_system_prompt  # noqa: E402
+from caveclaw.channels.discord import _resolve_agent, _split_message  # noqa: E402
+from caveclaw.config import AgentConfig, Config  # noqa: E402
+
+REPEAT = 5
+WORDS = "the of and to in is you that it he was for on are as with his they at be this from".split()
+
+
+# --- Synthetic data ---
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_session(sessions_dir: Path, key: str, lines: int, seed: int = 1) -> None:
+    """A session file with `lines` alternating user/assistant turns."""
+    rng = random.Random(seed)
+    with session.get_or_create(key, sessions_dir).open("w") as f:
+        for i in range(lines):
+            role = "user" if i % 2 == 0 else "assistant"
+            f.write(json.dumps({"ts": 1.7e9 + i, "role": role, "content": _sentence(rng, 20)}) + "\n")
+
+
+def make_memory(workspace: Path, items: int, seed: int = 2) -> None:
+    """A MEMORY.md with a pinned core and `items` bullets over 20 sections."""
+    rng = random.Random(seed)
+    workspace.mkdir(parents=True, exist_ok=True)
+    parts = ["## Core\n- user is Sam\n- prefers metric units\n"]
+    for section in range(20):
+        bullets = "\n".join(f"- note {section}-{i}: {_sentence(rng, 12)}" for i in range(items // 20))
+        parts.append(f"## Topic {section}\n{bullets}\n")
+    (workspace / "SOUL.md").write_text("# Soul\n\nYou are a benchmark agent.\n")
+    (workspace / "MEMORY.md").write_text("\n".join(parts))
+
+
+def make_reply(size: int, seed: int = 3) -> str:
+    """Markdown of about `size` bytes: paragraphs with a code block every few."""
+    rng = random.Random(seed)
+    chunks: list[str] = []
+    total = 0
+    while total < size:
+        if rng.random() < 0.2:
+            chunk = "```python\n" + "\n".join(f"x{i} = {i}" for i in range(rng.randint(3, 30))) + "\n```"
+        else:
+            chunk = " ".join(_sentence(rng, 15) for _ in range(rng.randint(1, 6)))
+        chunks.append(chunk)
+        total += len(chunk) + 2
+    return "\n\n".join(chunks)[:size]
+
+
+# --- Timing ---
+
+
+def measure(fn: Callable[[], object], repeat: int = REPEAT) -> dict[str, float]:
+    """Time `fn` per call: auto-ranged loop count, best and median of `repeat`."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    runs = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "best_us": min(runs) * 1e6,
+        "median_us": statistics.median(runs) * 1e6,
+        "loops": number,
+    }
+
+
+def contention(op: Callable[[int, int], object], threads: int, ops: int) -> dict[str, float]:
+    """Run `op(thread, i)` `ops` times in each of `threads` threads; report per-op time."""
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(n: int) -> None:
+        barrier.wait()
+        for i in range(ops):
+            op(n, i)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    per_op = elapsed / (threads * ops)
+    return {"best_us": per_op * 1e6, "median_us": per_op * 1e6, "loops": threads * ops}
+
+
+# --- Cases ---
+
+
+def cases(full: bool) -> dict[str, Callable[[], dict[str, float]]]:
+    out: dict[str, Callable[[], dict[str, float]]] = {}
+    sessions_dir = SCRATCH / "sessions"
+
+    sizes = [1_000, 100_000] + ([1_000_000] if full else [])
+    for lines in sizes:
+        key = f"s{lines}"
+
+        def history(key: str = key, lines: int = lines) -> dict[str, float]:
+            make_session(sessions_dir, key, lines)
+            return measure(lambda: session.get_history(key, limit=50, sessions_dir=sessions_dir))
+
+        def append(key: str = key, lines: int = lines) -> dict[str, float]:
+            make_session(sessions_dir, key, lines)
+            return measure(lambda: session.append(key, "user", "hello there", sessions_dir=sessions_dir))
+
+        out[f"session.get_history[{lines}]"] = history
+        out[f"session.append[{lines}]"] = append
+
+    def prompt(mode: str, items: int) -> Callable[[], dict[str, float]]:
+        def run() -> dict[str, float]:
+            workspace = SCRATCH / f"ws-{mode}-{items}"
+            make_memory(workspace, items)
+            cfg = AgentConfig(memory_mode=mode)
+            return measure(lambda: _build_system_prompt(workspace, "what about topic 7 notes", cfg))
+        return run
+
+    for items in (1_000, 20_000):
+        out[f"system_prompt.full[{items}]"] = prompt("full", items)
+        out[f"system_prompt.structured[{items}]"] = prompt("structured", items)
+
+    for size in (1_000, 64_000, 1_000_000):
+        text = make_reply(size)
+        out[f"split_message[{size}]"] = lambda text=text: measure(lambda: _split_message(text, 2000))
+
+    def state_setup() -> None:
+        db.init_db()
+        db.set_many({f"k{i}": str(i) for i in range(1000)}, namespace="bench")
+
+    def state_reads() -> dict[str, float]:
+        state_setup()
+        return contention(lambda n, i: db.get_state(f"k{i % 1000}", namespace="bench"), threads=8, ops=2000)
+
+    def state_reads_fresh() -> dict[str, float]:
+        state_setup()
+        return contention(lambda n, i: db.get_state(f"k{i % 1000}", namespace="bench", fresh=True), threads=8, ops=500)
+
+    def state_mixed() -> dict[str, float]:
+        state_setup()
+
+        def op(n: int, i: int) -> None:
+            if n % 4 == 0:
+                db.set_state(f"k{i % 1000}", str(i), namespace="bench")
+            else:
+                db.get_state(f"k{i % 1000}", namespace="bench")
+
+        return contention(op, threads=8, ops=500)
+
+    out["db.get_state[8 threads]"] = state_reads
+    out["db.get_state.fresh[8 threads]"] = state_reads_fresh
+    out["db.mixed_25pct_writes[8 threads]"] = state_mixed
+
+    def resolve_agent() -> dict[str, float]:
+        state_setup()
+        db.set_state("111", "grocer", namespace="channel")
+        config = Config(discord_routing={str(i): "shadow" for i in range(100)})
+        return measure(lambda: (_resolve_agent("111", config), _resolve_agent("42", config)))
+
+    out["discord._resolve_agent"] = resolve_agent
+    return out
+
+
+# --- Reporting ---
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _format(us: float) -> str:
+    if us >= 1e6:
+        return f"{us / 1e6:.2f} s"
+    if us >= 1e3:
+        return f"{us / 1e3:.2f} ms"
+    return f"{us:.2f} us"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--full", action="store_true", help="include 1M-line session files")
+    parser.add_argument("-k", dest="filter", help="only run cases whose name contains this")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--compare", type=Path, help="JSON results from an earlier run")
+    args = parser.parse_args()
+
+    baseline = json.loads(args.compare.read_text())["results"] if args.compare else {}
+    results: dict[str, dict[str, float]] = {}
+    try:
+        for name, case in cases(args.full).items():
+            if args.filter and args.filter not in name:
+                continue
+            results[name] = case()
+            line = f"{name:40} {_format(results[name]['median_us']):>12}"
+            if name in baseline:
+                ratio = results[name]["median_us"] / baseline[name]["median_us"]
+                line += f"  {ratio:6.2f}x"
+            print(line, flush=True)
+    finally:
+        db.close_db()
+        shutil.rmtree(SCRATCH, ignore_errors=True)
+
+    if args.output:
+        args.output.write_text(json.dumps({
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.time(),
+            "results": results,
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
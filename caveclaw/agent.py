@@ -3,7 +3,11 @@
 from __future__ import annotations
 
 import asyncio
+import logging
+import time
+from collections.abc import Callable
 from pathlib import Path
+from typing import Any
 
 from claude_agent_sdk import (
     AssistantMessage,
@@ -14,24 +18,57 @@ from claude_agent_sdk import (
 )
 
 from caveclaw import memory as mem
-from caveclaw.bus import Attachment, InboundMessage, MessageBus, OutboundMessage
-from caveclaw.config import Config, resolve_agent_config
-from caveclaw import session
+from caveclaw.bus import Attachment, BusClosed, InboundMessage, MessageBus, OutboundMessage
+from caveclaw.config import AgentConfig, Config
+from caveclaw.log import correlation_id
+from caveclaw import cache, degrade, session, summarize
+from caveclaw.registry import compose_system_prompt, registry
+from caveclaw.reload import ConfigWatcher
+from caveclaw.router import route_message
 
+logger = logging.getLogger(__name__)
 
-def _build_system_prompt(workspace: Path) -> str:
-    """Combine SOUL.md + MEMORY.md into a system prompt."""
-    parts: list[str] = []
+# Stored (and sent) in place of a reply abandoned at shutdown
+INTERRUPTED_REPLY = "(interrupted: the service restarted before this reply finished — please send it again)"
+
+
+def _fake_client() -> Callable[..., Any]:
+    from caveclaw.fakesdk import FakeSDKClient
+
+    return FakeSDKClient
 
-    soul_path = workspace / "SOUL.md"
-    if soul_path.exists():
-        parts.append(soul_path.read_text().strip())
 
-    memory_text = mem.read_memory(workspace)
-    if memory_text:
-        parts.append(f"## Memory\n\n{memory_text.strip()}")
+# Config.model_backend -> factory returning the SDK client class. "fake" answers
+# locally with simulated latency, for benchmarks and offline runs.
+MODEL_BACKENDS: dict[str, Callable[[], Callable[..., Any]]] = {
+    "claude": lambda: ClaudeSDKClient,
+    "fake": _fake_client,
+}
 
-    return "\n\n".join(parts) if parts else ""
+
+def _build_system_prompt(
+    workspace: Path, query: str = "", agent_cfg: AgentConfig | None = None
+) -> str:
+    """Combine SOUL.md + MEMORY.md into a system prompt, reading both from disk.
+
+    In structured memory mode only the pinned core and the items relevant to
+    `query` are included, up to the agent's token budget. `handle_message`
+    uses the cached equivalent, `AgentDescriptor.system_prompt`.
+    """
+    soul_path = workspace / "SOUL.md"
+    soul = soul_path.read_text() if soul_path.exists() else ""
+
+    if agent_cfg and agent_cfg.memory_mode == "structured":
+        memory_text = mem.select_memory(
+            workspace,
+            query,
+            top_k=agent_cfg.memory_top_k,
+            token_budget=agent_cfg.memory_token_budget,
+            pinned_sections=tuple(agent_cfg.memory_pinned_sections),
+        )
+    else:
+        memory_text = mem.read_memory(workspace)
+    return compose_system_prompt(soul, memory_text)
 
 
 def _build_attachment_prompt(attachments: list[Attachment]) -> str:
@@ -45,6 +82,15 @@ def _build_attachment_prompt(attachments: list[Attachment]) -> str:
     return "\n".join(lines)
 
 
+def _attachment_meta(att: Attachment) -> dict:
+    """Session metadata for an attachment, including the original if optimized."""
+    meta = {"filename": att.filename, "path": att.path, "content_type": att.content_type, "size": att.size}
+    if att.original_path:
+        meta["original_path"] = att.original_path
+        meta["original_size"] = att.original_size
+    return meta
+
+
 def _extract_text(message: AssistantMessage) -> str:
     """Pull text content out of an AssistantMessage."""
     texts = []
@@ -58,91 +104,215 @@ async def handle_message(
     message: InboundMessage,
     config: Config,
     bus: MessageBus,
+    client_factory: Callable[..., Any] | None = None,
+    plan: degrade.Plan = degrade.NORMAL,
 ) -> None:
-    """Process one inbound message through the appropriate agent."""
-    model, workspace = resolve_agent_config(config, message.agent_name)
-    sessions_dir = workspace / "sessions"
-    system_prompt = _build_system_prompt(workspace)
+    """Process one inbound message through the appropriate agent.
+
+    `client_factory` replaces the SDK client class (default: per `model_backend`).
+    `plan` says what to cut when the gateway is under load.
+    """
+    message.timings["started"] = time.monotonic()
+    agent = registry.get(config, message.agent_name)
+    model, workspace, sessions_dir = agent.model, agent.workspace, agent.sessions_dir
+    system_prompt = agent.system_prompt(message.content)
 
     # Load conversation history before appending the new message
-    history = session.get_history(message.chat_id, limit=50, sessions_dir=sessions_dir)
+    history = session.get_entries(message.chat_id, limit=plan.history_turns or 50, sessions_dir=sessions_dir)
+    summarizer = summarize.get_summarizer(config)
+    summary = summarize.load_summary(message.chat_id, sessions_dir) if summarizer else None
+    if summary:
+        # Turns folded into the summary are replaced by it
+        history = [h for h in history if h.ts > summary.upto_ts]
+        system_prompt += "\n\n## Conversation Summary\n\n" + summary.text
+    history_text = ""
     if history:
         lines = []
         for h in history:
-            prefix = "User" if h["role"] == "user" else "Assistant"
-            text = h["content"]
-            if h.get("attachments"):
-                filenames = ", ".join(a["filename"] for a in h["attachments"])
+            prefix = "User" if h.role == "user" else "Assistant"
+            text = h.content
+            if h.attachments:
+                filenames = ", ".join(a["filename"] for a in h.attachments)
                 text += f" [attached: {filenames}]"
             lines.append(f"{prefix}: {text}")
-        system_prompt += "\n\n## Conversation History\n\n" + "\n\n".join(lines)
+        history_text = "\n\n".join(lines)
+        system_prompt += "\n\n## Conversation History\n\n" + history_text
 
     # Build the query text, appending attachment instructions if present
     query_text = message.content
     query_text += _build_attachment_prompt(message.attachments)
 
     # Persist the user message with attachment metadata
-    att_meta = [
-        {"filename": a.filename, "path": a.path, "content_type": a.content_type, "size": a.size}
-        for a in message.attachments
-    ] if message.attachments else None
-    session.append(message.chat_id, "user", query_text, sessions_dir=sessions_dir, attachments=att_meta)
+    att_meta = [_attachment_meta(a) for a in message.attachments] if message.attachments else None
+    session.append(message.chat_id, "user", query_text, sessions_dir=sessions_dir, attachments=att_meta, agent=agent.name)
+
+    route = None
+    rules = agent.agent_config.routing if agent.agent_config else None
+    if rules:
+        route = route_message(message.content, bool(message.attachments), len(history), model, rules)
+        model = route.model
+    if plan.fast_model:
+        model = (config.degrade and config.degrade.fast_model) or (rules and rules.fast_model) or model
 
     options = ClaudeAgentOptions(
         system_prompt=system_prompt,
         cwd=str(workspace),
         model=model,
-        permission_mode="bypassPermissions",
+        **agent.sdk_options,
     )
 
     result_text = ""
+    # Opt-in: a cached reply to the same prompt skips the model entirely
+    cache_cfg = agent.agent_config.response_cache if agent.agent_config else None
+    key = cached = None
+    if cache_cfg:
+        key = cache.cache_key(
+            agent, model, message.content, message.attachments,
+            history_text if cache_cfg.include_history else "",
+        )
+        cached = await cache.lookup(key)
 
-    async with ClaudeSDKClient(options=options) as client:
-        await client.query(query_text)
-        async for msg in client.receive_response():
-            if isinstance(msg, AssistantMessage):
-                text = _extract_text(msg)
-                if text:
-                    result_text = text
-            elif isinstance(msg, ResultMessage):
-                if hasattr(msg, "text") and msg.text:
-                    result_text = msg.text
+    message.timings["model_start"] = time.monotonic()
+    if cached is not None:
+        result_text = cached
+    else:
+        client_factory = client_factory or MODEL_BACKENDS[config.model_backend]()
+        try:
+            async with client_factory(options=options) as client:
+                await client.query(query_text)
+                async for msg in client.receive_response():
+                    if isinstance(msg, AssistantMessage):
+                        text = _extract_text(msg)
+                        if text:
+                            result_text = text
+                            bus.publish_partial(_reply_to(message, text))
+                    elif isinstance(msg, ResultMessage):
+                        if hasattr(msg, "text") and msg.text:
+                            result_text = msg.text
+        except asyncio.CancelledError:
+            # Abandoned at shutdown: the user message is already persisted, so mark
+            # it as unanswered rather than leaving a dangling turn
+            session.append(
+                message.chat_id, "assistant", INTERRUPTED_REPLY, sessions_dir=sessions_dir,
+                meta={"interrupted": True}, agent=agent.name,
+            )
+            await bus.publish_outbound(_reply_to(message, INTERRUPTED_REPLY, error=True))
+            logger.info("Interrupted a reply at shutdown", extra={"chat_id": message.chat_id})
+            raise
 
+    message.timings["model_end"] = time.monotonic()
     if not result_text:
         result_text = "(no response)"
 
-    # Persist the assistant message
-    session.append(message.chat_id, "assistant", result_text, sessions_dir=sessions_dir)
+    if cached is None:
+        # The agent may have edited its own SOUL/TOOLS/MEMORY files during the turn
+        registry.invalidate(message.agent_name)
 
-    # Log to HISTORY.md
-    mem.append_history(workspace, f"Responded to {message.sender_id} in {message.channel}")
+    # Persist the assistant message, with the model actually used and why, so
+    # savings can be measured
+    meta = None
+    if route or plan.level:
+        latency = message.timings["model_end"] - message.timings["model_start"]
+        meta = {"model": model}
+        if route:
+            meta["route"] = route.tier
+            meta["route_reason"] = route.reason
+        if plan.level:
+            meta["degraded"] = plan.name
+        meta["latency_ms"] = round(latency * 1000)
+    if cached is not None:
+        meta = {**(meta or {}), "cached": True}
+    session.append(
+        message.chat_id, "assistant", result_text, sessions_dir=sessions_dir, meta=meta, agent=agent.name,
+    )
+    if not plan.skip_extras:
+        if summarizer:
+            summarizer.maybe_schedule(message.chat_id, sessions_dir)
+        # Log to HISTORY.md
+        mem.append_history(workspace, f"Responded to {message.sender_id} in {message.channel}")
 
-    await bus.publish_outbound(
-        OutboundMessage(
-            channel=message.channel,
-            chat_id=message.chat_id,
-            content=result_text,
-        )
+    await bus.publish_outbound(_reply_to(message, result_text))
+    logger.debug("Replied", extra={
+        "agent": agent.name, "model": model, "cached": cached is not None,
+        "ms": round((time.monotonic() - message.timings["started"]) * 1000),
+    })
+    if key and cached is None and result_text != "(no response)":
+        await cache.store(key, agent.name, result_text, cache_cfg)
+
+
+def _reply_to(message: InboundMessage, content: str, error: bool = False) -> OutboundMessage:
+    return OutboundMessage(
+        channel=message.channel, chat_id=message.chat_id, content=content,
+        correlation_id=message.correlation_id, error=error,
     )
 
 
 async def _safe_handle(
-    message: InboundMessage, config: Config, bus: MessageBus
+    message: InboundMessage,
+    config: Config,
+    bus: MessageBus,
+    client_factory: Callable[..., Any] | None = None,
+    plan: degrade.Plan = degrade.NORMAL,
 ) -> None:
+    correlation_id.set(message.correlation_id)  # this task's context only
+    logger.debug("Handling message", extra={
+        "channel": message.channel, "chat_id": message.chat_id, "agent": message.agent_name,
+    })
     try:
-        await handle_message(message, config, bus)
+        await handle_message(message, config, bus, client_factory, plan)
     except Exception as e:
-        await bus.publish_outbound(
-            OutboundMessage(
-                channel=message.channel,
-                chat_id=message.chat_id,
-                content=f"Error: {e}",
-            )
-        )
+        logger.exception("Handling message failed")
+        await bus.publish_outbound(_reply_to(message, f"Error: {e}", error=True))
 
 
-async def agent_loop(config: Config, bus: MessageBus) -> None:
-    """Main loop: consume inbound messages and dispatch concurrently."""
-    while True:
-        message = await bus.consume_inbound()
-        asyncio.create_task(_safe_handle(message, config, bus))
+async def agent_loop(
+    config: Config,
+    bus: MessageBus,
+    watcher: ConfigWatcher | None = None,
+    client_factory: Callable[..., Any] | None = None,
+) -> None:
+    """Main loop: consume inbound messages and dispatch concurrently.
+
+    With a `watcher`, each message is handled with the config snapshot that
+    was current when it was dequeued. With `config.degrade`, the load seen
+    at dequeue decides how much work each message gets.
+
+    Returns once the bus is closed and every message already handed to it has
+    been handled. If cancelled instead, in-flight messages are cancelled too
+    and recorded as interrupted.
+    """
+    mem.configure_history(config.history_max_bytes, config.history_rotate_daily)
+    flusher = asyncio.create_task(mem.run_history_flusher())
+    load = degrade.LoadController()
+    in_flight: set[asyncio.Task[None]] = set()
+    try:
+        while True:
+            try:
+                message = await bus.consume_inbound()
+            except BusClosed:
+                break
+            dequeued = message.timings["dequeued"] = time.monotonic()
+            if watcher is not None and watcher.current is not config:
+                config = watcher.current
+                mem.configure_history(config.history_max_bytes, config.history_rotate_daily)
+            plan = degrade.NORMAL
+            if config.degrade:
+                plan = load.observe(len(in_flight), dequeued - message.created_at, config.degrade)
+                if plan.shed:
+                    await bus.publish_outbound(_reply_to(message, config.degrade.busy_message))
+                    continue
+            task = asyncio.create_task(_safe_handle(message, config, bus, client_factory, plan))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            logger.info("Draining %d in-flight messages", len(in_flight))
+            await asyncio.wait(in_flight)
+    finally:
+        for task in in_flight:
+            task.cancel()
+        if in_flight:
+            logger.warning("Interrupting %d in-flight messages", len(in_flight))
+            await asyncio.wait(in_flight)
+        flusher.cancel()
+        degrade.deactivate(load)
+        mem.flush_history()
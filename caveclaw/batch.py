@@ -0,0 +1,149 @@
+"""Batch mode — push a JSONL file of prompts through an agent (`caveclaw run`).
+
+Each input line is ``{"id": ..., "prompt": ...}`` with optional ``agent`` and
+``chat_id``. Lines are read lazily, at most `concurrency` prompts are in
+flight, and each result is appended to the output file as soon as it
+completes. Rerunning with the same output skips ids that already succeeded.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any
+
+from caveclaw.agent import agent_loop
+from caveclaw.bus import InboundMessage, MessageBus
+from caveclaw.config import Config
+
+CHANNEL = "batch"
+ITEM_TIMEOUT_SECONDS = 600.0
+
+
+@dataclass
+class BatchStats:
+    done: int = 0
+    failed: int = 0
+    skipped: int = 0
+    elapsed: float = 0.0
+
+
+def completed_ids(output: Path) -> set[str]:
+    """Ids with a successful result in an existing output file."""
+    ids: set[str] = set()
+    if not output.exists():
+        return ids
+    with output.open() as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # a line cut short by an interrupted run
+            if "error" not in record:
+                ids.add(str(record["id"]))
+    return ids
+
+
+def read_items(input_path: Path) -> Iterator[dict[str, Any]]:
+    """Yield input records one at a time; ids default to the line number."""
+    with input_path.open() as f:
+        for lineno, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"{input_path}:{lineno}: skipping invalid JSON ({e})")
+                continue
+            if "prompt" not in item:
+                print(f"{input_path}:{lineno}: skipping record without a prompt")
+                continue
+            item["id"] = str(item.get("id", lineno))
+            yield item
+
+
+async def _run_item(
+    bus: MessageBus, item: dict[str, Any], agent: str, timeout: float
+) -> dict[str, Any]:
+    chat_id = item.get("chat_id") or f"batch-{item['id']}"
+    agent_name = item.get("agent") or agent
+    message = InboundMessage(
+        channel=CHANNEL,
+        sender_id="batch",
+        chat_id=chat_id,
+        content=item["prompt"],
+        agent_name=agent_name,
+    )
+    # Records may share a chat_id, so match the reply to this message
+    reply = bus.expect_reply(CHANNEL, chat_id, consume=True, correlation_id=message.correlation_id)
+    started = time.monotonic()
+    await bus.publish_inbound(message)
+    record: dict[str, Any] = {"id": item["id"], "agent": agent_name}
+    try:
+        answer = await asyncio.wait_for(reply, timeout)
+    except asyncio.TimeoutError:
+        record["error"] = "timed out"
+    else:
+        # Failed turns are recorded as errors so a rerun retries them
+        record["error" if answer.error else "reply"] = answer.content
+    record["elapsed"] = round(time.monotonic() - started, 3)
+    return record
+
+
+def _write(out: IO[str], record: dict[str, Any]) -> None:
+    out.write(json.dumps(record) + "\n")
+    out.flush()
+
+
+async def run_batch(
+    config: Config,
+    agent: str,
+    input_path: Path,
+    output_path: Path,
+    concurrency: int = 4,
+    timeout: float = ITEM_TIMEOUT_SECONDS,
+) -> BatchStats:
+    """Run every pending prompt in `input_path`, appending results to `output_path`."""
+    stats = BatchStats()
+    skip = completed_ids(output_path)
+    started = time.monotonic()
+    bus = MessageBus()
+    loop_task = asyncio.create_task(agent_loop(config, bus))
+    semaphore = asyncio.Semaphore(concurrency)
+    running: set[asyncio.Task[None]] = set()
+
+    async def worker(item: dict[str, Any], out: IO[str]) -> None:
+        try:
+            record = await _run_item(bus, item, agent, timeout)
+        except Exception as e:
+            record = {"id": item["id"], "error": str(e)}
+        finally:
+            semaphore.release()
+        if "error" in record:
+            stats.failed += 1
+        else:
+            stats.done += 1
+        _write(out, record)
+
+    try:
+        with output_path.open("a") as out:
+            for item in read_items(input_path):
+                if item["id"] in skip:
+                    stats.skipped += 1
+                    continue
+                skip.add(item["id"])  # duplicate ids in the input run once
+                # Waiting here keeps reading lazy: one line per free slot
+                await semaphore.acquire()
+                task = asyncio.create_task(worker(item, out))
+                running.add(task)
+                task.add_done_callback(running.discard)
+            if running:
+                await asyncio.gather(*running)
+    finally:
+        loop_task.cancel()
+    stats.elapsed = time.monotonic() - started
+    return stats
@@ -0,0 +1,204 @@
+"""End-to-end pipeline benchmark (`caveclaw bench`).
+
+Drives MessageBus -> agent_loop -> a fake Discord sender with the fake SDK
+client, so the numbers are caveclaw's own overhead plus the simulated model
+latency. Traffic is synthetic or replayed from session JSONL files, published
+open-loop at a target rate. Agent workspaces live in a scratch directory.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+from caveclaw import config as config_mod
+from caveclaw import db
+from caveclaw.agent import agent_loop
+from caveclaw.bus import InboundMessage, MessageBus
+from caveclaw.config import Config
+from caveclaw.fakesdk import FakeProfile, FakeSDKClient
+
+CHANNEL = "bench"
+
+# Stage name -> (start mark, end mark). "created"/"sent" are set by the bench,
+# the others by agent_loop and handle_message.
+STAGES = {
+    "queue": ("created", "dequeued"),
+    "prepare": ("dequeued", "model_start"),
+    "model": ("model_start", "model_end"),
+    "finish": ("model_end", "replied"),
+    "deliver": ("replied", "sent"),
+    "total": ("created", "sent"),
+}
+
+
+@dataclass(frozen=True)
+class Request:
+    chat_id: str
+    content: str
+
+
+@dataclass
+class StageStats:
+    count: int
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+@dataclass
+class BenchReport:
+    requests: int
+    completed: int
+    elapsed: float
+    throughput: float  # completed requests per second
+    stages: dict[str, StageStats] = field(default_factory=dict)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "completed": self.completed,
+            "elapsed": round(self.elapsed, 3),
+            "throughput": round(self.throughput, 2),
+            "stages": {
+                name: {k: round(v, 3) if isinstance(v, float) else v for k, v in vars(s).items()}
+                for name, s in self.stages.items()
+            },
+        }
+
+
+def stage_stats(samples: list[float]) -> StageStats:
+    """Summarize durations in seconds as milliseconds."""
+    ms = sorted(s * 1000 for s in samples)
+    if len(ms) == 1:
+        p50 = p95 = p99 = ms[0]
+    else:
+        cuts = statistics.quantiles(ms, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    return StageStats(len(ms), statistics.fmean(ms), p50, p95, p99, ms[-1])
+
+
+def synthetic_traffic(requests: int, chats: int) -> list[Request]:
+    """`requests` prompts spread round-robin over `chats` conversations."""
+    return [
+        Request(chat_id=f"bench-{i % chats}", content=f"Synthetic request {i}: what should I cook tonight?")
+        for i in range(requests)
+    ]
+
+
+def replay_traffic(paths: list[Path]) -> list[Request]:
+    """User turns from recorded session files, one conversation per file, interleaved."""
+    per_chat: list[list[Request]] = []
+    for n, path in enumerate(paths):
+        turns = []
+        for line in path.read_text().splitlines():
+            entry = json.loads(line)
+            if entry.get("role") == "user":
+                turns.append(Request(chat_id=f"replay-{n}", content=entry["content"]))
+        per_chat.append(turns)
+    requests: list[Request] = []
+    for i in range(max((len(t) for t in per_chat), default=0)):
+        requests.extend(turns[i] for turns in per_chat if i < len(turns))
+    return requests
+
+
+@contextmanager
+def scratch_agents(workdir: Path | None) -> Iterator[Path]:
+    """Point agent provisioning and the database at a scratch directory for the run."""
+    with tempfile.TemporaryDirectory(prefix="caveclaw-bench-") as tmp:
+        root = workdir or Path(tmp)
+        saved = config_mod.AGENTS_DIR, db.DB_PATH
+        config_mod.AGENTS_DIR = root / "agents"
+        db.DB_PATH = root / "caveclaw.db"
+        db.init_db()
+        try:
+            yield root
+        finally:
+            db.close_db()
+            config_mod.AGENTS_DIR, db.DB_PATH = saved
+
+
+async def _fake_sender(
+    bus: MessageBus,
+    pending: dict[str, InboundMessage],
+    samples: dict[str, list[float]],
+    send_ms: float,
+    done: asyncio.Event,
+    total: int,
+) -> None:
+    """Stand-in for the Discord outbound sender that records stage timings."""
+    completed = 0
+    while completed < total:
+        out = await bus.consume_outbound()
+        if send_ms:
+            await asyncio.sleep(send_ms / 1000)
+        # Turns in one chat may overlap, so match on the message, not the chat
+        msg = pending.pop(out.correlation_id, None)
+        if msg is None:
+            continue
+        msg.timings.update(created=msg.created_at, replied=out.created_at, sent=time.monotonic())
+        for stage, (start, end) in STAGES.items():
+            if start in msg.timings and end in msg.timings:
+                samples[stage].append(msg.timings[end] - msg.timings[start])
+        completed += 1
+    done.set()
+
+
+async def run_bench(
+    config: Config,
+    traffic: list[Request],
+    rate: float,
+    profile: FakeProfile = FakeProfile(),
+    agent: str = "claw",
+    send_ms: float = 0.0,
+    timeout: float = 300.0,
+) -> BenchReport:
+    """Publish `traffic` at `rate` requests/second and measure each stage."""
+    bus = MessageBus()
+    samples: dict[str, list[float]] = {stage: [] for stage in STAGES}
+    pending: dict[str, InboundMessage] = {}
+    done = asyncio.Event()
+    loop_task = asyncio.create_task(
+        agent_loop(config, bus, client_factory=partial(FakeSDKClient, profile=profile))
+    )
+    sender = asyncio.create_task(_fake_sender(bus, pending, samples, send_ms, done, len(traffic)))
+    started = time.monotonic()
+    try:
+        for i, req in enumerate(traffic):
+            # Open loop: send on schedule whether or not earlier requests finished
+            delay = started + i / rate - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            msg = InboundMessage(
+                channel=CHANNEL, sender_id="bench", chat_id=req.chat_id,
+                content=req.content, agent_name=agent,
+            )
+            pending[msg.correlation_id] = msg
+            await bus.publish_inbound(msg)
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Benchmark timed out after {timeout:.0f}s")
+    finally:
+        elapsed = time.monotonic() - started
+        loop_task.cancel()
+        sender.cancel()
+    completed = len(samples["total"])
+    return BenchReport(
+        requests=len(traffic),
+        completed=completed,
+        elapsed=elapsed,
+        throughput=completed / elapsed if elapsed else 0.0,
+        stages={stage: stage_stats(s) for stage, s in samples.items() if s},
+    )
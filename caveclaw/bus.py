@@ -3,19 +3,31 @@
 from __future__ import annotations
 
 import asyncio
+import time
+import uuid
 from dataclasses import dataclass, field
 
 
-@dataclass
+def new_correlation_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+class BusClosed(Exception):
+    """The bus was closed for shutdown and accepts no more inbound messages."""
+
+
+@dataclass(slots=True)
 class Attachment:
     """A file attachment downloaded to local disk."""
     path: str
     filename: str
     content_type: str
     size: int
+    original_path: str | None = None  # set when `path` is an optimized copy
+    original_size: int | None = None
 
 
-@dataclass
+@dataclass(slots=True)
 class InboundMessage:
     channel: str
     sender_id: str
@@ -23,28 +35,113 @@ class InboundMessage:
     content: str
     agent_name: str = "claw"
     attachments: list[Attachment] = field(default_factory=list)
+    # time.monotonic() when the message was created, and when it reached each
+    # processing stage (see caveclaw.bench)
+    created_at: float = field(default_factory=time.monotonic, compare=False, repr=False)
+    timings: dict[str, float] = field(default_factory=dict, compare=False, repr=False)
+    # Assigned at ingress and carried onto replies and log records (see caveclaw.log)
+    correlation_id: str = field(default_factory=new_correlation_id, compare=False)
 
 
-@dataclass
+@dataclass(slots=True)
 class OutboundMessage:
     channel: str
     chat_id: str
     content: str
+    created_at: float = field(default_factory=time.monotonic, compare=False, repr=False)
+    correlation_id: str | None = field(default=None, compare=False)  # of the message being answered
+    error: bool = False  # an error or interruption notice rather than a reply
 
 
 class MessageBus:
     def __init__(self) -> None:
-        self._inbound: asyncio.Queue[InboundMessage] = asyncio.Queue()
+        self._inbound: asyncio.Queue[InboundMessage | None] = asyncio.Queue()  # None marks close()
         self._outbound: asyncio.Queue[OutboundMessage] = asyncio.Queue()
+        # Keyed by (channel, chat_id), or by correlation id for callers that
+        # may have several messages in flight for one chat
+        self._waiters: dict[tuple[str, str] | str, list[tuple[asyncio.Future[OutboundMessage], bool]]] = {}
+        self._streams: dict[tuple[str, str] | str, asyncio.Queue[OutboundMessage]] = {}
+        self.closed = False
+
+    def close(self) -> None:
+        """Stop accepting inbound messages. Consumers still get what was already queued,
+        then `consume_inbound` raises BusClosed. Outbound keeps working."""
+        if not self.closed:
+            self.closed = True
+            self._inbound.put_nowait(None)
+
+    def expect_reply(
+        self, channel: str, chat_id: str, consume: bool = False, correlation_id: str | None = None
+    ) -> asyncio.Future[OutboundMessage]:
+        """Return a future resolved by the next outbound message for this chat.
+
+        With `correlation_id`, only the reply to that inbound message resolves
+        it, however many other messages for the chat are in flight. With
+        `consume`, that message is handed only to the future and never
+        reaches the outbound queue — for callers that deliver replies themselves.
+        """
+        future: asyncio.Future[OutboundMessage] = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(correlation_id or (channel, chat_id), []).append((future, consume))
+        return future
+
+    def open_stream(
+        self,
+        channel: str,
+        chat_id: str,
+        queue: asyncio.Queue[OutboundMessage] | None = None,
+        correlation_id: str | None = None,
+    ) -> asyncio.Queue[OutboundMessage]:
+        """Route this chat's (or this message's) partial replies to `queue` (or a new one) until `close_stream`."""
+        return self._streams.setdefault(correlation_id or (channel, chat_id), queue or asyncio.Queue())
+
+    def close_stream(self, channel: str, chat_id: str, correlation_id: str | None = None) -> None:
+        self._streams.pop(correlation_id or (channel, chat_id), None)
+
+    def publish_partial(self, msg: OutboundMessage) -> None:
+        """Offer intermediate text to a stream, if anyone opened one for this message or chat."""
+        stream = self._streams.get(msg.correlation_id) if msg.correlation_id else None
+        if stream is None:
+            stream = self._streams.get((msg.channel, msg.chat_id))
+        if stream is not None:
+            stream.put_nowait(msg)
 
     async def publish_inbound(self, msg: InboundMessage) -> None:
+        if self.closed:
+            raise BusClosed
         await self._inbound.put(msg)
 
     async def consume_inbound(self) -> InboundMessage:
-        return await self._inbound.get()
+        msg = await self._inbound.get()
+        if msg is None:
+            self._inbound.put_nowait(None)  # for any other consumer
+            raise BusClosed
+        return msg
 
     async def publish_outbound(self, msg: OutboundMessage) -> None:
-        await self._outbound.put(msg)
+        # A reply awaited by its correlation id never falls through to a chat
+        # waiter, even if that caller has given up on it
+        key = msg.correlation_id if msg.correlation_id in self._waiters else (msg.channel, msg.chat_id)
+        waiters = self._waiters.get(key)
+        consumed = False
+        while waiters:
+            future, consume = waiters.pop(0)
+            if future.done():  # cancelled or timed out
+                continue
+            future.set_result(msg)
+            consumed = consume
+            break
+        if waiters == []:
+            del self._waiters[key]
+        if not consumed:
+            await self._outbound.put(msg)
 
     async def consume_outbound(self) -> OutboundMessage:
         return await self._outbound.get()
+
+    def outbound_done(self) -> None:
+        """Mark a consumed outbound message as delivered (or dropped), for `join_outbound`."""
+        self._outbound.task_done()
+
+    async def join_outbound(self) -> None:
+        """Wait until every outbound message has been consumed and marked done."""
+        await self._outbound.join()
@@ -0,0 +1,99 @@
+"""Response cache — reuse replies to repeated prompts (``AgentConfig.response_cache``).
+
+Meant for agents whose answers don't depend on the conversation: lookups and
+scripted or scheduled prompts. A reply is stored in caveclaw.db under a hash
+of everything that shapes it — agent, model, SOUL/TOOLS/MEMORY content, the
+normalized message and the bytes of any attachments — and a hit skips the
+model entirely. Conversation history is left out of the key unless
+`include_history` is set.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from pydantic import BaseModel
+
+# caveclaw.db is imported where used: caveclaw.config imports this module and db imports config
+
+if TYPE_CHECKING:
+    from caveclaw.bus import Attachment
+    from caveclaw.registry import AgentDescriptor
+
+
+class ResponseCacheConfig(BaseModel):
+    ttl_seconds: float = 3600.0
+    max_entries: int = 1000  # per agent; the least recently used replies are evicted
+    include_history: bool = False  # also key on the conversation so far (far fewer hits)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    def to_dict(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {**asdict(self), "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0}
+
+
+stats = CacheStats()
+
+
+def normalize(text: str) -> str:
+    """Case- and whitespace-insensitive form of a message."""
+    return " ".join(text.split()).casefold()
+
+
+def _attachment_digest(attachments: list[Attachment]) -> str:
+    h = hashlib.sha256()
+    for a in attachments:
+        try:
+            h.update(hashlib.sha256(Path(a.path).read_bytes()).digest())
+        except OSError:
+            h.update(f"{a.filename}:{a.size}".encode())
+    return h.hexdigest()
+
+
+def cache_key(
+    agent: AgentDescriptor,
+    model: str,
+    content: str,
+    attachments: list[Attachment] | None = None,
+    history: str = "",
+) -> str:
+    """Hash of everything that shapes a reply."""
+    h = hashlib.sha256()
+    for part in (
+        agent.name, model, agent.soul, agent.tools, agent.memory, normalize(content),
+        _attachment_digest(attachments) if attachments else "", history,
+    ):
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+async def lookup(key: str) -> str | None:
+    """Return the cached reply for `key`, counting the hit or miss."""
+    from caveclaw import db
+
+    reply = await db.aget_cached_reply(key)
+    if reply is None:
+        stats.misses += 1
+        return None
+    stats.hits += 1
+    db.touch_cached_reply(key)
+    return reply
+
+
+async def store(key: str, agent: str, reply: str, cfg: ResponseCacheConfig) -> None:
+    """Cache a reply, evicting the agent's least recently used entries past `max_entries`."""
+    from caveclaw import db
+
+    stats.evictions += await db.aput_cached_reply(key, agent, reply, cfg.ttl_seconds, cfg.max_entries)
+    stats.stores += 1
@@ -3,40 +3,89 @@
 from __future__ import annotations
 
 import asyncio
+import io
+import logging
 import time as _time
 import uuid
 from pathlib import Path
 
 import discord
 
-from caveclaw.agent import agent_loop
-from caveclaw.bus import Attachment, InboundMessage, MessageBus, OutboundMessage
-from caveclaw.config import AGENTS_DIR, Config, TEMPLATES_DIR, agent_dir
-from caveclaw.db import get_state, set_state
+from caveclaw.bus import Attachment, BusClosed, InboundMessage, MessageBus, OutboundMessage
+from caveclaw.config import AGENTS_DIR, Config, TEMPLATES_DIR, agent_dir, resolve_image_max_edge
+from caveclaw.db import aset_state, get_state
+from caveclaw.degrade import current_plan
+from caveclaw.images import preprocess_attachments
+from caveclaw.profiling import run_action
+from caveclaw.reload import ConfigWatcher
+
+logger = logging.getLogger(__name__)
 
 MAX_DISCORD_LEN = 2000
+MAX_FENCE_LEN = 40  # longest code-fence opener carried over to the next chunk
+REPLY_PREVIEW_LEN = 500
+REPLY_FILENAME = "reply.md"
+_FENCE_CLOSE = "\n```"
 ALLOWED_IMAGE_TYPES = {"image/png", "image/jpeg", "image/webp", "image/gif"}
 MAX_ATTACHMENT_AGE_SECONDS = 7 * 24 * 3600  # 7 days
+RESTARTING_NOTICE = "Restarting — please send that again in a minute."
+
 
+def _split_message(text: str, limit: int = MAX_DISCORD_LEN) -> list[str]:
+    """Split text into chunks that fit within Discord's message limit.
 
-def _split_message(text: str) -> list[str]:
-    """Split text into chunks that fit within Discord's message limit."""
-    if len(text) <= MAX_DISCORD_LEN:
+    Single pass over the text: prefers to break on newlines, and when a break
+    falls inside a fenced code block the fence is closed at the end of the
+    chunk and reopened (with its language tag) at the start of the next.
+    """
+    if len(text) <= limit:
         return [text]
 
+    # Only reserve room for a closing fence when the text has fences at all
+    reserve = len(_FENCE_CLOSE) if "```" in text else 0
     chunks: list[str] = []
-    while text:
-        if len(text) <= MAX_DISCORD_LEN:
-            chunks.append(text)
+    fence: str | None = None  # opening line of the currently open code block
+    pos, n = 0, len(text)
+    while pos < n:
+        prefix = f"{fence}\n" if fence else ""
+        if n - pos <= limit - len(prefix):
+            chunks.append(prefix + text[pos:])
             break
-        split_at = text.rfind("\n", 0, MAX_DISCORD_LEN)
-        if split_at == -1:
-            split_at = MAX_DISCORD_LEN
-        chunks.append(text[:split_at])
-        text = text[split_at:].lstrip("\n")
+        end = pos + limit - len(prefix) - reserve
+        split_at = text.rfind("\n", pos, end)
+        if split_at <= pos:
+            split_at = end
+        chunk = text[pos:split_at]
+        fence = _track_fence(chunk, fence)
+        chunks.append(prefix + chunk + (_FENCE_CLOSE if fence else ""))
+        pos = split_at
+        while pos < n and text[pos] == "\n":
+            pos += 1
     return chunks
 
 
+def _track_fence(chunk: str, fence: str | None) -> str | None:
+    """Return the open fence line after `chunk`, given the one open before it."""
+    if "```" not in chunk:
+        return fence
+    for line in chunk.split("\n"):
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            fence = None if fence else stripped[:MAX_FENCE_LEN]
+    return fence
+
+
+def _reply_preview(text: str) -> str:
+    """Short inline preview for a reply that is sent as a file."""
+    preview = text[:REPLY_PREVIEW_LEN]
+    cut = preview.rfind("\n")
+    if cut > REPLY_PREVIEW_LEN // 2:
+        preview = preview[:cut]
+    if _track_fence(preview, None):
+        preview += _FENCE_CLOSE
+    return f"{preview}\n\n*Full reply attached ({len(text):,} characters).*"
+
+
 def _available_agents() -> list[str]:
     """List agent names from bundled templates."""
     if not TEMPLATES_DIR.is_dir():
@@ -46,7 +95,7 @@ def _available_agents() -> list[str]:
 
 def _resolve_agent(channel_id: str, config: Config) -> str:
     """Get agent for a channel: DB override > config routing > default."""
-    db_val = get_state(f"channel:{channel_id}")
+    db_val = get_state(channel_id, namespace="channel")
     if db_val:
         return db_val
     return config.discord_routing.get(channel_id, config.default_agent)
@@ -82,7 +131,7 @@ async def _download_attachments(
                 size=att.size,
             ))
         except Exception as e:
-            print(f"Failed to download attachment {att.filename}: {e}")
+            logger.warning("Failed to download attachment %s: %s", att.filename, e)
 
     return results
 
@@ -109,30 +158,50 @@ async def _keep_typing(channel: discord.abc.Messageable) -> None:
     except asyncio.CancelledError:
         pass
     except Exception as e:
-        print(f"Typing indicator error: {e}")
+        logger.debug("Typing indicator error: %s", e)
+
+
+async def _send_reply(channel: discord.abc.Messageable, content: str, max_chunks: int) -> None:
+    """Send a reply as split messages, or as an attached file if it's too long."""
+    chunks = _split_message(content)
+    if len(chunks) > max_chunks:
+        file = discord.File(io.BytesIO(content.encode()), filename=REPLY_FILENAME)
+        await channel.send(_reply_preview(content), file=file)
+        return
+    for chunk in chunks:
+        await channel.send(chunk)
 
 
 async def _outbound_sender(
     bus: MessageBus,
     bot: discord.Client,
     typing_tasks: dict[str, asyncio.Task[None]],
+    max_chunks: int = 4,
 ) -> None:
     """Consume outbound messages and send them to Discord."""
     while True:
         msg: OutboundMessage = await bus.consume_outbound()
-        # Stop typing indicator for this channel
-        task = typing_tasks.pop(msg.chat_id, None)
-        if task:
-            task.cancel()
-        channel = bot.get_channel(int(msg.chat_id))
-        if channel is None:
-            continue
-        for chunk in _split_message(msg.content):
-            await channel.send(chunk)
-
-
-async def run_discord(config: Config) -> None:
-    """Start the Discord bot and agent loop."""
+        try:
+            if msg.channel != "discord":
+                continue
+            # Stop typing indicator for this channel
+            task = typing_tasks.pop(msg.chat_id, None)
+            if task:
+                task.cancel()
+            channel = bot.get_channel(int(msg.chat_id))
+            if channel is None:
+                continue
+            await _send_reply(channel, msg.content, max_chunks)
+        finally:
+            bus.outbound_done()
+
+
+async def run_discord(config: Config, bus: MessageBus, watcher: ConfigWatcher) -> None:
+    """Run the Discord bot: publish messages to `bus` and send replies back.
+
+    Each message uses `watcher.current`, the latest valid config snapshot.
+    The agent loop and other services are run by `caveclaw.gateway`.
+    """
     # Clean up old attachments at startup
     if AGENTS_DIR.is_dir():
         for d in AGENTS_DIR.iterdir():
@@ -142,13 +211,11 @@ async def run_discord(config: Config) -> None:
     intents = discord.Intents.default()
     intents.message_content = True
     bot = discord.Client(intents=intents)
-    bus = MessageBus()
-    allow_from = set(config.discord_allow_from) if config.discord_allow_from else None
     agents = _available_agents()
 
     @bot.event
     async def on_ready() -> None:
-        print(f"Discord bot connected as {bot.user}")
+        logger.info("Discord bot connected as %s", bot.user)
 
     typing_tasks: dict[str, asyncio.Task[None]] = {}
 
@@ -158,12 +225,26 @@ async def run_discord(config: Config) -> None:
             return
         if message.author.bot:
             return
-        if allow_from and str(message.author.id) not in allow_from:
+        config = watcher.current
+        if config.discord_allow_from and str(message.author.id) not in config.discord_allow_from:
+            return
+        if bus.closed:
+            await message.channel.send(RESTARTING_NOTICE)
             return
 
         channel_id = str(message.channel.id)
         content = message.content.strip()
 
+        # Handle !profile command (admins only: users listed in discord_allow_from)
+        if content.startswith("!profile"):
+            if str(message.author.id) not in config.discord_allow_from:
+                await message.channel.send("Profiling is limited to users in `discord_allow_from`.")
+                return
+            parts = content.split(maxsplit=1)
+            action = parts[1].strip() if len(parts) > 1 else "status"
+            await message.channel.send(await run_action(action))
+            return
+
         # Handle !agent command
         if content.startswith("!agent"):
             parts = content.split(maxsplit=1)
@@ -177,7 +258,7 @@ async def run_discord(config: Config) -> None:
             else:
                 name = parts[1].strip()
                 if name in agents:
-                    set_state(f"channel:{channel_id}", name)
+                    await aset_state(channel_id, name, namespace="channel")
                     await message.channel.send(f"Switched to **{name}**.")
                 else:
                     await message.channel.send(
@@ -193,6 +274,12 @@ async def run_discord(config: Config) -> None:
             attachments = await _download_attachments(
                 message.attachments, agent_name, config.max_attachment_bytes,
             )
+            max_edge = resolve_image_max_edge(config, agent_name)
+            # Under heavy load, attachments go to the agent as uploaded
+            if attachments and max_edge and not current_plan().skip_extras:
+                attachments = await preprocess_attachments(
+                    attachments, max_edge, config.image_quality, config.image_format,
+                )
 
         # Skip if no text and no usable attachments
         if not content and not attachments:
@@ -207,20 +294,25 @@ async def run_discord(config: Config) -> None:
             _keep_typing(message.channel)
         )
 
-        await bus.publish_inbound(
-            InboundMessage(
-                channel="discord",
-                sender_id=str(message.author.id),
-                chat_id=channel_id,
-                content=content,
-                agent_name=agent_name,
-                attachments=attachments,
+        try:
+            await bus.publish_inbound(
+                InboundMessage(
+                    channel="discord",
+                    sender_id=str(message.author.id),
+                    chat_id=channel_id,
+                    content=content,
+                    agent_name=agent_name,
+                    attachments=attachments,
+                )
             )
-        )
+        except BusClosed:
+            task = typing_tasks.pop(channel_id, None)
+            if task:
+                task.cancel()
+            await message.channel.send(RESTARTING_NOTICE)
 
     async with bot:
         await asyncio.gather(
             bot.start(config.discord_token),
-            agent_loop(config, bus),
-            _outbound_sender(bus, bot, typing_tasks),
+            _outbound_sender(bus, bot, typing_tasks, config.discord_max_chunks),
         )
@@ -0,0 +1,331 @@
+"""HTTP channel — a small local HTTP/1.1 server for programmatic clients.
+
+    POST /v1/messages   {"content": "...", "agent": "...", "chat_id": "..."}
+                        or {"messages": [{...}, ...]} to submit a batch
+    GET  /health
+    GET  /metrics       runtime counters (event-loop lag, load level)
+
+Replies are returned as JSON once every message is answered, or as
+Server-Sent Events (``Accept: text/event-stream`` or ``?stream=1``): a
+``delta`` event for each intermediate assistant message, a ``reply`` event
+per message as it completes, then ``done``. Connections are kept alive
+between requests, and at most `http_max_concurrency` requests are handled at
+once; the rest get 503.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hmac
+import json
+import logging
+import uuid
+from contextlib import suppress
+from dataclasses import dataclass
+from typing import Any
+
+from caveclaw import cache, degrade, watchdog
+from caveclaw.bus import BusClosed, InboundMessage, MessageBus, OutboundMessage
+from caveclaw.config import Config
+from caveclaw.reload import ConfigWatcher
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "http"
+MAX_BODY_BYTES = 1024 * 1024
+IDLE_TIMEOUT_SECONDS = 60.0  # close keep-alive connections idle this long
+
+_REASONS = {
+    100: "Continue",
+    200: "OK",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: dict[str, str] | None = None) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: str
+    version: str
+    headers: dict[str, str]  # lower-cased names
+    body: bytes
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    @property
+    def wants_stream(self) -> bool:
+        return "text/event-stream" in self.headers.get("accept", "") or "stream=1" in self.query.split("&")
+
+
+async def read_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Request | None:
+    """Read one request, or return None if the client closed the connection."""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers: dict[str, str] = {}
+    while True:
+        raw = await reader.readline()
+        if raw in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = raw.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "transfer-encoding" in headers:
+        raise HTTPError(411, "Chunked request bodies are not supported; send Content-Length")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, f"Body larger than {MAX_BODY_BYTES} bytes")
+    if length and headers.get("expect", "").lower() == "100-continue":
+        writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+    body = await reader.readexactly(length) if length else b""
+    path, _, query = target.partition("?")
+    return Request(method.upper(), path, query, version.upper(), headers, body)
+
+
+def _head(status: int, headers: dict[str, str]) -> bytes:
+    lines = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}"]
+    lines += [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def send_json(
+    writer: asyncio.StreamWriter,
+    status: int,
+    payload: Any,
+    keep_alive: bool,
+    headers: dict[str, str] | None = None,
+) -> None:
+    body = json.dumps(payload).encode()
+    writer.write(_head(status, {
+        "Content-Type": "application/json",
+        "Content-Length": str(len(body)),
+        "Connection": "keep-alive" if keep_alive else "close",
+        **(headers or {}),
+    }) + body)
+    await writer.drain()
+
+
+class _EventStream:
+    """Writes Server-Sent Events, chunked on HTTP/1.1 so the connection can be reused."""
+
+    def __init__(self, writer: asyncio.StreamWriter, chunked: bool) -> None:
+        self.writer = writer
+        self.chunked = chunked
+
+    async def start(self) -> None:
+        headers = {"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+        if self.chunked:
+            headers.update({"Transfer-Encoding": "chunked", "Connection": "keep-alive"})
+        else:
+            headers["Connection"] = "close"
+        self.writer.write(_head(200, headers))
+        await self.writer.drain()
+
+    async def send(self, event: str, data: Any) -> None:
+        payload = f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+        if self.chunked:
+            payload = b"%x\r\n%s\r\n" % (len(payload), payload)
+        self.writer.write(payload)
+        await self.writer.drain()
+
+    async def end(self) -> None:
+        if self.chunked:
+            self.writer.write(b"0\r\n\r\n")
+            await self.writer.drain()
+
+
+def metrics() -> dict[str, Any]:
+    """Runtime counters served at /metrics."""
+    loop_watchdog = watchdog.active()
+    load = degrade.active()
+    return {
+        "loop": loop_watchdog.stats() if loop_watchdog else None,
+        "load": load.stats() if load else None,
+        "cache": cache.stats.to_dict(),
+    }
+
+
+class HTTPChannel:
+    """Serves HTTP connections and relays messages through the bus."""
+
+    def __init__(self, bus: MessageBus, watcher: ConfigWatcher) -> None:
+        self.bus = bus
+        self.watcher = watcher
+        self._semaphore = asyncio.Semaphore(watcher.current.http_max_concurrency)
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Handle requests on one connection until it closes or goes idle."""
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader, writer), IDLE_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    break
+                except HTTPError as e:
+                    await send_json(writer, e.status, {"error": e.message}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                keep_alive = request.keep_alive
+                try:
+                    keep_alive = await self._route(request, writer, keep_alive)
+                except HTTPError as e:
+                    await send_json(writer, e.status, {"error": e.message}, keep_alive, e.headers)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _route(self, request: Request, writer: asyncio.StreamWriter, keep_alive: bool) -> bool:
+        """Answer one request. Returns whether the connection can be reused."""
+        if request.path == "/health":
+            # Draining: tell load balancers to stop sending traffic here
+            status = (503, "draining") if self.bus.closed else (200, "ok")
+            await send_json(writer, status[0], {"status": status[1]}, keep_alive)
+            return keep_alive
+        if request.path == "/metrics":
+            self._authorize(request, self.watcher.current)
+            await send_json(writer, 200, metrics(), keep_alive)
+            return keep_alive
+        if request.path != "/v1/messages":
+            raise HTTPError(404, f"No route for {request.path}")
+        if request.method != "POST":
+            raise HTTPError(405, "Use POST", {"Allow": "POST"})
+
+        config = self.watcher.current
+        self._authorize(request, config)
+        messages, batch = self._parse(request, config)
+        if self.bus.closed:
+            raise HTTPError(503, "Shutting down", {"Retry-After": "5"})
+        if self._semaphore.locked():
+            raise HTTPError(503, "Too many concurrent requests", {"Retry-After": "1"})
+        async with self._semaphore:
+            if request.wants_stream:
+                chunked = request.version == "HTTP/1.1"
+                await self._stream(messages, _EventStream(writer, chunked), config)
+                return keep_alive and chunked
+            results = await asyncio.gather(*(self._ask(message, config) for message in messages))
+        await send_json(writer, 200, {"results": results} if batch else results[0], keep_alive)
+        return keep_alive
+
+    def _authorize(self, request: Request, config: Config) -> None:
+        if not config.http_token:
+            return
+        supplied = request.headers.get("authorization", "")
+        if not hmac.compare_digest(supplied.encode(), f"Bearer {config.http_token}".encode()):
+            raise HTTPError(401, "Missing or invalid bearer token", {"WWW-Authenticate": "Bearer"})
+
+    def _parse(self, request: Request, config: Config) -> tuple[list[InboundMessage], bool]:
+        try:
+            body = json.loads(request.body or b"null")
+        except ValueError as e:
+            raise HTTPError(400, f"Invalid JSON: {e}")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "Expected a JSON object")
+        batch = "messages" in body
+        raw = body["messages"] if batch else [body]
+        if not isinstance(raw, list) or not raw:
+            raise HTTPError(400, "messages must be a non-empty list")
+        if len(raw) > config.http_max_batch:
+            raise HTTPError(413, f"At most {config.http_max_batch} messages per batch")
+        messages: list[InboundMessage] = []
+        for entry in raw:
+            if not isinstance(entry, dict) or not isinstance(entry.get("content"), str) or not entry["content"].strip():
+                raise HTTPError(400, "Each message needs a non-empty content string")
+            messages.append(InboundMessage(
+                channel=CHANNEL,
+                sender_id=str(entry.get("sender_id") or "http"),
+                chat_id=str(entry.get("chat_id") or uuid.uuid4().hex[:12]),
+                content=entry["content"],
+                agent_name=str(entry.get("agent") or config.default_agent),
+            ))
+        return messages, batch
+
+    async def _ask(self, message: InboundMessage, config: Config) -> dict[str, str]:
+        # Matched by correlation id: other requests may be talking to the same chat
+        reply = self.bus.expect_reply(CHANNEL, message.chat_id, consume=True, correlation_id=message.correlation_id)
+        result = {"chat_id": message.chat_id, "agent": message.agent_name, "correlation_id": message.correlation_id}
+        try:
+            await self.bus.publish_inbound(message)
+        except BusClosed:
+            reply.cancel()
+            result["error"] = "shutting down"
+            return result
+        try:
+            result["reply"] = (await asyncio.wait_for(reply, config.http_timeout)).content
+        except asyncio.TimeoutError:
+            result["error"] = "timed out"
+        return result
+
+    async def _stream(self, messages: list[InboundMessage], events: _EventStream, config: Config) -> None:
+        partials: asyncio.Queue[OutboundMessage] = asyncio.Queue()
+        index_of = {m.correlation_id: i for i, m in enumerate(messages)}
+        for m in messages:
+            self.bus.open_stream(CHANNEL, m.chat_id, partials, correlation_id=m.correlation_id)
+
+        async def ask(index: int, message: InboundMessage) -> tuple[int, dict[str, str]]:
+            return index, await self._ask(message, config)
+
+        pending = {asyncio.create_task(ask(i, m)) for i, m in enumerate(messages)}
+        await events.start()
+        try:
+            while pending:
+                getter = asyncio.create_task(partials.get())
+                done, _ = await asyncio.wait(pending | {getter}, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    msg = getter.result()
+                    await events.send("delta", {
+                        "index": index_of[msg.correlation_id], "chat_id": msg.chat_id, "content": msg.content,
+                    })
+                else:
+                    getter.cancel()
+                for task in done - {getter}:
+                    pending.discard(task)
+                    index, result = task.result()
+                    await events.send("reply", {"index": index, **result})
+            await events.send("done", {"count": len(messages)})
+            await events.end()
+        finally:
+            for task in pending:
+                task.cancel()
+            for m in messages:
+                self.bus.close_stream(CHANNEL, m.chat_id, correlation_id=m.correlation_id)
+
+
+async def run_http(config: Config, bus: MessageBus, watcher: ConfigWatcher) -> None:
+    """Serve the HTTP channel on `http_host:http_port` until cancelled."""
+    channel = HTTPChannel(bus, watcher)
+    server = await asyncio.start_server(channel.serve_connection, config.http_host, config.http_port)
+    logger.info("HTTP channel listening on %s:%s", config.http_host, config.http_port)
+    async with server:
+        await server.serve_forever()
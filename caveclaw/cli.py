@@ -1,25 +1,39 @@
-"""CLI entry point — `caveclaw agent` for interactive chat, `caveclaw gateway` for Discord."""
+"""CLI entry point — `caveclaw agent` for interactive chat, `caveclaw gateway` for Discord and HTTP."""
 
 from __future__ import annotations
 
 import asyncio
+import time
 import uuid
+from pathlib import Path
 
 import typer
-from prompt_toolkit import PromptSession
-from prompt_toolkit.history import FileHistory
 from rich.console import Console
-from rich.markdown import Markdown
 
-from caveclaw.agent import agent_loop
-from caveclaw.bus import InboundMessage, MessageBus
-from caveclaw.config import CONFIG_DIR, Config, load_config
-from caveclaw.db import init_db
+from caveclaw import config as config_mod
+from caveclaw.config import CONFIG_DIR, Config, agent_dir, load_config
+from caveclaw.db import add_task, get_session, get_task, init_db, list_sessions, list_tasks
+
+# Heavy dependencies (claude_agent_sdk, discord, prompt_toolkit, rich.markdown)
+# are imported inside the commands that need them, so `--help` and quick
+# commands start fast. `caveclaw doctor --startup` reports import costs.
 
 app = typer.Typer(help="Caveclaw — AI agent CLI")
+tasks_app = typer.Typer(help="Manage scheduled tasks")
+app.add_typer(tasks_app, name="tasks")
+sessions_app = typer.Typer(help="Browse and prune conversation sessions")
+app.add_typer(sessions_app, name="sessions")
+cache_app = typer.Typer(help="Manage the response cache")
+app.add_typer(cache_app, name="cache")
 console = Console()
 
 
+def _setup_logging(config: Config) -> None:
+    from caveclaw.log import setup_logging
+
+    setup_logging(config.log_level, config.log_format, config.log_debug_sample)
+
+
 @app.command()
 def agent(
     session_id: str = typer.Option(None, help="Session ID to resume"),
@@ -27,6 +41,7 @@ def agent(
 ) -> None:
     """Interactive terminal chat with a named agent."""
     config = load_config()
+    _setup_logging(config)
     init_db()
 
     chat_id = session_id or str(uuid.uuid4())[:8]
@@ -37,6 +52,13 @@ def agent(
 
 
 async def _agent_repl(config: Config, chat_id: str, agent_name: str = "claw") -> None:
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.history import FileHistory
+    from rich.markdown import Markdown
+
+    from caveclaw.agent import agent_loop
+    from caveclaw.bus import InboundMessage, MessageBus
+
     bus = MessageBus()
 
     agent_task = asyncio.create_task(agent_loop(config, bus))
@@ -77,18 +99,325 @@ async def _agent_repl(config: Config, chat_id: str, agent_name: str = "claw") ->
             console.print(Markdown(response.content))
             console.print()
     finally:
+        # A reply cut off by Ctrl-C is recorded as interrupted before exiting
         agent_task.cancel()
+        await asyncio.gather(agent_task, return_exceptions=True)
 
 
 @app.command()
 def gateway() -> None:
-    """Run the Discord gateway bot."""
-    from caveclaw.channels.discord import run_discord
+    """Run the gateway: Discord bot and/or HTTP channel, plus the scheduler."""
+    from caveclaw.gateway import run_gateway
 
     config = load_config()
-    if not config.discord_token:
-        console.print("[red]No discord_token set. Add it to ~/.caveclaw/config.json[/red]")
+    if not config.discord_token and config.http_port is None:
+        console.print(
+            "[red]No channel configured. Set discord_token or http_port in ~/.caveclaw/config.json[/red]"
+        )
+        raise typer.Exit(1)
+
+    _setup_logging(config)
+    init_db()
+    asyncio.run(run_gateway(config))
+
+
+@app.command()
+def run(
+    input_path: Path = typer.Option(..., "--input", "-i", help="JSONL file of {\"id\", \"prompt\"} records"),
+    output_path: Path = typer.Option(..., "--output", "-o", help="JSONL file results are appended to"),
+    agent: str = typer.Option("claw", help="Agent name (records may override with \"agent\")"),
+    concurrency: int = typer.Option(4, min=1, help="Prompts in flight at once"),
+    timeout: float = typer.Option(600.0, help="Seconds to wait for each reply"),
+) -> None:
+    """Run a batch of prompts through an agent. Rerun to resume."""
+    from caveclaw.batch import run_batch
+
+    if not input_path.exists():
+        console.print(f"[red]No such file: {input_path}[/red]")
+        raise typer.Exit(1)
+    config = load_config()
+    _setup_logging(config)
+    init_db()
+    stats = asyncio.run(run_batch(config, agent, input_path, output_path, concurrency, timeout))
+    rate = stats.done / stats.elapsed if stats.elapsed else 0.0
+    console.print(
+        f"{stats.done} done, {stats.failed} failed, {stats.skipped} already done "
+        f"in {stats.elapsed:.1f}s ({rate:.2f}/s)"
+    )
+    if stats.failed:
+        raise typer.Exit(1)
+
+
+@app.command()
+def bench(
+    requests: int = typer.Option(200, help="Synthetic requests to send"),
+    rate: float = typer.Option(20.0, help="Target requests per second"),
+    chats: int = typer.Option(20, help="Conversations the synthetic requests are spread over"),
+    replay: list[Path] = typer.Option(None, help="Session JSONL files to replay instead"),
+    latency_ms: float = typer.Option(200.0, help="Fake model time to first token"),
+    jitter_ms: float = typer.Option(50.0, help="Fake model latency jitter (+/-)"),
+    tokens: int = typer.Option(40, help="Tokens per fake reply"),
+    token_ms: float = typer.Option(0.0, help="Delay per streamed token"),
+    send_ms: float = typer.Option(0.0, help="Simulated Discord send time"),
+    agent: str = typer.Option("claw", help="Agent name"),
+    json_output: bool = typer.Option(False, "--json", help="Print the report as JSON"),
+) -> None:
+    """Benchmark the message pipeline with a fake model backend."""
+    import json
+
+    from caveclaw import bench as b
+
+    traffic = b.replay_traffic(replay) if replay else b.synthetic_traffic(requests, chats)
+    if not traffic:
+        console.print("[red]No requests to send[/red]")
+        raise typer.Exit(1)
+    profile = b.FakeProfile(latency_ms=latency_ms, jitter_ms=jitter_ms, tokens=tokens, token_ms=token_ms)
+    config = load_config()
+    with b.scratch_agents(None):
+        report = asyncio.run(b.run_bench(config, traffic, rate, profile, agent, send_ms))
+
+    if json_output:
+        print(json.dumps(report.to_dict(), indent=2))
+        return
+    from rich.table import Table
+
+    console.print(
+        f"{report.completed}/{report.requests} requests in {report.elapsed:.2f}s "
+        f"({report.throughput:.1f} req/s, target {rate:g})"
+    )
+    table = Table("stage", "mean ms", "p50", "p95", "p99", "max")
+    for stage, st in report.stages.items():
+        table.add_row(stage, *(f"{v:.1f}" for v in (st.mean_ms, st.p50_ms, st.p95_ms, st.p99_ms, st.max_ms)))
+    console.print(table)
+
+
+@app.command()
+def doctor(
+    startup: bool = typer.Option(False, "--startup", help="Report import costs per command"),
+) -> None:
+    """Check the installation: config, optional dependencies and startup cost."""
+    import importlib.util
+
+    from caveclaw.config import CONFIG_PATH
+
+    try:
+        config = load_config()
+    except Exception as e:
+        console.print(f"[red]{CONFIG_PATH}: {e}[/red]")
+        raise typer.Exit(1)
+    console.print(f"config: {CONFIG_PATH}{'' if CONFIG_PATH.exists() else ' (not found, using defaults)'}")
+    console.print(f"discord_token: {'set' if config.discord_token else '[yellow]not set[/yellow]'}")
+    for module, extra in (("claude_agent_sdk", None), ("discord", None), ("PIL", "images"), ("orjson", "fast")):
+        found = importlib.util.find_spec(module) is not None
+        hint = f" (pip install caveclaw[{extra}])" if extra and not found else ""
+        console.print(f"{module}: {'ok' if found else '[yellow]missing[/yellow]'}{hint}")
+
+    if startup:
+        _startup_report()
+
+
+def _startup_report() -> None:
+    from rich.table import Table
+
+    from caveclaw import startup as st
+
+    for label, code in st.TARGETS.items():
+        timings = st.measure(code)
+        total = st.total_ms(timings)
+        over = label == "caveclaw --help" and total > st.HELP_BUDGET_MS
+        style = "red" if over else "bold"
+        console.print(f"\n[{style}]{label}[/{style}]: {total:.0f} ms imports")
+        heavy = st.loaded_heavy_modules(timings)
+        if heavy:
+            console.print(f"[dim]heavy modules loaded: {', '.join(heavy)}[/dim]")
+        table = Table("package", "cumulative ms", "self ms")
+        for t in st.heaviest_packages(timings):
+            table.add_row(t.module, f"{t.cumulative_us / 1000:.1f}", f"{t.self_us / 1000:.1f}")
+        console.print(table)
+
+
+@tasks_app.command("add")
+def tasks_add(
+    name: str = typer.Argument(..., help="Task name"),
+    cron: str = typer.Argument(..., help='Cron expression, e.g. "0 9 * * 1-5"'),
+    prompt: str = typer.Argument(..., help="Message sent to the agent"),
+    agent: str = typer.Option(None, help="Agent name (default: default_agent)"),
+    channel: str = typer.Option("scheduler", help="Reply channel: scheduler or discord"),
+    chat_id: str = typer.Option(None, help="Chat to reply in (Discord channel id)"),
+    misfire: str = typer.Option("once", help="Missed runs after downtime: skip, once or all"),
+) -> None:
+    """Add a scheduled task."""
+    from caveclaw.scheduler import MISFIRE_POLICIES, parse_cron
+
+    try:
+        parse_cron(cron)
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    if misfire not in MISFIRE_POLICIES:
+        console.print(f"[red]--misfire must be one of: {', '.join(MISFIRE_POLICIES)}[/red]")
         raise typer.Exit(1)
+    if channel == "discord" and not chat_id:
+        console.print("[red]--chat-id is required for discord tasks[/red]")
+        raise typer.Exit(1)
+
+    init_db()
+    task_id = add_task(name, cron, prompt, agent=agent, channel=channel, chat_id=chat_id, misfire=misfire)
+    console.print(f"Added task {task_id}: {name} ({cron})")
+
+
+@tasks_app.command("list")
+def tasks_list() -> None:
+    """List scheduled tasks and their next fire time."""
+    from rich.table import Table
+
+    from caveclaw.scheduler import parse_cron
+
+    init_db()
+    table = Table("id", "name", "cron", "agent", "reply to", "misfire", "enabled", "next run")
+    now = time.time()
+    for task in list_tasks():
+        try:
+            nxt = time.strftime("%Y-%m-%d %H:%M", time.localtime(parse_cron(task["cron"]).next_after(now)))
+        except ValueError:
+            nxt = "[red]invalid[/red]"
+        reply_to = task["channel"] + (f":{task['chat_id']}" if task["chat_id"] else "")
+        table.add_row(
+            str(task["id"]), task["name"], task["cron"], task["agent"] or "(default)",
+            reply_to, task["misfire"], "yes" if task["enabled"] else "no", nxt,
+        )
+    console.print(table)
+
+
+@tasks_app.command("run")
+def tasks_run(task_id: int = typer.Argument(..., help="Task id")) -> None:
+    """Run a scheduled task now, in this process, and print the reply."""
+    config = load_config()
+    _setup_logging(config)
+    init_db()
+    task = get_task(task_id)
+    if task is None:
+        console.print(f"[red]No task with id {task_id}[/red]")
+        raise typer.Exit(1)
+    reply = asyncio.run(_run_task(config, task))
+
+    from rich.markdown import Markdown
+
+    console.print(Markdown(reply))
+
+
+async def _run_task(config: Config, task: dict) -> str:
+    from caveclaw.agent import agent_loop
+    from caveclaw.bus import MessageBus
+    from caveclaw.scheduler import Scheduler
+
+    bus = MessageBus()
+    agent_task = asyncio.create_task(agent_loop(config, bus))
+    try:
+        return await Scheduler(config, bus).execute(task, channel="cli")
+    finally:
+        agent_task.cancel()
+
+
+def _when(ts: float | None) -> str:
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(ts)) if ts else "-"
+
+
+@sessions_app.command("list")
+def sessions_list(
+    agent: str = typer.Option(None, help="Only this agent's sessions"),
+    limit: int = typer.Option(50, min=1, help="How many of the most recent sessions to show"),
+) -> None:
+    """List sessions from the catalog, most recently active first."""
+    from rich.table import Table
+
+    init_db()
+    table = Table("agent", "chat", "messages", "KB", "first", "last")
+    for s in list_sessions(agent, limit):
+        table.add_row(
+            s["agent"], s["chat_id"], str(s["messages"]), f"{s['bytes'] / 1024:.1f}",
+            _when(s["first_ts"]), _when(s["last_ts"]),
+        )
+    console.print(table)
+
+
+@sessions_app.command("show")
+def sessions_show(
+    chat_id: str = typer.Argument(..., help="Chat / session id"),
+    agent: str = typer.Option("claw", help="Agent name"),
+    limit: int = typer.Option(20, min=1, help="How many of the latest messages to print"),
+) -> None:
+    """Print a session's catalog entry and its latest messages."""
+    from rich.markup import escape
+
+    from caveclaw import session
+
+    init_db()
+    row = get_session(agent, chat_id)
+    entries = session.get_entries(chat_id, limit, agent_dir(agent) / "sessions")
+    if row is None and not entries:
+        console.print(f"[red]No session {chat_id} for agent {agent}[/red]")
+        raise typer.Exit(1)
+    if row:
+        console.print(
+            f"[dim]{row['messages']} messages, {row['bytes'] / 1024:.1f} KB, "
+            f"{_when(row['first_ts'])} – {_when(row['last_ts'])}[/dim]"
+        )
+    for e in entries:
+        console.print(f"[dim]{_when(e.ts)}[/dim] [bold]{e.role}[/bold]: {escape(e.content)}")
+
+
+@sessions_app.command("prune")
+def sessions_prune(
+    older_than: float = typer.Option(..., "--older-than", help="Delete sessions idle for more than this many days"),
+    agent: str = typer.Option(None, help="Only this agent's sessions"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Only list what would be deleted"),
+) -> None:
+    """Delete sessions (and their summaries) that have been idle for a while."""
+    from caveclaw import session
+    from caveclaw.db import delete_sessions
+
+    init_db()
+    stale = list_sessions(agent, idle_before=time.time() - older_than * 86400)
+    by_agent: dict[str, list[str]] = {}
+    for s in stale:
+        by_agent.setdefault(s["agent"], []).append(s["chat_id"])
+    freed = 0
+    for name, chat_ids in by_agent.items():
+        if dry_run:
+            console.print(f"{name}: {', '.join(chat_ids)}")
+            continue
+        for chat_id in chat_ids:
+            freed += session.remove(chat_id, agent_dir(name) / "sessions")
+        delete_sessions(name, chat_ids)
+    verb = "Would delete" if dry_run else "Deleted"
+    console.print(f"{verb} {len(stale)} sessions" + ("" if dry_run else f" ({freed / 1024:.1f} KB)"))
+
+
+@sessions_app.command("reindex")
+def sessions_reindex(agent: str = typer.Option(None, help="Only this agent")) -> None:
+    """Rebuild the session catalog from the session files on disk."""
+    from caveclaw import session
+    from caveclaw.db import replace_sessions
+
+    init_db()
+    if agent:
+        names = [agent]
+    elif config_mod.AGENTS_DIR.is_dir():
+        names = sorted(p.name for p in config_mod.AGENTS_DIR.iterdir() if p.is_dir())
+    else:
+        names = []
+    for name in names:
+        rows = list(session.scan(agent_dir(name) / "sessions"))
+        replace_sessions(name, rows)
+        console.print(f"{name}: {len(rows)} sessions")
+
+
+@cache_app.command("clear")
+def cache_clear(agent: str = typer.Option(None, help="Only this agent's replies")) -> None:
+    """Drop cached replies, e.g. after facts the answers depend on have changed."""
+    from caveclaw.db import clear_cached_replies
 
     init_db()
-    asyncio.run(run_discord(config))
+    removed = clear_cached_replies(agent)
+    console.print(f"Cleared {removed} cached replies" + (f" for {agent}" if agent else ""))
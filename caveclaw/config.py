@@ -6,9 +6,14 @@ import json
 import os
 import shutil
 from pathlib import Path
+from typing import Any, Literal
 
 from pydantic import BaseModel, Field
 
+from caveclaw.cache import ResponseCacheConfig
+from caveclaw.degrade import DegradeConfig
+from caveclaw.router import RoutingRules
+
 CONFIG_DIR = Path(os.environ["CAVECLAW_DIR"]) if "CAVECLAW_DIR" in os.environ else Path.home() / ".caveclaw"
 CONFIG_PATH = CONFIG_DIR / "config.json"
 AGENTS_DIR = CONFIG_DIR / "agents"
@@ -22,16 +27,73 @@ if not TEMPLATES_DIR.is_dir():
 
 class AgentConfig(BaseModel):
     model: str | None = None
+    image_max_edge: int | None = None  # overrides Config.image_max_edge
+    # "structured" sends the pinned core of MEMORY.md plus the items most
+    # relevant to each message instead of the whole file
+    memory_mode: Literal["full", "structured"] = "full"
+    memory_top_k: int = 8
+    memory_token_budget: int = 1000
+    memory_pinned_sections: list[str] = Field(default_factory=lambda: ["Core", "Pinned"])
+    # Claude Agent SDK options; unset ones fall back to TOOLS.md front-matter
+    allowed_tools: list[str] | None = None
+    disallowed_tools: list[str] | None = None
+    max_turns: int | None = None
+    max_budget_usd: float | None = None
+    permission_mode: Literal["default", "acceptEdits", "plan", "bypassPermissions"] | None = None
+    fallback_model: str | None = None
+    # Send quick turns to a faster model (see caveclaw.router)
+    routing: RoutingRules | None = None
+    # Reuse replies to repeated prompts (see caveclaw.cache)
+    response_cache: ResponseCacheConfig | None = None
 
 
 class Config(BaseModel):
     model: str = "claude-sonnet-4-6"
+    model_backend: Literal["claude", "fake"] = "claude"  # "fake" answers locally, for benchmarks
     discord_token: str | None = None
     discord_allow_from: list[str] = Field(default_factory=list)
     default_agent: str = "claw"
     agents: dict[str, AgentConfig] = Field(default_factory=dict)
     discord_routing: dict[str, str] = Field(default_factory=dict)
+    discord_max_chunks: int = 4  # longer replies are sent as an attached .md file
+    # HTTP channel (caveclaw.channels.http); disabled unless http_port is set
+    http_port: int | None = None
+    http_host: str = "127.0.0.1"
+    http_token: str | None = None  # required as "Authorization: Bearer <token>" when set
+    http_max_concurrency: int = 64  # requests handled at once; more get 503
+    http_max_batch: int = 100
+    http_timeout: float = 600.0  # seconds to wait for each reply
+    scheduler_enabled: bool = True  # run scheduled_tasks inside the gateway
+    history_max_bytes: int = 1024 * 1024  # rotate HISTORY.md into history/*.md.gz past this size
+    history_rotate_daily: bool = False
+    # Fold old turns into a rolling summary once a chat has this many unsummarized turns
+    summarize_after_turns: int | None = None
+    summary_keep_turns: int = 10  # recent turns always sent verbatim
+    summarizer_backend: Literal["claude", "stub"] = "claude"  # keys of caveclaw.summarize.BACKENDS
+    summarizer_model: str | None = None  # defaults to `model`
+    summarizer_concurrency: int = 1
     max_attachment_bytes: int = 10 * 1024 * 1024  # 10 MB
+    config_reload_seconds: float | None = 5.0  # poll config.json for changes; None disables
+    loop_watchdog_ms: float | None = None  # report event-loop stalls longer than this
+    log_level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = "INFO"
+    log_format: Literal["text", "json"] = "text"  # "json": one object per line, with correlation ids
+    log_debug_sample: float = Field(default=1.0, ge=0.0, le=1.0)  # share of messages whose DEBUG records are kept
+    shutdown_drain_seconds: float = 25.0  # on SIGTERM, let in-flight replies finish for up to this long
+    degrade: DegradeConfig | None = None  # shed work under load (see caveclaw.degrade)
+    image_max_edge: int | None = None  # downscale images to this edge (px); None disables
+    image_quality: int = 85
+    image_format: Literal["webp", "jpeg"] = "webp"
+
+
+# AgentConfig fields passed straight through to ClaudeAgentOptions
+SDK_OPTION_KEYS = (
+    "allowed_tools",
+    "disallowed_tools",
+    "max_turns",
+    "max_budget_usd",
+    "permission_mode",
+    "fallback_model",
+)
 
 
 def agent_dir(name: str) -> Path:
@@ -62,14 +124,99 @@ def resolve_agent_config(config: Config, name: str) -> tuple[str, Path]:
     return model, workspace
 
 
-def load_config() -> Config:
+def resolve_image_max_edge(config: Config, name: str) -> int | None:
+    """Return the image downscale edge for a named agent, or None if disabled."""
+    agent_cfg = config.agents.get(name)
+    if agent_cfg and agent_cfg.image_max_edge:
+        return agent_cfg.image_max_edge
+    return config.image_max_edge
+
+
+def parse_front_matter(text: str) -> tuple[dict[str, Any], str]:
+    """Split a leading ``---`` block of simple ``key: value`` lines from markdown.
+
+    Values may be scalars, ``[a, b]`` inline lists, or ``- item`` lines under
+    an empty key. Returns (fields, body); text without front-matter is all body.
+    """
+    lines = text.splitlines(keepends=True)
+    if not lines or lines[0].strip() != "---":
+        return {}, text
+    try:
+        end = next(i for i in range(1, len(lines)) if lines[i].strip() == "---")
+    except StopIteration:
+        return {}, text
+    fields: dict[str, Any] = {}
+    key: str | None = None
+    for line in lines[1:end]:
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        if stripped.startswith("- ") and key is not None:
+            fields.setdefault(key, []).append(_scalar(stripped[2:]))
+            continue
+        key, _, raw = stripped.partition(":")
+        key, raw = key.strip(), raw.strip()
+        if not raw:
+            continue
+        if raw.startswith("[") and raw.endswith("]"):
+            fields[key] = [_scalar(v) for v in raw[1:-1].split(",") if v.strip()]
+        else:
+            fields[key] = _scalar(raw)
+    return fields, "".join(lines[end + 1:]).lstrip("\n")
+
+
+def _scalar(raw: str) -> Any:
+    raw = raw.strip().strip("'\"")
+    if raw.lower() in ("true", "false"):
+        return raw.lower() == "true"
+    for cast in (int, float):
+        try:
+            return cast(raw)
+        except ValueError:
+            pass
+    return raw
+
+
+def resolve_sdk_options(config: Config, name: str, workspace: Path) -> dict[str, Any]:
+    """Return ClaudeAgentOptions keyword arguments for a named agent.
+
+    Precedence: config.json `agents.<name>` > TOOLS.md front-matter > defaults.
+    """
+    tools_path = workspace / "TOOLS.md"
+    front: dict[str, Any] = {}
+    if tools_path.exists():
+        front, _ = parse_front_matter(tools_path.read_text())
+    return merge_sdk_options(config, name, front, source=str(tools_path))
+
+
+def merge_sdk_options(
+    config: Config, name: str, front: dict[str, Any], source: str = "TOOLS.md"
+) -> dict[str, Any]:
+    """Merge TOOLS.md front-matter with config.json overrides (see `resolve_sdk_options`)."""
+    options: dict[str, Any] = {"permission_mode": "bypassPermissions"}
+    for key, value in front.items():
+        if key in SDK_OPTION_KEYS:
+            options[key] = value
+        else:
+            print(f"Ignoring unknown option {key!r} in {source}")
+    agent_cfg = config.agents.get(name)
+    if agent_cfg:
+        for key in SDK_OPTION_KEYS:
+            value = getattr(agent_cfg, key)
+            if value is not None:
+                options[key] = value
+    return options
+
+
+def load_config(path: Path | None = None) -> Config:
     """Load config from disk, or return defaults.
 
     Environment variables override config file values:
       - DISCORD_TOKEN overrides discord_token
     """
-    if CONFIG_PATH.exists():
-        data = json.loads(CONFIG_PATH.read_text())
+    path = path or CONFIG_PATH
+    if path.exists():
+        data = json.loads(path.read_text())
         config = Config(**data)
     else:
         config = Config()
@@ -1,94 +1,864 @@
-"""SQLite for scheduled tasks and key-value state."""
+"""SQLite for scheduled tasks, key-value state, the session catalog and cached replies.
+
+Connections are long-lived: one writer plus a small pool of readers per
+database file, all in WAL mode so reads never wait on the writer. The
+``a``-prefixed coroutines run on a dedicated DB thread instead of the event
+loop, and writes submitted back to back are committed in one transaction.
+"""
 
 from __future__ import annotations
 
-import json
+import asyncio
+import atexit
+import queue
+from collections import OrderedDict
 import sqlite3
+import threading
 import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Any, TypeVar
 
 from caveclaw.config import CONFIG_DIR
 
 DB_PATH = CONFIG_DIR / "caveclaw.db"
 
+READ_POOL_SIZE = 4
+WRITE_BATCH_SIZE = 64
+BUSY_TIMEOUT_MS = 5000
+
+STATE_CACHE_SIZE = 4096
+STATE_SWEEP_SECONDS = 300.0
+
+TASKS_VERSION_KEY = "scheduler:version"  # bumped on task changes; always read with fresh=True
 
-def _connect() -> sqlite3.Connection:
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(DB_PATH))
+T = TypeVar("T")
+
+
+def _open(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        str(path),
+        isolation_level=None,  # transactions are managed explicitly
+        check_same_thread=False,
+        cached_statements=256,
+    )
     conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
     return conn
 
 
+# A state row as cached: (value, expires_at). (None, None) records a missing key.
+_Entry = tuple[str | None, float | None]
+_MISSING: _Entry = (None, None)
+
+
+class _StateCache:
+    """Thread-safe LRU of state rows, kept in step with writes from this process.
+
+    Every write bumps `version`; a reader only stores what it fetched if no
+    write happened in between, so a slow read can't overwrite a newer value.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> _Entry | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def fill(self, entries: dict[str, _Entry], version: int) -> None:
+        """Store rows read from the database, unless a write raced the read."""
+        with self._lock:
+            if version != self.version:
+                return
+            self._store(entries)
+
+    def write(self, entries: dict[str, _Entry]) -> None:
+        """Write-through: replace cached rows with committed values."""
+        with self._lock:
+            self.version += 1
+            self._store(entries)
+
+    def discard(self, keys) -> None:
+        with self._lock:
+            self.version += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.version += 1
+            self._data.clear()
+
+    def _store(self, entries: dict[str, _Entry]) -> None:
+        for key, entry in entries.items():
+            self._data[key] = entry
+            self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class _Database:
+    """Writer connection, reader pool and DB thread for one database file."""
+
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._writer = _open(path)
+        self._write_lock = threading.Lock()
+        self._readers: queue.SimpleQueue[sqlite3.Connection] = queue.SimpleQueue()
+        self._all_readers: list[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._jobs: queue.SimpleQueue[tuple[bool, Callable[[sqlite3.Connection], Any], Future] | None] = (
+            queue.SimpleQueue()
+        )
+        self._thread: threading.Thread | None = None
+        self._thread_lock = threading.Lock()
+        self.cache = _StateCache(STATE_CACHE_SIZE)
+        self._staged: dict[str, _Entry] = {}
+
+    @contextmanager
+    def write(self) -> Iterator[sqlite3.Connection]:
+        """Run a write transaction on the writer connection."""
+        with self._write_lock:
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                self.cache.discard(self._staged)
+                self._staged = {}
+                raise
+            self._writer.execute("COMMIT")
+            if self._staged:
+                self.cache.write(self._staged)
+                self._staged = {}
+
+    def stage(self, key: str, entry: _Entry) -> None:
+        """Queue a cache update to apply when the current write commits."""
+        self._staged[key] = entry
+
+    @contextmanager
+    def read(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a reader connection from the pool."""
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._readers_lock:
+                if len(self._all_readers) < READ_POOL_SIZE:
+                    conn = _open(self.path)
+                    self._all_readers.append(conn)
+                else:
+                    conn = None
+            if conn is None:
+                conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def submit(self, fn: Callable[[sqlite3.Connection], T], write: bool) -> Future[T]:
+        """Queue `fn(conn)` on the DB thread and return a future for its result."""
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name="caveclaw-db", daemon=True,
+                    )
+                    self._thread.start()
+        future: Future[T] = Future()
+        self._jobs.put((write, fn, future))
+        return future
+
+    def _run(self) -> None:
+        pending: list = []
+        while True:
+            job = pending.pop(0) if pending else self._jobs.get()
+            if job is None:
+                return
+            write, fn, future = job
+            if not write:
+                _resolve(future, lambda: self._read_job(fn))
+                continue
+            # Drain any writes queued behind this one into the same transaction
+            batch = [job]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    nxt = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None or not nxt[0]:
+                    pending.append(nxt)
+                    break
+                batch.append(nxt)
+            self._write_batch(batch)
+
+    def _read_job(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        with self.read() as conn:
+            return fn(conn)
+
+    def _write_batch(self, batch: list) -> None:
+        try:
+            with self.write() as conn:
+                results = []
+                for i, (_, fn, _) in enumerate(batch):
+                    # A savepoint per job keeps one failure from undoing the rest
+                    conn.execute(f"SAVEPOINT job{i}")
+                    staged = dict(self._staged)
+                    try:
+                        results.append((True, fn(conn)))
+                    except Exception as e:
+                        conn.execute(f"ROLLBACK TO job{i}")
+                        self._staged = staged
+                        results.append((False, e))
+                    conn.execute(f"RELEASE job{i}")
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), (ok, value) in zip(batch, results):
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._jobs.put(None)
+            self._thread.join(timeout=5)
+        with self._write_lock:
+            self._writer.close()
+        with self._readers_lock:
+            for conn in self._all_readers:
+                conn.close()
+            self._all_readers.clear()
+
+
+def _resolve(future: Future, fn: Callable[[], Any]) -> None:
+    try:
+        future.set_result(fn())
+    except Exception as e:
+        future.set_exception(e)
+
+
+_databases: dict[Path, _Database] = {}
+_databases_lock = threading.Lock()
+
+
+def _db() -> _Database:
+    """Return the connection manager for the current DB_PATH."""
+    db = _databases.get(DB_PATH)
+    if db is None:
+        with _databases_lock:
+            db = _databases.get(DB_PATH)
+            if db is None:
+                db = _databases[DB_PATH] = _Database(DB_PATH)
+    return db
+
+
+def close_db() -> None:
+    """Close every pooled connection and stop the DB threads."""
+    with _databases_lock:
+        dbs = list(_databases.values())
+        _databases.clear()
+    for db in dbs:
+        db.close()
+
+
+# Writes queued on the DB thread (e.g. session catalog updates) land before exit
+atexit.register(close_db)
+
+
+async def _run_async(fn: Callable[[sqlite3.Connection], T], write: bool) -> T:
+    return await asyncio.wrap_future(_db().submit(fn, write))
+
+
 def init_db() -> None:
     """Create tables if they don't exist."""
-    conn = _connect()
-    conn.executescript(
-        """
-        CREATE TABLE IF NOT EXISTS scheduled_tasks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            cron TEXT NOT NULL,
-            command TEXT NOT NULL,
-            enabled INTEGER DEFAULT 1,
-            created_at REAL DEFAULT (unixepoch())
-        );
-        CREATE TABLE IF NOT EXISTS task_runs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            task_id INTEGER REFERENCES scheduled_tasks(id),
-            started_at REAL,
-            finished_at REAL,
-            result TEXT
-        );
-        CREATE TABLE IF NOT EXISTS state (
-            key TEXT PRIMARY KEY,
-            value TEXT,
-            updated_at REAL
-        );
-        """
+    with _db().write() as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scheduled_tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                cron TEXT NOT NULL,
+                command TEXT NOT NULL,
+                enabled INTEGER DEFAULT 1,
+                created_at REAL DEFAULT (unixepoch())
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS task_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id INTEGER REFERENCES scheduled_tasks(id),
+                started_at REAL,
+                finished_at REAL,
+                result TEXT
+            )
+            """
+        )
+        _ensure_columns(conn, "scheduled_tasks", {
+            "agent": "TEXT",
+            "channel": "TEXT DEFAULT 'scheduler'",
+            "chat_id": "TEXT",
+            "misfire": "TEXT DEFAULT 'once'",
+            "last_run_at": "REAL",
+        })
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                updated_at REAL
+            )
+            """
+        )
+        _ensure_columns(conn, "state", {"expires_at": "REAL"})
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_state_expires ON state(expires_at) "
+            "WHERE expires_at IS NOT NULL"
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                agent TEXT NOT NULL,
+                chat_id TEXT NOT NULL,
+                messages INTEGER NOT NULL DEFAULT 0,
+                bytes INTEGER NOT NULL DEFAULT 0,
+                first_ts REAL,
+                last_ts REAL,
+                PRIMARY KEY (agent, chat_id)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_ts ON sessions(last_ts)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                agent TEXT NOT NULL,
+                reply TEXT NOT NULL,
+                created_at REAL,
+                expires_at REAL,
+                last_used REAL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_lru ON response_cache(agent, last_used)")
+
+
+def _ensure_columns(conn: sqlite3.Connection, table: str, columns: dict[str, str]) -> None:
+    """Add any missing columns to an existing table."""
+    existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+def _add_task(conn: sqlite3.Connection, name: str, cron: str, command: str, **fields: Any) -> int:
+    cur = conn.execute(
+        "INSERT INTO scheduled_tasks (name, cron, command, agent, channel, chat_id, misfire) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (name, cron, command, fields.get("agent"), fields.get("channel") or "scheduler",
+         fields.get("chat_id"), fields.get("misfire") or "once"),
     )
-    conn.close()
+    _bump_tasks_version(conn)
+    return cur.lastrowid
+
+
+def _bump_tasks_version(conn: sqlite3.Connection) -> None:
+    """Record that scheduled_tasks changed so a running scheduler reloads."""
+    _write_state(conn, {TASKS_VERSION_KEY: str(time.time_ns())}, None)
+
+
+def _get_due_tasks(conn: sqlite3.Connection) -> list[dict]:
+    rows = conn.execute("SELECT * FROM scheduled_tasks WHERE enabled = 1").fetchall()
+    return [dict(r) for r in rows]
+
+
+def add_task(
+    name: str,
+    cron: str,
+    command: str,
+    agent: str | None = None,
+    channel: str = "scheduler",
+    chat_id: str | None = None,
+    misfire: str = "once",
+) -> int:
+    """Insert a scheduled task, return its id.
+
+    `command` is the prompt sent to `agent`. Replies go to `channel`/`chat_id`
+    (e.g. a Discord channel id); the default "scheduler" channel only records
+    them in task_runs. `misfire` says what to do about runs missed while the
+    gateway was down: "skip", "once" (coalesce into a single run) or "all".
+    """
+    with _db().write() as conn:
+        return _add_task(
+            conn, name, cron, command,
+            agent=agent, channel=channel, chat_id=chat_id, misfire=misfire,
+        )
 
 
-def add_task(name: str, cron: str, command: str) -> int:
-    """Insert a scheduled task, return its id."""
-    conn = _connect()
+def get_task(task_id: int) -> dict | None:
+    """Return one scheduled task, or None if it doesn't exist."""
+    with _db().read() as conn:
+        row = conn.execute("SELECT * FROM scheduled_tasks WHERE id = ?", (task_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def list_tasks() -> list[dict]:
+    """Return every scheduled task, enabled or not."""
+    with _db().read() as conn:
+        rows = conn.execute("SELECT * FROM scheduled_tasks ORDER BY id").fetchall()
+    return [dict(r) for r in rows]
+
+
+def set_task_enabled(task_id: int, enabled: bool) -> None:
+    """Enable or disable a scheduled task."""
+    with _db().write() as conn:
+        conn.execute("UPDATE scheduled_tasks SET enabled = ? WHERE id = ?", (int(enabled), task_id))
+        _bump_tasks_version(conn)
+
+
+def _start_task_run(conn: sqlite3.Connection, task_id: int, started_at: float, scheduled_for: float) -> int:
+    conn.execute("UPDATE scheduled_tasks SET last_run_at = ? WHERE id = ?", (scheduled_for, task_id))
     cur = conn.execute(
-        "INSERT INTO scheduled_tasks (name, cron, command) VALUES (?, ?, ?)",
-        (name, cron, command),
+        "INSERT INTO task_runs (task_id, started_at) VALUES (?, ?)", (task_id, started_at),
+    )
+    return cur.lastrowid
+
+
+def _finish_task_run(conn: sqlite3.Connection, run_id: int, finished_at: float, result: str) -> None:
+    conn.execute(
+        "UPDATE task_runs SET finished_at = ?, result = ? WHERE id = ?", (finished_at, result, run_id),
     )
-    conn.commit()
-    task_id = cur.lastrowid
-    conn.close()
-    return task_id
+
+
+def start_task_run(task_id: int, started_at: float, scheduled_for: float | None = None) -> int:
+    """Record the start of a task run and advance the task's last_run_at. Returns the run id."""
+    with _db().write() as conn:
+        return _start_task_run(conn, task_id, started_at, scheduled_for or started_at)
+
+
+def finish_task_run(run_id: int, finished_at: float, result: str) -> None:
+    """Record the outcome of a task run."""
+    with _db().write() as conn:
+        _finish_task_run(conn, run_id, finished_at, result)
+
+
+def get_task_runs(task_id: int, limit: int = 20) -> list[dict]:
+    """Return the most recent runs of a task, newest first."""
+    with _db().read() as conn:
+        rows = conn.execute(
+            "SELECT * FROM task_runs WHERE task_id = ? ORDER BY id DESC LIMIT ?", (task_id, limit),
+        ).fetchall()
+    return [dict(r) for r in rows]
 
 
 def get_due_tasks() -> list[dict]:
     """Return all enabled scheduled tasks (caller handles cron matching)."""
-    conn = _connect()
-    rows = conn.execute(
-        "SELECT * FROM scheduled_tasks WHERE enabled = 1"
-    ).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    with _db().read() as conn:
+        return _get_due_tasks(conn)
 
 
-def get_state(key: str, default: str | None = None) -> str | None:
-    """Get a value from the key-value state store."""
-    conn = _connect()
-    row = conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
-    conn.close()
-    if row:
-        return row["value"]
-    return default
+async def aadd_task(name: str, cron: str, command: str, **fields: Any) -> int:
+    """Async `add_task`, run on the DB thread."""
+    return await _run_async(lambda conn: _add_task(conn, name, cron, command, **fields), write=True)
+
 
+async def aget_due_tasks() -> list[dict]:
+    """Async `get_due_tasks`, run on the DB thread."""
+    return await _run_async(_get_due_tasks, write=False)
 
-def set_state(key: str, value: str) -> None:
-    """Set a value in the key-value state store."""
-    conn = _connect()
+
+async def astart_task_run(task_id: int, started_at: float, scheduled_for: float | None = None) -> int:
+    """Async `start_task_run`, batched with other writes on the DB thread."""
+    return await _run_async(
+        lambda conn: _start_task_run(conn, task_id, started_at, scheduled_for or started_at), write=True,
+    )
+
+
+async def afinish_task_run(run_id: int, finished_at: float, result: str) -> None:
+    """Async `finish_task_run`, batched with other writes on the DB thread."""
+    await _run_async(lambda conn: _finish_task_run(conn, run_id, finished_at, result), write=True)
+
+
+# --- Session catalog ---
+#
+# One row per conversation file, kept current by `session.append` so sessions
+# can be listed and pruned without walking the sessions directories.
+# `caveclaw sessions reindex` rebuilds it from the files.
+
+
+def _record_session(conn: sqlite3.Connection, agent: str, chat_id: str, nbytes: int, ts: float) -> None:
     conn.execute(
-        "INSERT INTO state (key, value, updated_at) VALUES (?, ?, ?) "
-        "ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
-        (key, value, time.time()),
+        "INSERT INTO sessions (agent, chat_id, messages, bytes, first_ts, last_ts) VALUES (?, ?, 1, ?, ?, ?) "
+        "ON CONFLICT (agent, chat_id) DO UPDATE SET messages = messages + 1, "
+        "bytes = bytes + excluded.bytes, last_ts = max(last_ts, excluded.last_ts)",
+        (agent, chat_id, nbytes, ts, ts),
     )
-    conn.commit()
-    conn.close()
+
+
+def record_session_append(agent: str, chat_id: str, nbytes: int, ts: float) -> Future[None]:
+    """Count one appended message in the session catalog.
+
+    Queued on the DB thread and batched with other writes; returns without
+    waiting for the commit.
+    """
+    return _db().submit(lambda conn: _record_session(conn, agent, chat_id, nbytes, ts), write=True)
+
+
+def list_sessions(
+    agent: str | None = None, limit: int | None = None, idle_before: float | None = None
+) -> list[dict]:
+    """Return catalogued sessions, most recently active first.
+
+    With `idle_before`, only sessions whose last message is older than that timestamp.
+    """
+    sql, params = "SELECT * FROM sessions WHERE 1", []
+    if agent:
+        sql += " AND agent = ?"
+        params.append(agent)
+    if idle_before is not None:
+        sql += " AND last_ts < ?"
+        params.append(idle_before)
+    sql += " ORDER BY last_ts DESC"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    with _db().read() as conn:
+        return [dict(r) for r in conn.execute(sql, params).fetchall()]
+
+
+def get_session(agent: str, chat_id: str) -> dict | None:
+    """Return one session's catalog row, or None."""
+    with _db().read() as conn:
+        row = conn.execute(
+            "SELECT * FROM sessions WHERE agent = ? AND chat_id = ?", (agent, chat_id),
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def delete_sessions(agent: str, chat_ids: list[str]) -> None:
+    """Drop sessions from the catalog."""
+    with _db().write() as conn:
+        conn.executemany(
+            "DELETE FROM sessions WHERE agent = ? AND chat_id = ?", [(agent, c) for c in chat_ids],
+        )
+
+
+def replace_sessions(agent: str, rows: list[dict]) -> None:
+    """Replace an agent's catalog rows with `rows` (chat_id, messages, bytes, first_ts, last_ts)."""
+    with _db().write() as conn:
+        conn.execute("DELETE FROM sessions WHERE agent = ?", (agent,))
+        conn.executemany(
+            "INSERT INTO sessions (agent, chat_id, messages, bytes, first_ts, last_ts) "
+            "VALUES (:agent, :chat_id, :messages, :bytes, :first_ts, :last_ts)",
+            [{"agent": agent, **r} for r in rows],
+        )
+
+
+# --- Response cache ---
+#
+# Replies stored by caveclaw.cache, keyed by a hash of everything that shapes
+# them. Each agent keeps at most `max_entries`, evicting the least recently used.
+
+
+def _get_cached_reply(conn: sqlite3.Connection, key: str, now: float) -> str | None:
+    row = conn.execute(
+        "SELECT reply FROM response_cache WHERE key = ? AND expires_at > ?", (key, now),
+    ).fetchone()
+    return row["reply"] if row else None
+
+
+def _put_cached_reply(
+    conn: sqlite3.Connection, key: str, agent: str, reply: str, now: float, ttl: float, max_entries: int
+) -> int:
+    conn.execute(
+        "INSERT OR REPLACE INTO response_cache (key, agent, reply, created_at, expires_at, last_used) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (key, agent, reply, now, now + ttl, now),
+    )
+    return conn.execute(
+        "DELETE FROM response_cache WHERE agent = ? AND key NOT IN "
+        "(SELECT key FROM response_cache WHERE agent = ? ORDER BY last_used DESC LIMIT ?)",
+        (agent, agent, max_entries),
+    ).rowcount
+
+
+def _touch_cached_reply(conn: sqlite3.Connection, key: str, now: float) -> None:
+    conn.execute("UPDATE response_cache SET last_used = ? WHERE key = ?", (now, key))
+
+
+async def aget_cached_reply(key: str, now: float | None = None) -> str | None:
+    """Return the cached reply for `key` unless missing or expired. Runs on the DB thread."""
+    now = time.time() if now is None else now
+    return await _run_async(lambda conn: _get_cached_reply(conn, key, now), write=False)
+
+
+async def aput_cached_reply(key: str, agent: str, reply: str, ttl: float, max_entries: int) -> int:
+    """Store a reply for `ttl` seconds, then trim the agent's entries to `max_entries`.
+
+    Returns how many entries were evicted.
+    """
+    now = time.time()
+    return await _run_async(
+        lambda conn: _put_cached_reply(conn, key, agent, reply, now, ttl, max_entries), write=True,
+    )
+
+
+def touch_cached_reply(key: str, now: float | None = None) -> Future[None]:
+    """Mark a cached reply as just used, for LRU eviction. Doesn't wait for the write."""
+    now = time.time() if now is None else now
+    return _db().submit(lambda conn: _touch_cached_reply(conn, key, now), write=True)
+
+
+def clear_cached_replies(agent: str | None = None) -> int:
+    """Drop cached replies, for one agent or all. Returns how many were removed."""
+    with _db().write() as conn:
+        if agent:
+            return conn.execute("DELETE FROM response_cache WHERE agent = ?", (agent,)).rowcount
+        return conn.execute("DELETE FROM response_cache").rowcount
+
+
+# --- Key-value state ---
+#
+# Keys may be grouped into namespaces, stored as "<namespace>:<key>" (so
+# get_state("123", namespace="channel") reads the "channel:123" row). Values
+# can expire: expired rows read as missing and are deleted lazily on read and
+# by `sweep_expired`. Reads go through an in-process LRU cache that writes
+# from this process keep current; pass `fresh=True` for keys that other
+# processes write.
+
+
+def _qualify(key: str, namespace: str | None) -> str:
+    return f"{namespace}:{key}" if namespace else key
+
+
+def _expiry(ttl: float | None) -> float | None:
+    return time.time() + ttl if ttl is not None else None
+
+
+def _live(entry: _Entry, now: float) -> str | None:
+    value, expires_at = entry
+    if expires_at is not None and expires_at <= now:
+        return None
+    return value
+
+
+def _read_state(conn: sqlite3.Connection, keys: list[str]) -> dict[str, _Entry]:
+    found: dict[str, _Entry] = {key: _MISSING for key in keys}
+    # Stay well under SQLite's bound-parameter limit
+    for i in range(0, len(keys), 500):
+        batch = keys[i:i + 500]
+        rows = conn.execute(
+            f"SELECT key, value, expires_at FROM state WHERE key IN ({','.join('?' * len(batch))})",
+            batch,
+        ).fetchall()
+        for row in rows:
+            found[row["key"]] = (row["value"], row["expires_at"])
+    return found
+
+
+def _write_state(conn: sqlite3.Connection, items: dict[str, str], expires_at: float | None) -> None:
+    now = time.time()
+    conn.executemany(
+        "INSERT INTO state (key, value, updated_at, expires_at) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at, "
+        "expires_at = excluded.expires_at",
+        [(key, value, now, expires_at) for key, value in items.items()],
+    )
+    db = _db()
+    for key, value in items.items():
+        db.stage(key, (value, expires_at))
+
+
+def _delete_state(conn: sqlite3.Connection, keys: list[str], expired_only: bool = False) -> int:
+    sql = "DELETE FROM state WHERE key = ?"
+    params = [(key,) for key in keys]
+    if expired_only:
+        # Re-check expiry so a value rewritten since the read isn't lost
+        sql += " AND expires_at <= ?"
+        now = time.time()
+        params = [(key, now) for key in keys]
+    deleted = 0
+    db = _db()
+    for p in params:
+        n = conn.execute(sql, p).rowcount
+        if n or not expired_only:
+            db.stage(p[0], _MISSING)
+        deleted += n
+    return deleted
+
+
+def _cached(keys: list[str], fresh: bool) -> tuple[dict[str, _Entry], list[str]]:
+    """Split keys into cache hits and keys that need a database read."""
+    if fresh:
+        return {}, keys
+    cache = _db().cache
+    found: dict[str, _Entry] = {}
+    missing: list[str] = []
+    for key in keys:
+        entry = cache.get(key)
+        if entry is None:
+            missing.append(key)
+        else:
+            found[key] = entry
+    return found, missing
+
+
+def _fetch(conn: sqlite3.Connection, keys: list[str]) -> dict[str, _Entry]:
+    """Read keys from the database and fill the cache with them."""
+    cache = _db().cache
+    version = cache.version
+    rows = _read_state(conn, keys)
+    cache.fill(rows, version)
+    return rows
+
+
+def _lookup(keys: list[str], fresh: bool) -> dict[str, _Entry]:
+    found, missing = _cached(keys, fresh)
+    if missing:
+        with _db().read() as conn:
+            found.update(_fetch(conn, missing))
+    return found
+
+
+async def _alookup(keys: list[str], fresh: bool) -> dict[str, _Entry]:
+    found, missing = _cached(keys, fresh)
+    if missing:
+        found.update(await _run_async(lambda conn: _fetch(conn, missing), write=False))
+    return found
+
+
+def _values(found: dict[str, _Entry]) -> dict[str, str]:
+    """Drop missing and expired rows, scheduling deletion of expired ones."""
+    now = time.time()
+    values: dict[str, str] = {}
+    expired: list[str] = []
+    for key, entry in found.items():
+        value = _live(entry, now)
+        if value is not None:
+            values[key] = value
+        elif entry[0] is not None:
+            expired.append(key)
+    if expired:
+        _db().submit(lambda conn: _delete_state(conn, expired, expired_only=True), write=True)
+    return values
+
+
+def get_state(
+    key: str, default: str | None = None, namespace: str | None = None, fresh: bool = False
+) -> str | None:
+    """Get a value from the key-value state store."""
+    key = _qualify(key, namespace)
+    return _values(_lookup([key], fresh)).get(key, default)
+
+
+def set_state(key: str, value: str, namespace: str | None = None, ttl: float | None = None) -> None:
+    """Set a value in the key-value state store, optionally expiring after `ttl` seconds."""
+    with _db().write() as conn:
+        _write_state(conn, {_qualify(key, namespace): value}, _expiry(ttl))
+
+
+def delete_state(key: str, namespace: str | None = None) -> bool:
+    """Delete a key. Returns True if it existed."""
+    with _db().write() as conn:
+        return _delete_state(conn, [_qualify(key, namespace)]) > 0
+
+
+def get_many(keys: list[str], namespace: str | None = None, fresh: bool = False) -> dict[str, str]:
+    """Get several keys at once. Missing and expired keys are left out of the result."""
+    qualified = {_qualify(key, namespace): key for key in keys}
+    values = _values(_lookup(list(qualified), fresh))
+    return {qualified[k]: v for k, v in values.items()}
+
+
+def set_many(items: dict[str, str], namespace: str | None = None, ttl: float | None = None) -> None:
+    """Set several keys in one transaction."""
+    with _db().write() as conn:
+        _write_state(conn, {_qualify(k, namespace): v for k, v in items.items()}, _expiry(ttl))
+
+
+def list_state(namespace: str) -> dict[str, str]:
+    """Return every live key in a namespace (without the prefix). Bypasses the cache."""
+    prefix = f"{namespace}:"
+    # Range scan on the primary key: ";" sorts right after ":"
+    with _db().read() as conn:
+        rows = conn.execute(
+            "SELECT key, value FROM state WHERE key >= ? AND key < ? "
+            "AND (expires_at IS NULL OR expires_at > ?)",
+            (prefix, f"{namespace};", time.time()),
+        ).fetchall()
+    return {row["key"][len(prefix):]: row["value"] for row in rows}
+
+
+def _sweep_expired(conn: sqlite3.Connection) -> int:
+    now = time.time()
+    removed = conn.execute(
+        "DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,),
+    ).rowcount
+    return removed + conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,)).rowcount
+
+
+def sweep_expired() -> int:
+    """Delete every expired key and cached reply. Returns the number removed."""
+    with _db().write() as conn:
+        return _sweep_expired(conn)
+
+
+async def aget_state(
+    key: str, default: str | None = None, namespace: str | None = None, fresh: bool = False
+) -> str | None:
+    """Async `get_state`. Cache hits return immediately; misses read on the DB thread."""
+    key = _qualify(key, namespace)
+    return _values(await _alookup([key], fresh)).get(key, default)
+
+
+async def aset_state(key: str, value: str, namespace: str | None = None, ttl: float | None = None) -> None:
+    """Async `set_state`, batched with other writes on the DB thread."""
+    items = {_qualify(key, namespace): value}
+    await _run_async(lambda conn: _write_state(conn, items, _expiry(ttl)), write=True)
+
+
+async def adelete_state(key: str, namespace: str | None = None) -> bool:
+    """Async `delete_state`, batched with other writes on the DB thread."""
+    key = _qualify(key, namespace)
+    return await _run_async(lambda conn: _delete_state(conn, [key]) > 0, write=True)
+
+
+async def aget_many(keys: list[str], namespace: str | None = None, fresh: bool = False) -> dict[str, str]:
+    """Async `get_many`. Cache misses are read on the DB thread."""
+    qualified = {_qualify(key, namespace): key for key in keys}
+    values = _values(await _alookup(list(qualified), fresh))
+    return {qualified[k]: v for k, v in values.items()}
+
+
+async def aset_many(items: dict[str, str], namespace: str | None = None, ttl: float | None = None) -> None:
+    """Async `set_many`, batched with other writes on the DB thread."""
+    qualified = {_qualify(k, namespace): v for k, v in items.items()}
+    await _run_async(lambda conn: _write_state(conn, qualified, _expiry(ttl)), write=True)
+
+
+async def run_state_sweeper(interval: float = STATE_SWEEP_SECONDS) -> None:
+    """Periodically delete expired state keys and cached replies. Runs until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        await _run_async(_sweep_expired, write=True)
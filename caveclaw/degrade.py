@@ -0,0 +1,168 @@
+"""Load-aware degradation (``Config.degrade``).
+
+`agent_loop` reports the number of in-flight handlers and each message's
+inbound queue wait to a `LoadController`. Under pressure it steps up through
+levels, each keeping the cuts of the ones before:
+
+1. trim     — send a shorter history window
+2. fast     — answer with the fast model
+3. lean     — skip attachment preprocessing, HISTORY.md logging and summaries
+4. shed     — reply "busy" immediately without running the agent
+
+It steps up as soon as a threshold is crossed, but only steps down once load
+has stayed under `recover_ratio` of the current level's thresholds for
+`cooldown_seconds` per level, so it doesn't flap. Time with no messages at
+all counts as calm: after a long idle gap it drops straight back.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+
+from pydantic import BaseModel, Field, field_validator
+
+logger = logging.getLogger(__name__)
+
+LEVEL_NAMES = ("normal", "trim", "fast", "lean", "shed")
+QUEUE_WAIT_ALPHA = 0.3  # smoothing for the queue wait average
+
+_active: LoadController | None = None
+
+
+class DegradeConfig(BaseModel):
+    # Thresholds to enter levels 1-4; whichever signal is higher wins
+    inflight: list[int] = Field(default_factory=lambda: [16, 32, 48, 64])
+    queue_wait_ms: list[float] = Field(default_factory=lambda: [1000, 3000, 10000, 30000])
+    history_turns: int = 10  # history window from level 1
+    fast_model: str | None = None  # level 2+; defaults to the agent's routing.fast_model
+    recover_ratio: float = 0.5
+    cooldown_seconds: float = 30.0
+    busy_message: str = "I'm swamped right now, please try again in a minute."
+
+    @field_validator("inflight", "queue_wait_ms")
+    @classmethod
+    def _four_levels(cls, v: list) -> list:
+        if len(v) != len(LEVEL_NAMES) - 1:
+            raise ValueError(f"needs exactly {len(LEVEL_NAMES) - 1} thresholds, one per level")
+        if any(a > b for a, b in zip(v, v[1:])):
+            raise ValueError("thresholds must not decrease")
+        return v
+
+
+@dataclass(frozen=True)
+class Plan:
+    """What handle_message should cut for one message."""
+    level: int = 0
+    history_turns: int | None = None
+    fast_model: bool = False
+    skip_extras: bool = False
+    shed: bool = False
+
+    @property
+    def name(self) -> str:
+        return LEVEL_NAMES[self.level]
+
+
+NORMAL = Plan()
+
+
+def plan_for(level: int, cfg: DegradeConfig) -> Plan:
+    return Plan(
+        level=level,
+        history_turns=cfg.history_turns if level >= 1 else None,
+        fast_model=level >= 2,
+        skip_extras=level >= 3,
+        shed=level >= 4,
+    )
+
+
+def _level(value: float, thresholds: list[float]) -> int:
+    return sum(1 for t in thresholds if value >= t)
+
+
+class LoadController:
+    """Tracks load and picks the degradation level with hysteresis."""
+
+    def __init__(self, clock=time.monotonic) -> None:
+        self.clock = clock
+        self.level = 0
+        self.in_flight = 0
+        self.queue_wait = 0.0  # smoothed, seconds
+        self.shed = 0
+        self.transitions = 0
+        self.plan = NORMAL
+        self._last_seen: float | None = None
+        # When load was last above the recovery thresholds, and the level then
+        self._last_busy = 0.0
+        self._busy_level = 0
+
+    def observe(self, in_flight: int, queue_wait: float, cfg: DegradeConfig) -> Plan:
+        """Record the load seen when a message is dequeued and return its plan."""
+        global _active
+        _active = self
+        now = self.clock()
+        self.in_flight = in_flight
+        if self._last_seen is not None and now - self._last_seen >= cfg.cooldown_seconds:
+            self.queue_wait = 0.0  # the average is stale after an idle gap
+        self._last_seen = now
+        self.queue_wait += QUEUE_WAIT_ALPHA * (queue_wait - self.queue_wait)
+        wait_ms = self.queue_wait * 1000
+        target = max(_level(in_flight, cfg.inflight), _level(wait_ms, cfg.queue_wait_ms))
+        if target > self.level:
+            self._set(target, now)
+        elif self.level:
+            i = self.level - 1
+            calm = (
+                in_flight < cfg.inflight[i] * cfg.recover_ratio
+                and wait_ms < cfg.queue_wait_ms[i] * cfg.recover_ratio
+            )
+            if not calm:
+                self._last_busy, self._busy_level = now, self.level
+            else:
+                # One level per cooldown since load was last high, idle time included
+                steps = int((now - self._last_busy) // cfg.cooldown_seconds)
+                level = max(target, self._busy_level - steps)
+                if level < self.level:
+                    self._set(level, now)
+        self.plan = plan_for(self.level, cfg)
+        if self.plan.shed:
+            self.shed += 1
+        return self.plan
+
+    def _set(self, level: int, now: float) -> None:
+        logger.warning(
+            "Load level %s -> %s (in flight %d, queue wait %.0f ms)",
+            LEVEL_NAMES[self.level], LEVEL_NAMES[level], self.in_flight, self.queue_wait * 1000,
+        )
+        if level > self.level:
+            self._last_busy, self._busy_level = now, level
+        self.level = level
+        self.transitions += 1
+
+    def stats(self) -> dict:
+        return {
+            "level": self.level,
+            "name": LEVEL_NAMES[self.level],
+            "in_flight": self.in_flight,
+            "queue_wait_ms": round(self.queue_wait * 1000, 1),
+            "shed": self.shed,
+            "transitions": self.transitions,
+        }
+
+
+def current_plan() -> Plan:
+    """The plan from the most recent observation (NORMAL if degradation is off)."""
+    return _active.plan if _active else NORMAL
+
+
+def active() -> LoadController | None:
+    return _active
+
+
+def deactivate(controller: LoadController) -> None:
+    """Forget `controller` if it's the active one (when its agent loop exits)."""
+    global _active
+    if _active is controller:
+        _active = None
@@ -0,0 +1,61 @@
+"""A deterministic stand-in for ClaudeSDKClient (``model_backend: "fake"``).
+
+Answers without any network call after a simulated time-to-first-token and
+per-token delay, so the rest of the pipeline can be measured on its own.
+The reply and its jitter depend only on the prompt and `seed`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import zlib
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from typing import Any
+
+from claude_agent_sdk import AssistantMessage, TextBlock
+
+
+@dataclass(frozen=True)
+class FakeProfile:
+    latency_ms: float = 200.0  # time to first token
+    jitter_ms: float = 0.0  # +/- uniform, derived from the prompt
+    tokens: int = 40  # words in each reply
+    token_ms: float = 0.0  # delay per streamed token
+    seed: int = 0
+
+
+class FakeSDKClient:
+    """Async context manager with the `query` / `receive_response` surface used by the agent."""
+
+    def __init__(self, options: Any = None, profile: FakeProfile = FakeProfile()) -> None:
+        self.options = options
+        self.profile = profile
+        self._prompt = ""
+
+    async def __aenter__(self) -> FakeSDKClient:
+        return self
+
+    async def __aexit__(self, *exc: object) -> bool:
+        return False
+
+    async def query(self, prompt: str, session_id: str = "default") -> None:
+        self._prompt = prompt
+
+    async def receive_response(self) -> AsyncIterator[AssistantMessage]:
+        p = self.profile
+        rng = random.Random(zlib.crc32(self._prompt.encode()) ^ p.seed)
+        delay = p.latency_ms + rng.uniform(-p.jitter_ms, p.jitter_ms)
+        await asyncio.sleep(max(0.0, delay) / 1000)
+        words = [f"tok{rng.randrange(1000)}" for _ in range(p.tokens)]
+        if p.token_ms:
+            # Tokens arrive one by one; the agent only keeps the final text
+            for _ in words:
+                await asyncio.sleep(p.token_ms / 1000)
+        model = getattr(self.options, "model", None) or "fake"
+        yield AssistantMessage(
+            content=[TextBlock(text=" ".join(words))],
+            model=model,
+            usage={"output_tokens": p.tokens},
+        )
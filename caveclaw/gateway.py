@@ -0,0 +1,116 @@
+"""Gateway — runs the agent loop with every enabled channel and background service.
+
+SIGTERM (or Ctrl-C) starts a graceful shutdown: the scheduler stops, channels
+stop accepting messages, replies already in progress get up to
+`shutdown_drain_seconds` to finish and be delivered, and anything still
+running after that is recorded as interrupted. A second signal exits at once.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+import time
+
+from caveclaw.agent import agent_loop
+from caveclaw.bus import MessageBus
+from caveclaw.config import Config
+from caveclaw.db import close_db, run_state_sweeper
+from caveclaw.profiling import install_signal_handlers
+from caveclaw.reload import ConfigWatcher
+from caveclaw.scheduler import Scheduler
+from caveclaw.watchdog import LoopWatchdog
+
+logger = logging.getLogger(__name__)
+
+
+async def _drop_outbound(bus: MessageBus) -> None:
+    """Without Discord nothing else reads the outbound queue; keep it from growing."""
+    while True:
+        msg = await bus.consume_outbound()
+        logger.warning(
+            "No channel to deliver a reply for %s:%s; dropped", msg.channel, msg.chat_id,
+            extra={"correlation_id": msg.correlation_id},
+        )
+        bus.outbound_done()
+
+
+def _install_stop_handlers(stop: asyncio.Event) -> None:
+    """First SIGTERM/SIGINT sets `stop`; a second one cancels the gateway outright."""
+    loop = asyncio.get_running_loop()
+    main = asyncio.current_task()
+
+    def on_signal() -> None:
+        if stop.is_set():
+            main.cancel()
+        else:
+            logger.info("Shutting down; signal again to exit immediately")
+            stop.set()
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, on_signal)
+        except (NotImplementedError, RuntimeError):  # Windows, or not the main thread
+            pass
+
+
+async def run_gateway(config: Config) -> None:
+    """Run Discord (if `discord_token` is set), HTTP (if `http_port` is set),
+    the agent loop, scheduler, state sweeper, config watcher and loop watchdog together."""
+    bus = MessageBus()
+    watcher = ConfigWatcher(config)
+    stop = asyncio.Event()
+    _install_stop_handlers(stop)
+    if install_signal_handlers():
+        logger.info("Profiling: SIGUSR1 toggles CPU sampling, SIGUSR2 takes a memory snapshot")
+    agent = asyncio.create_task(agent_loop(config, bus, watcher))
+    scheduler = asyncio.create_task(Scheduler(config, bus).run()) if config.scheduler_enabled else None
+    jobs = [run_state_sweeper()]
+    if config.config_reload_seconds:
+        jobs.append(watcher.run(config.config_reload_seconds))
+    if config.loop_watchdog_ms:
+        jobs.append(LoopWatchdog(config.loop_watchdog_ms / 1000).run())
+    if config.discord_token:
+        from caveclaw.channels.discord import run_discord
+
+        jobs.append(run_discord(config, bus, watcher))
+    else:
+        jobs.append(_drop_outbound(bus))
+    if config.http_port is not None:
+        from caveclaw.channels.http import run_http
+
+        jobs.append(run_http(config, bus, watcher))
+    tasks = [agent, *(asyncio.create_task(job) for job in jobs)] + ([scheduler] if scheduler else [])
+    try:
+        # Run until a signal, or until any service fails
+        stopping = asyncio.create_task(stop.wait())
+        done, _ = await asyncio.wait([stopping, *tasks], return_when=asyncio.FIRST_COMPLETED)
+        stopping.cancel()
+        for task in done - {stopping}:
+            task.result()  # re-raise the failure
+        await _drain(bus, agent, scheduler, watcher.current.shutdown_drain_seconds)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        close_db()  # waits for queued writes
+
+
+async def _drain(
+    bus: MessageBus, agent: asyncio.Task[None], scheduler: asyncio.Task[None] | None, deadline: float
+) -> None:
+    """Stop taking new work, then give the agent loop and outbound senders until `deadline`."""
+    started = time.monotonic()
+    if scheduler:
+        scheduler.cancel()
+    bus.close()
+    try:
+        await asyncio.wait_for(agent, deadline)
+    except asyncio.TimeoutError:
+        logger.warning("Shutdown: replies still running after %.0fs were interrupted", deadline)
+    remaining = max(1.0, deadline - (time.monotonic() - started))
+    try:
+        await asyncio.wait_for(bus.join_outbound(), remaining)
+    except asyncio.TimeoutError:
+        logger.warning("Shutdown: some replies could not be delivered in time")
@@ -0,0 +1,126 @@
+"""Image preprocessing — downscale and re-encode attachments before agents see them.
+
+Pillow is optional (``pip install caveclaw[images]``). Without it, attachments
+are passed through untouched.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+
+from caveclaw.bus import Attachment
+
+logger = logging.getLogger(__name__)
+
+# Animated GIFs would lose their frames, so they are passed through as-is.
+PROCESSABLE_TYPES = {"image/png", "image/jpeg", "image/webp"}
+
+_FORMATS = {
+    "webp": ("WEBP", "image/webp", ".webp"),
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+}
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=2)
+    return _pool
+
+
+def shutdown_pool() -> None:
+    """Stop the worker processes, if any were started."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def optimize_image(src: str, dest: str, max_edge: int, quality: int, fmt: str) -> int:
+    """Downscale `src` so its longest edge is <= max_edge and re-encode to `dest`.
+
+    Metadata (EXIF, ICC, comments) is dropped because only pixel data is
+    copied to the new file. Returns the size of the written file in bytes.
+    Runs in a worker process, so it only takes and returns plain values.
+    """
+    from PIL import Image, ImageOps
+
+    pil_format = _FORMATS[fmt][0]
+    with Image.open(src) as img:
+        # Apply the EXIF orientation before the tag is discarded
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(dest, format=pil_format, quality=quality, optimize=True)
+    return Path(dest).stat().st_size
+
+
+def pillow_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def preprocess_attachments(
+    attachments: list[Attachment],
+    max_edge: int,
+    quality: int = 85,
+    fmt: str = "webp",
+) -> list[Attachment]:
+    """Return attachments pointing at optimized copies of each image.
+
+    The original file stays on disk and is recorded in ``original_path`` /
+    ``original_size``. Attachments that can't be processed are returned
+    unchanged.
+    """
+    if not attachments or not pillow_available():
+        return attachments
+    if fmt not in _FORMATS:
+        raise ValueError(f"Unsupported image format: {fmt}")
+    _, content_type, suffix = _FORMATS[fmt]
+
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    jobs: list[tuple[str, asyncio.Future[int]] | None] = []
+    for att in attachments:
+        if att.content_type not in PROCESSABLE_TYPES:
+            jobs.append(None)
+            continue
+        dest = str(Path(att.path).with_suffix(f".opt{suffix}"))
+        jobs.append((dest, loop.run_in_executor(pool, optimize_image, att.path, dest, max_edge, quality, fmt)))
+
+    results: list[Attachment] = []
+    for att, job in zip(attachments, jobs):
+        if job is None:
+            results.append(att)
+            continue
+        dest, future = job
+        try:
+            size = await future
+        except Exception as e:
+            logger.warning("Failed to optimize attachment %s: %s", att.filename, e)
+            results.append(att)
+            continue
+        if size >= att.size:
+            # Re-encoding didn't help — keep the original
+            Path(dest).unlink(missing_ok=True)
+            results.append(att)
+            continue
+        results.append(replace(
+            att,
+            path=dest,
+            content_type=content_type,
+            size=size,
+            original_path=att.path,
+            original_size=att.size,
+        ))
+    return results
@@ -0,0 +1,56 @@
+"""JSONL helpers — fast line encoding and reading a file's tail.
+
+Uses orjson when installed (``pip install caveclaw[fast]``) and the stdlib
+json module otherwise. Both write plain one-object-per-line JSON, so files
+stay readable and interchangeable between the two.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def dumps(obj: Any) -> str:
+    """Encode one JSONL line (without the newline)."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def loads(line: str | bytes) -> Any:
+    """Decode one JSONL line."""
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def tail_bytes(path: Path, n: int, block_size: int = 8192) -> list[bytes]:
+    """Return the last `n` lines of a file by reading blocks backwards from the end."""
+    if n <= 0:
+        return []
+    with path.open("rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        # n newlines bound n-1 full lines; one more finds the start of the nth
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    return data.splitlines(keepends=True)[-n:]
+
+
+def tail_lines(path: Path, n: int, block_size: int = 8192) -> list[str]:
+    """`tail_bytes`, decoded."""
+    return [line.decode(errors="replace") for line in tail_bytes(path, n, block_size)]
@@ -0,0 +1,117 @@
+"""Structured logging — records are formatted and written off the event loop.
+
+`setup_logging` routes the ``caveclaw`` loggers through a QueueHandler to a
+QueueListener thread, so a slow stdout (e.g. Docker's json-file driver) never
+blocks the loop. Every inbound message gets a correlation id at ingress
+(`InboundMessage.correlation_id`); while it's being handled, each record
+carries that id. DEBUG records can be sampled per message (`log_debug_sample`):
+a message's debug trail is kept or dropped as a whole.
+"""
+
+from __future__ import annotations
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import zlib
+from contextvars import ContextVar
+from typing import IO
+
+correlation_id: ContextVar[str | None] = ContextVar("correlation_id", default=None)
+
+TEXT_FORMAT = "%(message)s"
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "correlation_id"}
+
+
+def _sampled(cid: str | None, rate: float) -> bool:
+    if rate >= 1.0:
+        return True
+    if cid is None:
+        return random.random() < rate
+    return zlib.crc32(cid.encode()) / 2**32 < rate
+
+
+class ContextFilter(logging.Filter):
+    """Stamps records with the current correlation id and samples DEBUG ones."""
+
+    def __init__(self, debug_sample: float = 1.0) -> None:
+        super().__init__()
+        self.debug_sample = debug_sample
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # An id passed with `extra=` wins over the one from the current context
+        record.correlation_id = getattr(record, "correlation_id", None) or correlation_id.get()
+        if record.levelno <= logging.DEBUG:
+            return _sampled(record.correlation_id, self.debug_sample)
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, correlation_id, extras, exc."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "correlation_id", None):
+            entry["correlation_id"] = record.correlation_id
+        entry.update((k, v) for k, v in vars(record).items() if k not in _RECORD_FIELDS)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _Handoff(logging.handlers.QueueHandler):
+    """Resolves the message and traceback on the calling thread; formatting happens on the listener."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def setup_logging(
+    level: str = "INFO", fmt: str = "text", debug_sample: float = 1.0, stream: IO[str] | None = None
+) -> None:
+    """Send ``caveclaw`` log records to `stream` (stdout) through a background thread."""
+    global _listener
+    stop_logging()
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JSONFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    handoff = _Handoff(records)
+    handoff.addFilter(ContextFilter(debug_sample))
+    logger = logging.getLogger("caveclaw")
+    logger.handlers = [handoff]
+    logger.setLevel(level)
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+    atexit.unregister(stop_logging)
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Write out queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
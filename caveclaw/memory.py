@@ -2,9 +2,36 @@
 
 from __future__ import annotations
 
+import asyncio
+import gzip
+import itertools
+import logging
+import math
+import re
+import shutil
+import threading
 import time
+from collections import Counter
+from dataclasses import dataclass
 from pathlib import Path
 
+from caveclaw.jsonl import tail_lines
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FLUSH_SECONDS = 2.0
+HISTORY_FLUSH_BYTES = 64 * 1024  # flush early once this much is buffered
+HISTORY_MAX_BYTES = 1024 * 1024  # rotate HISTORY.md past this size
+HISTORY_ROTATE_DAILY = False
+HISTORY_ARCHIVE_DIR = "history"
+
+DEFAULT_PINNED_SECTIONS = ("core", "pinned")
+PARTIAL_MEMORY_NOTE = "_Showing the memory most relevant to this message. Read MEMORY.md for the rest._"
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_BULLET = re.compile(r"^([-*+]|\d+[.)])\s")
+_WORD = re.compile(r"\w+")
+
 
 def _memory_path(workspace: Path) -> Path:
     return workspace / "MEMORY.md"
@@ -28,17 +55,350 @@ def write_memory(workspace: Path, content: str) -> None:
     _memory_path(workspace).write_text(content)
 
 
-def read_history(workspace: Path) -> str:
-    """Read HISTORY.md, return empty string if it doesn't exist."""
+def read_history(workspace: Path, tail: int | None = None) -> str:
+    """Read HISTORY.md, return empty string if it doesn't exist.
+
+    With `tail`, only the last `tail` lines are read (from the end of the file).
+    """
     path = _history_path(workspace)
-    if path.exists():
+    if not path.exists():
+        return ""
+    if tail is None:
         return path.read_text()
-    return ""
+    return "".join(tail_lines(path, tail))
+
+
+def read_history_range(workspace: Path, start: int, stop: int | None = None) -> list[str]:
+    """Return lines [start, stop) of HISTORY.md, reading no further than `stop`."""
+    path = _history_path(workspace)
+    if not path.exists():
+        return []
+    with path.open() as f:
+        return list(itertools.islice(f, start, stop))
+
+
+def history_archives(workspace: Path) -> list[Path]:
+    """Rotated HISTORY.md archives, oldest first."""
+    archive_dir = workspace / HISTORY_ARCHIVE_DIR
+    if not archive_dir.is_dir():
+        return []
+    return sorted(archive_dir.glob("HISTORY-*.md.gz"), key=lambda p: (p.stat().st_mtime, p.name))
+
+
+def configure_history(max_bytes: int | None = None, rotate_daily: bool | None = None) -> None:
+    """Set the rotation policy used by every history writer."""
+    global HISTORY_MAX_BYTES, HISTORY_ROTATE_DAILY
+    if max_bytes is not None:
+        HISTORY_MAX_BYTES = max_bytes
+    if rotate_daily is not None:
+        HISTORY_ROTATE_DAILY = rotate_daily
+
+
+class HistoryWriter:
+    """Buffers HISTORY.md events and appends them in batches, rotating the file.
+
+    The file is archived to history/HISTORY-<date>-<time>.md.gz once it
+    exceeds HISTORY_MAX_BYTES, or (with HISTORY_ROTATE_DAILY) when it was
+    last written on an earlier day.
+    """
+
+    def __init__(self, workspace: Path) -> None:
+        self.workspace = workspace
+        self._buffer: list[str] = []
+        self._buffered_bytes = 0
+        self._lock = threading.Lock()  # guards the buffer
+        self._file_lock = threading.Lock()  # serializes flushes
+
+    def append(self, event: str) -> bool:
+        """Buffer an event. Returns True once the buffer should be flushed."""
+        ts = time.strftime("%Y-%m-%d %H:%M:%S")
+        line = f"- [{ts}] {event}\n"
+        with self._lock:
+            self._buffer.append(line)
+            self._buffered_bytes += len(line)
+            return self._buffered_bytes >= HISTORY_FLUSH_BYTES
+
+    def flush(self) -> None:
+        """Write buffered events to HISTORY.md."""
+        with self._file_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+                self._buffered_bytes = 0
+            if not lines:
+                return
+            self.workspace.mkdir(parents=True, exist_ok=True)
+            path = _history_path(self.workspace)
+            self._maybe_rotate(path)
+            with path.open("a") as f:
+                f.writelines(lines)
+
+    def _maybe_rotate(self, path: Path) -> None:
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return
+        if st.st_size == 0:
+            return
+        modified = time.localtime(st.st_mtime)
+        stale = HISTORY_ROTATE_DAILY and time.strftime("%Y%m%d", modified) != time.strftime("%Y%m%d")
+        if st.st_size < HISTORY_MAX_BYTES and not stale:
+            return
+        archive_dir = self.workspace / HISTORY_ARCHIVE_DIR
+        archive_dir.mkdir(exist_ok=True)
+        stem = f"HISTORY-{time.strftime('%Y%m%d-%H%M%S', modified)}"
+        archive = archive_dir / f"{stem}.md.gz"
+        n = 1
+        while archive.exists():
+            archive = archive_dir / f"{stem}-{n}.md.gz"
+            n += 1
+        # Rename first so concurrent appends (e.g. by the agent's own tools) start a new file
+        rotating = path.with_suffix(".md.rotating")
+        path.rename(rotating)
+        with rotating.open("rb") as src, gzip.open(archive, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        rotating.unlink()
+
+
+_writers: dict[Path, HistoryWriter] = {}
+_flush_wakeup: asyncio.Event | None = None
+
+
+def history_writer(workspace: Path) -> HistoryWriter:
+    """Return the shared writer for a workspace."""
+    writer = _writers.get(workspace)
+    if writer is None:
+        writer = _writers.setdefault(workspace, HistoryWriter(workspace))
+    return writer
 
 
 def append_history(workspace: Path, event: str) -> None:
-    """Append an event to HISTORY.md."""
-    workspace.mkdir(parents=True, exist_ok=True)
-    ts = time.strftime("%Y-%m-%d %H:%M:%S")
-    with _history_path(workspace).open("a") as f:
-        f.write(f"- [{ts}] {event}\n")
+    """Append an event to HISTORY.md.
+
+    While `run_history_flusher` is running the event is buffered and written
+    in the background; otherwise it is written immediately.
+    """
+    writer = history_writer(workspace)
+    full = writer.append(event)
+    if _flush_wakeup is None:
+        writer.flush()
+    elif full:
+        _flush_wakeup.set()
+
+
+def flush_history() -> None:
+    """Write every buffered history event."""
+    for writer in list(_writers.values()):
+        writer.flush()
+
+
+async def run_history_flusher(interval: float = HISTORY_FLUSH_SECONDS) -> None:
+    """Flush buffered history every `interval` seconds, or sooner when a buffer fills.
+
+    Runs until cancelled, then flushes what's left. A failed flush (disk full,
+    permissions) is logged and its events are dropped; the flusher keeps going.
+    """
+    global _flush_wakeup
+    wakeup = _flush_wakeup = asyncio.Event()
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(wakeup.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+            for writer in list(_writers.values()):
+                try:
+                    await asyncio.to_thread(writer.flush)
+                except Exception:
+                    logger.exception("Writing HISTORY.md in %s failed", writer.workspace)
+    finally:
+        if _flush_wakeup is wakeup:
+            _flush_wakeup = None
+        flush_history()
+
+
+# --- Structured memory ---
+
+
+@dataclass(frozen=True)
+class MemoryItem:
+    """One bullet, paragraph or code block from MEMORY.md."""
+    text: str
+    headings: tuple[str, ...]  # enclosing heading lines, outermost first
+    pinned: bool
+    position: int
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def parse_memory(text: str, pinned_sections: tuple[str, ...] = DEFAULT_PINNED_SECTIONS) -> list[MemoryItem]:
+    """Split MEMORY.md into items under their headings.
+
+    Text before the first heading, and everything under a heading whose title
+    contains one of `pinned_sections`, is marked pinned.
+    """
+    pinned_words = tuple(p.lower() for p in pinned_sections)
+    items: list[MemoryItem] = []
+    headings: list[tuple[int, str]] = []  # (level, line)
+    block: list[str] = []
+    in_fence = False
+
+    def flush() -> None:
+        body = "\n".join(block).strip("\n")
+        block.clear()
+        if not body.strip():
+            return
+        titles = [line.lstrip("#").strip().lower() for _, line in headings]
+        pinned = not headings or any(w in t for t in titles for w in pinned_words)
+        items.append(MemoryItem(body, tuple(line for _, line in headings), pinned, len(items)))
+
+    for line in text.splitlines():
+        if line.lstrip().startswith("```"):
+            if not in_fence:
+                flush()
+            in_fence = not in_fence
+            block.append(line)
+            if not in_fence:
+                flush()
+            continue
+        if in_fence:
+            block.append(line)
+            continue
+        heading = _HEADING.match(line)
+        if heading:
+            flush()
+            level = len(heading.group(1))
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, line.strip()))
+        elif not line.strip():
+            flush()
+        elif _BULLET.match(line):
+            flush()
+            block.append(line)
+        else:
+            # Indented lines continue the current bullet; others join the paragraph
+            block.append(line)
+    flush()
+    return items
+
+
+def _terms(text: str) -> list[str]:
+    return _WORD.findall(text.lower())
+
+
+class MemoryIndex:
+    """BM25 index over memory items."""
+
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, items: list[MemoryItem]) -> None:
+        self.items = items
+        self._tfs: list[Counter[str]] = []
+        df: Counter[str] = Counter()
+        for item in items:
+            # Headings count toward an item so "safeway" finds the Safeway list
+            tf = Counter(_terms(item.text + " " + " ".join(item.headings)))
+            self._tfs.append(tf)
+            df.update(tf.keys())
+        self._lengths = [sum(tf.values()) for tf in self._tfs]
+        self._avg_len = (sum(self._lengths) / len(items)) if items else 0.0
+        n = len(items)
+        self._idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def search(self, query: str, top_k: int) -> list[tuple[float, MemoryItem]]:
+        """Return up to `top_k` unpinned items matching `query`, best first."""
+        terms = set(_terms(query)) & self._idf.keys()
+        if not terms:
+            return []
+        scored: list[tuple[float, MemoryItem]] = []
+        for item, tf, length in zip(self.items, self._tfs, self._lengths):
+            if item.pinned:
+                continue
+            score = 0.0
+            for t in terms:
+                f = tf.get(t)
+                if f:
+                    norm = self.K1 * (1 - self.B + self.B * length / self._avg_len)
+                    score += self._idf[t] * f * (self.K1 + 1) / (f + norm)
+            if score > 0:
+                scored.append((score, item))
+        scored.sort(key=lambda pair: (-pair[0], pair[1].position))
+        return scored[:top_k]
+
+
+_index_cache: dict[tuple[Path, tuple[str, ...]], tuple[tuple[int, int], MemoryIndex]] = {}
+
+
+def memory_index(workspace: Path, pinned_sections: tuple[str, ...] = DEFAULT_PINNED_SECTIONS) -> MemoryIndex:
+    """Return the index for a workspace's MEMORY.md, rebuilt only when the file changes."""
+    path = _memory_path(workspace)
+    try:
+        st = path.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        stamp = (0, 0)
+    key = (path, pinned_sections)
+    cached = _index_cache.get(key)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    index = MemoryIndex(parse_memory(read_memory(workspace), pinned_sections))
+    _index_cache[key] = (stamp, index)
+    return index
+
+
+def render_items(items: list[MemoryItem]) -> str:
+    """Render items in document order, repeating only the headings that change."""
+    out: list[str] = []
+    current: tuple[str, ...] = ()
+    for item in sorted(items, key=lambda i: i.position):
+        common = 0
+        while common < min(len(current), len(item.headings)) and current[common] == item.headings[common]:
+            common += 1
+        out.extend(item.headings[common:])
+        current = item.headings
+        out.append(item.text)
+    return "\n\n".join(out)
+
+
+def select_memory(
+    workspace: Path,
+    query: str,
+    top_k: int = 8,
+    token_budget: int = 1000,
+    pinned_sections: tuple[str, ...] = DEFAULT_PINNED_SECTIONS,
+) -> str:
+    """Return the pinned core of MEMORY.md plus the items most relevant to `query`.
+
+    If the whole file fits in `token_budget`, it is returned as-is.
+    """
+    return select_from_index(memory_index(workspace, pinned_sections), query, top_k, token_budget)
+
+
+def select_from_index(index: MemoryIndex, query: str, top_k: int, token_budget: int) -> str:
+    """`select_memory` over an already-built index."""
+    if not index.items:
+        return ""
+    if sum(item.tokens for item in index.items) <= token_budget:
+        return render_items(index.items)
+
+    chosen: list[MemoryItem] = []
+    used = 0
+    for item in index.items:
+        if item.pinned and used + item.tokens <= token_budget:
+            chosen.append(item)
+            used += item.tokens
+    for _, item in index.search(query, top_k):
+        if used + item.tokens <= token_budget:
+            chosen.append(item)
+            used += item.tokens
+    body = render_items(chosen)
+    return f"{body}\n\n{PARTIAL_MEMORY_NOTE}" if body else PARTIAL_MEMORY_NOTE
@@ -0,0 +1,213 @@
+"""Live profiling of a running gateway.
+
+CPU: a sampling thread records every thread's stack at a fixed interval, so
+it can run under real traffic. On stop it writes a summary (hottest
+functions, by self and total samples) and a folded-stack file for
+flamegraph tools. Memory: the first snapshot starts tracemalloc; each later
+one writes the top allocations and the growth since the previous snapshot.
+
+Triggered by SIGUSR1 (CPU start/stop) and SIGUSR2 (memory snapshot) or the
+`!profile` Discord command. Reports go to ``~/.caveclaw/profiles/``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+from caveclaw.config import CONFIG_DIR
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = CONFIG_DIR / "profiles"
+SAMPLE_INTERVAL_SECONDS = 0.005
+TOP_N = 25
+TRACEMALLOC_FRAMES = 10
+
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples the stacks of all other threads from a background thread."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL_SECONDS) -> None:
+        self.interval = interval
+        self.stacks: Counter[tuple[str, ...]] = Counter()
+        self.samples = 0
+        self.started_at = 0.0
+        self.stopped_at = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> None:
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.stopped_at = time.time()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack: list[str] = []
+                while frame is not None:
+                    stack.append(_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def report(self) -> str:
+        """Hottest functions by self and total (inclusive) samples."""
+        total = sum(self.stacks.values()) or 1
+        own: Counter[str] = Counter()
+        inclusive: Counter[str] = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for func in set(stack[1:]):
+                inclusive[func] += count
+        lines = [
+            f"CPU profile: {self.samples} samples every {self.interval * 1000:g} ms "
+            f"over {self.stopped_at - self.started_at:.1f}s",
+            "",
+            f"Top {TOP_N} by self samples:",
+        ]
+        lines += [f"{n / total:7.1%}  {n:7d}  {f}" for f, n in own.most_common(TOP_N)]
+        lines += ["", f"Top {TOP_N} by total samples:"]
+        lines += [f"{n / total:7.1%}  {n:7d}  {f}" for f, n in inclusive.most_common(TOP_N)]
+        return "\n".join(lines) + "\n"
+
+    def folded(self) -> str:
+        """Stacks in the folded format read by flamegraph.pl / speedscope."""
+        return "".join(f"{';'.join(s)} {n}\n" for s, n in self.stacks.items())
+
+
+class Profiler:
+    """Owns the CPU sampler and tracemalloc snapshots for one process."""
+
+    def __init__(self, out_dir: Path | None = None) -> None:
+        self.out_dir = out_dir or PROFILE_DIR
+        self.sampler: StackSampler | None = None
+        self._snapshot: tracemalloc.Snapshot | None = None
+        self._lock = threading.Lock()
+
+    def _path(self, kind: str, suffix: str) -> Path:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        return self.out_dir / f"{kind}-{stamp}{suffix}"
+
+    def toggle_cpu(self) -> str:
+        """Start CPU sampling, or stop it and write the report. Returns a status line."""
+        with self._lock:
+            if self.sampler is None:
+                self.sampler = StackSampler()
+                self.sampler.start()
+                return "CPU profiling started; trigger again to stop and write the report."
+            sampler, self.sampler = self.sampler, None
+        sampler.stop()
+        path = self._path("cpu", ".txt")
+        path.write_text(sampler.report())
+        path.with_suffix(".folded").write_text(sampler.folded())
+        return f"CPU profile ({sampler.samples} samples) written to {path}"
+
+    def memory_snapshot(self) -> str:
+        """Start tracemalloc, or write the top allocations and growth since the last snapshot."""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._snapshot = tracemalloc.take_snapshot()
+                return "Memory tracing started; trigger again to write a snapshot."
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ))
+            previous, self._snapshot = self._snapshot, snapshot
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"Traced memory: {current / 1e6:.1f} MB (peak {peak / 1e6:.1f} MB)",
+            "",
+            f"Top {TOP_N} allocations by line:",
+        ]
+        lines += [str(stat) for stat in snapshot.statistics("lineno")[:TOP_N]]
+        if previous is not None:
+            lines += ["", f"Top {TOP_N} changes since the previous snapshot:"]
+            lines += [str(stat) for stat in snapshot.compare_to(previous, "lineno")[:TOP_N]]
+        path = self._path("mem", ".txt")
+        path.write_text("\n".join(lines) + "\n")
+        return f"Memory snapshot ({current / 1e6:.1f} MB traced) written to {path}"
+
+    def stop_memory(self) -> str:
+        with self._lock:
+            self._snapshot = None
+            if not tracemalloc.is_tracing():
+                return "Memory tracing is not running."
+            tracemalloc.stop()
+        return "Memory tracing stopped."
+
+    def status(self) -> str:
+        cpu = f"running ({self.sampler.samples} samples)" if self.sampler else "off"
+        mem = "tracing" if tracemalloc.is_tracing() else "off"
+        return f"CPU profiler: {cpu}. Memory tracing: {mem}. Reports: {self.out_dir}"
+
+
+profiler = Profiler()
+_signal_tasks: set[asyncio.Task[None]] = set()
+
+
+async def run_action(action: str) -> str:
+    """Run a profiler action ("cpu", "mem", "mem-stop" or "status") off the loop."""
+    actions = {
+        "cpu": profiler.toggle_cpu,
+        "mem": profiler.memory_snapshot,
+        "mem-stop": profiler.stop_memory,
+        "status": profiler.status,
+    }
+    if action not in actions:
+        return f"Unknown profile action `{action}`. Use: {', '.join(actions)}"
+    return await asyncio.to_thread(actions[action])
+
+
+def install_signal_handlers() -> bool:
+    """SIGUSR1 toggles CPU profiling, SIGUSR2 takes a memory snapshot. Unix only."""
+    if not hasattr(signal, "SIGUSR1"):
+        return False
+    loop = asyncio.get_running_loop()
+
+    async def report(action: str) -> None:
+        try:
+            logger.info(await run_action(action))
+        except Exception:
+            logger.exception("Profiling (%s) failed", action)
+
+    def trigger(action: str) -> None:
+        task = loop.create_task(report(action))
+        _signal_tasks.add(task)
+        task.add_done_callback(_signal_tasks.discard)
+
+    loop.add_signal_handler(signal.SIGUSR1, trigger, "cpu")
+    loop.add_signal_handler(signal.SIGUSR2, trigger, "mem")
+    return True
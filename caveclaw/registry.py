@@ -0,0 +1,145 @@
+"""Agent registry — per-agent settings and workspace files, cached in memory.
+
+Handling a message needs the agent's model, workspace, SOUL.md, TOOLS.md
+options and MEMORY.md. The registry keeps an immutable descriptor per agent
+and only re-stats the workspace files once `check_interval` has passed (or
+after `invalidate`), re-reading just the files whose mtime or size changed.
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Mapping
+
+from caveclaw import memory as mem
+from caveclaw.config import AgentConfig, Config, merge_sdk_options, parse_front_matter, resolve_agent_config
+
+CHECK_INTERVAL_SECONDS = 1.0
+
+# File stamp: (mtime_ns, size), or None if the file doesn't exist
+Stamp = tuple[int, int] | None
+
+
+def _stamp(path: Path) -> Stamp:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _read(path: Path, stamp: Stamp) -> str:
+    return path.read_text() if stamp is not None else ""
+
+
+def compose_system_prompt(soul: str, memory_text: str) -> str:
+    """Join SOUL.md and the memory section into a system prompt."""
+    parts: list[str] = []
+    if soul.strip():
+        parts.append(soul.strip())
+    if memory_text:
+        parts.append(f"## Memory\n\n{memory_text.strip()}")
+    return "\n\n".join(parts)
+
+
+@dataclass(frozen=True)
+class AgentDescriptor:
+    """Everything needed to run a turn for one agent, as of the last check."""
+    name: str
+    model: str
+    workspace: Path
+    agent_config: AgentConfig | None
+    soul: str
+    tools: str  # TOOLS.md without its front-matter
+    sdk_options: Mapping[str, Any]
+    memory: str
+    memory_index: mem.MemoryIndex | None  # only built for structured memory
+    stamps: tuple[Stamp, Stamp, Stamp] = field(repr=False)  # SOUL, TOOLS, MEMORY
+
+    @property
+    def sessions_dir(self) -> Path:
+        return self.workspace / "sessions"
+
+    def system_prompt(self, query: str = "") -> str:
+        """SOUL.md plus memory — all of it, or the parts relevant to `query`."""
+        cfg = self.agent_config
+        if self.memory_index is not None and cfg is not None:
+            memory_text = mem.select_from_index(
+                self.memory_index, query, cfg.memory_top_k, cfg.memory_token_budget,
+            )
+        else:
+            memory_text = self.memory
+        return compose_system_prompt(self.soul, memory_text)
+
+
+@dataclass
+class _Entry:
+    descriptor: AgentDescriptor
+    fresh_until: float
+
+
+class AgentRegistry:
+    """Builds and caches an AgentDescriptor per agent for one config snapshot."""
+
+    def __init__(self, check_interval: float = CHECK_INTERVAL_SECONDS) -> None:
+        self.check_interval = check_interval
+        self._config: Config | None = None
+        self._entries: dict[str, _Entry] = {}
+
+    def get(self, config: Config, name: str) -> AgentDescriptor:
+        """Return the descriptor for `name`, revalidating it if the check interval passed."""
+        if config is not self._config:
+            # A new config snapshot can change models and options for every agent
+            self._entries.clear()
+            self._config = config
+        now = time.monotonic()
+        entry = self._entries.get(name)
+        if entry is not None and now < entry.fresh_until:
+            return entry.descriptor
+        descriptor = self._refresh(config, name, entry.descriptor if entry else None)
+        self._entries[name] = _Entry(descriptor, now + self.check_interval)
+        return descriptor
+
+    def invalidate(self, name: str | None = None) -> None:
+        """Force the next `get` to re-stat the workspace (all agents if `name` is None)."""
+        for key, entry in self._entries.items():
+            if name is None or key == name:
+                entry.fresh_until = 0.0
+
+    def _refresh(self, config: Config, name: str, old: AgentDescriptor | None) -> AgentDescriptor:
+        if old is None or not old.workspace.is_dir():
+            model, workspace = resolve_agent_config(config, name)
+            old = None
+        else:
+            model, workspace = old.model, old.workspace
+        paths = (workspace / "SOUL.md", workspace / "TOOLS.md", workspace / "MEMORY.md")
+        stamps = tuple(_stamp(p) for p in paths)
+        if old is not None and stamps == old.stamps:
+            return old
+
+        agent_cfg = config.agents.get(name)
+        changes: dict[str, Any] = {"stamps": stamps}
+        if old is None or stamps[0] != old.stamps[0]:
+            changes["soul"] = _read(paths[0], stamps[0])
+        if old is None or stamps[1] != old.stamps[1]:
+            front, body = parse_front_matter(_read(paths[1], stamps[1]))
+            changes["tools"] = body
+            changes["sdk_options"] = MappingProxyType(merge_sdk_options(config, name, front, str(paths[1])))
+        if old is None or stamps[2] != old.stamps[2]:
+            memory_text = _read(paths[2], stamps[2])
+            changes["memory"] = memory_text
+            changes["memory_index"] = None
+            if agent_cfg and agent_cfg.memory_mode == "structured":
+                pinned = tuple(agent_cfg.memory_pinned_sections)
+                changes["memory_index"] = mem.MemoryIndex(mem.parse_memory(memory_text, pinned))
+        if old is not None:
+            return replace(old, **changes)
+        return AgentDescriptor(
+            name=name, model=model, workspace=workspace, agent_config=agent_cfg, **changes,
+        )
+
+
+registry = AgentRegistry()
@@ -0,0 +1,100 @@
+"""Config hot-reload — pick up config.json edits without restarting the gateway.
+
+`ConfigWatcher` polls the file's mtime and size, validates a changed file
+with `Config`, and swaps `current` to the new snapshot. Consumers read
+`watcher.current` once per message, so a message is handled entirely with
+the snapshot it started with. An invalid file is reported and ignored.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any
+
+from pydantic import ValidationError
+
+from caveclaw import config as config_mod
+from caveclaw.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Settings read once at startup; changing them still needs a restart
+RESTART_REQUIRED = (
+    "discord_token", "discord_max_chunks", "scheduler_enabled", "config_reload_seconds",
+    "http_port", "http_host", "http_max_concurrency", "loop_watchdog_ms",
+    "log_level", "log_format", "log_debug_sample",
+)
+
+_SECRET_KEYS = ("discord_token", "http_token")
+
+
+def _flatten(data: Any, prefix: str = "") -> dict[str, Any]:
+    if isinstance(data, dict):
+        flat: dict[str, Any] = {}
+        for key, value in data.items():
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        return flat
+    return {prefix.rstrip("."): data}
+
+
+def diff_config(old: Config, new: Config) -> list[str]:
+    """Return one ``key: old -> new`` line per changed setting (secrets redacted)."""
+    before, after = _flatten(old.model_dump()), _flatten(new.model_dump())
+    lines: list[str] = []
+    for key in sorted(before.keys() | after.keys()):
+        a, b = before.get(key), after.get(key)
+        if a == b:
+            continue
+        if key in _SECRET_KEYS:
+            a, b = "***" if a else a, "***" if b else b
+        note = " (restart required)" if key.split(".")[0] in RESTART_REQUIRED else ""
+        lines.append(f"{key}: {a!r} -> {b!r}{note}")
+    return lines
+
+
+def _stamp(path: Path) -> tuple[int, int] | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class ConfigWatcher:
+    """Holds the current Config snapshot and replaces it when config.json changes."""
+
+    def __init__(self, config: Config, path: Path | None = None) -> None:
+        self.current = config
+        self.path = path or config_mod.CONFIG_PATH
+        self._stamp = _stamp(self.path)
+
+    def check(self) -> bool:
+        """Reload if the file changed. Returns True if a new snapshot was swapped in."""
+        stamp = _stamp(self.path)
+        if stamp == self._stamp:
+            return False
+        # Remember the stamp even if the file is bad, so it's reported once
+        self._stamp = stamp
+        if stamp is None:
+            logger.warning("%s was removed; keeping the current config", self.path)
+            return False
+        try:
+            new = config_mod.load_config(self.path)
+        except (OSError, ValueError, ValidationError) as e:
+            # json.JSONDecodeError is a ValueError
+            logger.error("Ignoring invalid %s: %s", self.path, e)
+            return False
+        changes = diff_config(self.current, new)
+        if not changes:
+            return False
+        self.current = new
+        logger.info("Reloaded %s:\n%s", self.path, "\n".join(f"  {line}" for line in changes))
+        return True
+
+    async def run(self, interval: float) -> None:
+        """Check for changes every `interval` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.check)
@@ -0,0 +1,75 @@
+"""Model routing — send quick turns to a faster model (``AgentConfig.routing``).
+
+Each turn is classified with cheap local checks, in order: attachments, code
+blocks, full keywords, history size and length. Anything that looks like
+real work goes to the agent's configured model; the rest to `fast_model`.
+Fast keywords only label short turns; they never override the other checks.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+
+class RoutingRules(BaseModel):
+    fast_model: str  # e.g. "claude-haiku-4-5"
+    max_chars: int = 160  # longer messages go to the configured model
+    max_history: int = 40  # so do turns in conversations longer than this
+    # Words that always need the configured model / that mark a short turn as
+    # small talk (only a label: short turns go fast either way)
+    full_keywords: list[str] = Field(default_factory=lambda: [
+        "why", "how", "explain", "plan", "compare", "analyze", "debug", "write", "code", "research",
+    ])
+    fast_keywords: list[str] = Field(default_factory=lambda: [
+        "thanks", "thank you", "got it", "sounds good",
+    ])
+
+
+@dataclass(frozen=True)
+class Route:
+    model: str
+    tier: Literal["fast", "full"]
+    reason: str
+
+
+@lru_cache(maxsize=64)
+def _keyword_pattern(words: tuple[str, ...]) -> re.Pattern[str] | None:
+    if not words:
+        return None
+    alternatives = "|".join(re.escape(w.lower()) for w in sorted(words, key=len, reverse=True))
+    return re.compile(rf"\b({alternatives})\b")
+
+
+def _match(words: list[str], text: str) -> str | None:
+    pattern = _keyword_pattern(tuple(words))
+    found = pattern.search(text) if pattern else None
+    return found.group(1) if found else None
+
+
+def route_message(
+    content: str,
+    has_attachments: bool,
+    history_len: int,
+    model: str,
+    rules: RoutingRules,
+) -> Route:
+    """Pick the model for one turn. `model` is the agent's configured model."""
+    text = content.lower()
+    if has_attachments:
+        return Route(model, "full", "attachments")
+    if "```" in content:
+        return Route(model, "full", "code")
+    if word := _match(rules.full_keywords, text):
+        return Route(model, "full", f"keyword:{word}")
+    if history_len > rules.max_history:
+        return Route(model, "full", "history")
+    if len(content) > rules.max_chars:
+        return Route(model, "full", "length")
+    if word := _match(rules.fast_keywords, text):
+        return Route(rules.fast_model, "fast", f"keyword:{word}")
+    return Route(rules.fast_model, "fast", "short")
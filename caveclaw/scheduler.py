@@ -0,0 +1,233 @@
+"""Cron scheduler — fires scheduled_tasks as inbound messages on the bus."""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from caveclaw import db
+from caveclaw.bus import InboundMessage, MessageBus
+from caveclaw.config import Config
+
+logger = logging.getLogger(__name__)
+
+MISFIRE_POLICIES = ("skip", "once", "all")
+MAX_CATCHUP_RUNS = 10  # upper bound on replayed runs for misfire="all"
+REFRESH_SECONDS = 60.0  # how often to check whether tasks were changed elsewhere
+RUN_TIMEOUT_SECONDS = 600.0
+
+_MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+_MONTH_NAMES = {m: i for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1)}
+_DAY_NAMES = {d: i for i, d in enumerate(["sun", "mon", "tue", "wed", "thu", "fri", "sat"])}
+
+
+def _parse_field(spec: str, lo: int, hi: int, names: dict[str, int]) -> tuple[int, ...]:
+    values: set[int] = set()
+    for part in spec.lower().split(","):
+        rng, _, step_s = part.partition("/")
+        step = int(step_s) if step_s else 1
+        if step < 1:
+            raise ValueError(f"Invalid step in cron field: {spec!r}")
+        if rng == "*":
+            start, end = lo, hi
+        else:
+            first, _, last = rng.partition("-")
+            start = names[first] if first in names else int(first)
+            end = (names[last] if last in names else int(last)) if last else (hi if step_s else start)
+        if start < lo or end > hi or start > end:
+            raise ValueError(f"Cron field {spec!r} out of range {lo}-{hi}")
+        values.update(range(start, end + 1, step))
+    return tuple(sorted(values))
+
+
+class CronExpr:
+    """A parsed five-field cron expression (minute hour day month weekday)."""
+
+    def __init__(self, expr: str) -> None:
+        self.expr = expr
+        fields = _MACROS.get(expr.strip().lower(), expr).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expr!r}")
+        minute, hour, day, month, weekday = fields
+        self.minutes = _parse_field(minute, 0, 59, {})
+        self.hours = _parse_field(hour, 0, 23, {})
+        self.days = _parse_field(day, 1, 31, {})
+        self.months = _parse_field(month, 1, 12, _MONTH_NAMES)
+        # 7 is an alias for Sunday
+        self.weekdays = tuple(sorted({d % 7 for d in _parse_field(weekday, 0, 7, _DAY_NAMES)}))
+        self._any_day = day == "*"
+        self._any_weekday = weekday == "*"
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok  # both restricted: cron matches either
+
+    def next_after(self, ts: float) -> float:
+        """Return the first fire time strictly after `ts` (local time)."""
+        dt = datetime.fromtimestamp(ts).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt.year + 5
+        while dt.year <= limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            i = bisect.bisect_left(self.hours, dt.hour)
+            if i == len(self.hours):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if self.hours[i] != dt.hour:
+                dt = dt.replace(hour=self.hours[i], minute=0)
+            j = bisect.bisect_left(self.minutes, dt.minute)
+            if j == len(self.minutes):
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+                continue
+            return dt.replace(minute=self.minutes[j]).timestamp()
+        raise ValueError(f"Cron expression never fires: {self.expr!r}")
+
+
+@lru_cache(maxsize=256)
+def parse_cron(expr: str) -> CronExpr:
+    """Parse a cron expression, caching the result."""
+    return CronExpr(expr)
+
+
+class Scheduler:
+    """Keeps a min-heap of next fire times and publishes due tasks to the bus.
+
+    Sleeps until the earliest fire time rather than polling every row each
+    minute. Changes made by other processes (e.g. `caveclaw tasks add`) are
+    picked up through a version key in the state table.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        bus: MessageBus,
+        refresh_seconds: float = REFRESH_SECONDS,
+        clock=time.time,
+    ) -> None:
+        self.config = config
+        self.bus = bus
+        self.refresh_seconds = refresh_seconds
+        self.clock = clock
+        # (fire_at, seq, task_id, regular) — catch-up entries are not rescheduled
+        self._heap: list[tuple[float, int, int, bool]] = []
+        self._tasks: dict[int, dict] = {}
+        self._seq = itertools.count()
+        self._version: str | None = None
+        self._running: set[asyncio.Task[str]] = set()
+
+    def load(self) -> None:
+        """Rebuild the heap from the database, applying each task's misfire policy."""
+        self._version = db.get_state(db.TASKS_VERSION_KEY, fresh=True)
+        self._tasks = {t["id"]: t for t in db.get_due_tasks()}
+        self._heap = []
+        now = self.clock()
+        for task in self._tasks.values():
+            try:
+                cron = parse_cron(task["cron"])
+            except ValueError as e:
+                logger.warning("Skipping task %s (%s): %s", task["id"], task["name"], e)
+                continue
+            since = task.get("last_run_at") or task.get("created_at") or now
+            missed: list[float] = []
+            fire_at = cron.next_after(since)
+            while fire_at <= now and len(missed) < MAX_CATCHUP_RUNS:
+                missed.append(fire_at)
+                fire_at = cron.next_after(fire_at)
+            policy = task.get("misfire") or "once"
+            if missed and policy == "once":
+                self._push(now, task["id"], regular=False)
+            elif missed and policy == "all":
+                for _ in missed:
+                    self._push(now, task["id"], regular=False)
+            self._push(fire_at if fire_at > now else cron.next_after(now), task["id"])
+
+    def _push(self, fire_at: float, task_id: int, regular: bool = True) -> None:
+        heapq.heappush(self._heap, (fire_at, next(self._seq), task_id, regular))
+
+    def next_fire(self) -> float | None:
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self) -> list[tuple[float, dict]]:
+        """Pop every entry due now, rescheduling regular ones. Returns (scheduled_for, task)."""
+        now = self.clock()
+        due: list[tuple[float, dict]] = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, _, task_id, regular = heapq.heappop(self._heap)
+            task = self._tasks.get(task_id)
+            if task is None:
+                continue
+            due.append((fire_at, task))
+            if regular:
+                # Late wake-ups don't replay the gap; misfire handling is for downtime
+                self._push(parse_cron(task["cron"]).next_after(max(fire_at, now)), task_id)
+        return due
+
+    async def run(self) -> None:
+        """Fire tasks as they come due. Runs until cancelled."""
+        await asyncio.to_thread(self.load)
+        while True:
+            for scheduled_for, task in self.pop_due():
+                job = asyncio.create_task(self.execute(task, scheduled_for))
+                self._running.add(job)
+                job.add_done_callback(self._running.discard)
+            delay = self.refresh_seconds
+            nxt = self.next_fire()
+            if nxt is not None:
+                delay = max(0.0, min(delay, nxt - self.clock()))
+            await asyncio.sleep(delay)
+            version = await db.aget_state(db.TASKS_VERSION_KEY, fresh=True)
+            if version != self._version:
+                await asyncio.to_thread(self.load)
+
+    async def execute(
+        self, task: dict, scheduled_for: float | None = None, channel: str | None = None
+    ) -> str:
+        """Send one task to its agent, wait for the reply and record the run.
+
+        `channel` overrides where the reply is delivered (e.g. "cli" for
+        `caveclaw tasks run`).
+        """
+        started = self.clock()
+        run_id = await db.astart_task_run(task["id"], started, scheduled_for or started)
+        channel = channel or task.get("channel") or "scheduler"
+        chat_id = task.get("chat_id") or f"task-{task['id']}"
+        message = InboundMessage(
+            channel=channel,
+            sender_id="scheduler",
+            chat_id=chat_id,
+            content=task["command"],
+            agent_name=task.get("agent") or self.config.default_agent,
+        )
+        # Replies to the scheduler's own channel have no other recipient
+        reply = self.bus.expect_reply(
+            channel, chat_id, consume=channel in ("scheduler", "cli"), correlation_id=message.correlation_id,
+        )
+        await self.bus.publish_inbound(message)
+        try:
+            result = (await asyncio.wait_for(reply, RUN_TIMEOUT_SECONDS)).content
+        except asyncio.TimeoutError:
+            result = "(timed out)"
+        await db.afinish_task_run(run_id, self.clock(), result)
+        return result
@@ -1,14 +1,72 @@
-"""JSONL conversation history — one file per conversation."""
+"""JSONL conversation history — one file per conversation.
+
+Files are sharded by a hash of the chat id (``sessions/<xx>/<chat>.jsonl``) so
+no single directory grows to thousands of entries. Files from before sharding
+are moved into their shard the first time they're used. Appends made on
+behalf of an agent are also counted in the session catalog (see caveclaw.db).
+"""
 
 from __future__ import annotations
 
-import json
+import hashlib
+import logging
 import time
+from collections.abc import Iterator
+from concurrent.futures import Future
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any
+
+from caveclaw import db, jsonl
+
+logger = logging.getLogger(__name__)
+
+SHARD_CHARS = 2  # hex digits of the chat id hash per shard directory, i.e. 256 shards
+
+
+@dataclass(slots=True)
+class Entry:
+    """One line of a session log."""
+    ts: float
+    role: str
+    content: str
+    attachments: list[dict] | None = None
+    meta: dict[str, Any] | None = None  # extra fields stored on the line, e.g. the model route
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Entry:
+        data = dict(data)
+        ts, role, content = data.pop("ts"), data.pop("role"), data.pop("content")
+        attachments = data.pop("attachments", None)
+        return cls(ts, role, content, attachments, data or None)
+
+    def to_dict(self) -> dict[str, Any]:
+        data: dict[str, Any] = {"ts": self.ts, "role": self.role, "content": self.content}
+        if self.attachments:
+            data["attachments"] = self.attachments
+        if self.meta:
+            data.update(self.meta)
+        return data
+
+
+def _shard(key: str) -> str:
+    return hashlib.sha1(key.encode()).hexdigest()[:SHARD_CHARS]
 
 
 def _session_path(key: str, sessions_dir: Path) -> Path:
-    return sessions_dir / f"{key}.jsonl"
+    path = sessions_dir / _shard(key) / f"{key}.jsonl"
+    if not path.exists() and (sessions_dir / path.name).exists():
+        _migrate(key, sessions_dir, path.parent)
+    return path
+
+
+def _migrate(key: str, sessions_dir: Path, shard_dir: Path) -> None:
+    """Move a session saved before sharding, and its summary, into its shard."""
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    for name in (f"{key}.jsonl", f"{key}.summary.json"):
+        src = sessions_dir / name
+        if src.exists():
+            src.replace(shard_dir / name)
 
 
 def get_or_create(key: str, sessions_dir: Path) -> Path:
@@ -25,23 +83,78 @@ def append(
     content: str,
     sessions_dir: Path,
     attachments: list[dict] | None = None,
+    meta: dict | None = None,
+    agent: str | None = None,
 ) -> None:
-    """Append a message to the session log."""
+    """Append a message to the session log. `meta` fields are stored alongside.
+
+    With `agent`, the append is also counted in the session catalog.
+    """
     path = get_or_create(key, sessions_dir)
-    entry: dict = {"ts": time.time(), "role": role, "content": content}
-    if attachments:
-        entry["attachments"] = attachments
+    entry = Entry(time.time(), role, content, attachments, meta)
+    line = jsonl.dumps(entry.to_dict()) + "\n"
     with path.open("a") as f:
-        f.write(json.dumps(entry) + "\n")
+        f.write(line)
+    if agent:
+        future = db.record_session_append(agent, key, len(line.encode()), entry.ts)
+        future.add_done_callback(_report_catalog_error)
 
 
-def get_history(key: str, limit: int = 100, sessions_dir: Path | None = None) -> list[dict]:
-    """Return the last `limit` messages from a session."""
+def _report_catalog_error(future: Future[None]) -> None:
+    if future.exception() is not None:
+        logger.error("Session catalog update failed: %s", future.exception())
+
+
+def get_entries(key: str, limit: int = 100, sessions_dir: Path | None = None) -> list[Entry]:
+    """Return the last `limit` messages from a session, reading only the end of the file."""
     if sessions_dir is None:
         return []
     path = _session_path(key, sessions_dir)
     if not path.exists():
         return []
-    lines = path.read_text().strip().splitlines()
-    entries = [json.loads(line) for line in lines[-limit:]]
-    return entries
+    return [Entry.from_dict(jsonl.loads(line)) for line in jsonl.tail_bytes(path, limit) if line.strip()]
+
+
+def get_history(key: str, limit: int = 100, sessions_dir: Path | None = None) -> list[dict]:
+    """Return the last `limit` messages from a session as plain dicts."""
+    return [e.to_dict() for e in get_entries(key, limit, sessions_dir)]
+
+
+def remove(key: str, sessions_dir: Path) -> int:
+    """Delete a session and its summary. Returns the bytes freed."""
+    path = _session_path(key, sessions_dir)
+    freed = 0
+    for p in (path, path.with_name(f"{key}.summary.json")):
+        try:
+            freed += p.stat().st_size
+            p.unlink()
+        except FileNotFoundError:
+            pass
+    return freed
+
+
+def scan(sessions_dir: Path) -> Iterator[dict[str, Any]]:
+    """Yield a catalog row for every session file, moving unsharded ones into place."""
+    if not sessions_dir.is_dir():
+        return
+    for flat in list(sessions_dir.glob("*.jsonl")):
+        _session_path(flat.stem, sessions_dir)
+    for path in sessions_dir.glob("*/*.jsonl"):
+        messages, first_ts = 0, None
+        with path.open("rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                if first_ts is None:
+                    first_ts = jsonl.loads(line)["ts"]
+                messages += 1
+        if not messages:
+            continue
+        last_ts = jsonl.loads(jsonl.tail_bytes(path, 1)[0])["ts"]
+        yield {
+            "chat_id": path.stem,
+            "messages": messages,
+            "bytes": path.stat().st_size,
+            "first_ts": first_ts,
+            "last_ts": last_ts,
+        }
@@ -0,0 +1,83 @@
+"""Import-time measurement for `caveclaw doctor --startup`.
+
+Each measurement runs a fresh interpreter with ``-X importtime`` so module
+caches in the current process don't hide the real cost.
+"""
+
+from __future__ import annotations
+
+import subprocess
+import sys
+from dataclasses import dataclass
+
+# Dependencies that should only load for the commands that use them
+HEAVY_MODULES = ("claude_agent_sdk", "discord", "prompt_toolkit", "PIL")
+
+# What each kind of invocation imports, as `python -c` code
+TARGETS = {
+    "caveclaw --help": "import sys; from caveclaw.cli import app; sys.argv = ['caveclaw', '--help']; app()",
+    "caveclaw agent": "import caveclaw.cli, caveclaw.agent, prompt_toolkit, rich.markdown",
+    "caveclaw gateway": "import caveclaw.cli, caveclaw.channels.discord",
+}
+
+HELP_BUDGET_MS = 1000  # enforced by tests/test_startup.py
+
+
+@dataclass(frozen=True, slots=True)
+class ImportTiming:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int  # 0 for modules imported directly by the measured code
+
+
+def parse_importtime(stderr: str) -> list[ImportTiming]:
+    """Parse ``-X importtime`` output into one entry per imported module."""
+    timings: list[ImportTiming] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        name = fields[2].rstrip()
+        stripped = name.lstrip()
+        timings.append(ImportTiming(
+            module=stripped,
+            self_us=int(fields[0]),
+            cumulative_us=int(fields[1]),
+            depth=(len(name) - len(stripped) - 1) // 2,
+        ))
+    return timings
+
+
+def measure(code: str) -> list[ImportTiming]:
+    """Run `code` in a fresh interpreter and return its import timings."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def total_ms(timings: list[ImportTiming]) -> float:
+    """Total import time: the sum of the top-level entries."""
+    return sum(t.cumulative_us for t in timings if t.depth == 0) / 1000
+
+
+def heaviest_packages(timings: list[ImportTiming], n: int = 8) -> list[ImportTiming]:
+    """The `n` top-level packages (no dot in the name) with the largest cumulative time."""
+    packages: dict[str, ImportTiming] = {}
+    for t in timings:
+        if "." in t.module:
+            continue
+        if t.module not in packages or t.cumulative_us > packages[t.module].cumulative_us:
+            packages[t.module] = t
+    return sorted(packages.values(), key=lambda t: t.cumulative_us, reverse=True)[:n]
+
+
+def loaded_heavy_modules(timings: list[ImportTiming]) -> list[str]:
+    """Which of HEAVY_MODULES were imported."""
+    loaded = {t.module.partition(".")[0] for t in timings}
+    return [m for m in HEAVY_MODULES if m in loaded]
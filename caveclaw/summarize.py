@@ -0,0 +1,188 @@
+"""Rolling conversation summaries — fold old turns so prompts stay small.
+
+Once a chat has more than `summarize_after_turns` turns that aren't covered
+by its summary, a background job folds all but the most recent
+`summary_keep_turns` of them into the summary, stored next to the session as
+``<chat>.summary.json`` in the same shard directory. `handle_message` then sends the summary plus the
+turns after it instead of the raw tail.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Protocol
+
+from caveclaw import session
+from caveclaw.config import Config
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a chat between a user and an AI assistant. "
+    "Merge the new turns into the existing summary. Keep facts, decisions, open "
+    "questions and user preferences; drop pleasantries. Reply with the updated "
+    "summary only, as concise markdown bullets."
+)
+
+
+@dataclass
+class Summary:
+    text: str
+    upto_ts: float  # timestamp of the last turn folded into `text`
+    turns: int  # how many turns the summary covers
+
+
+class SummarizerBackend(Protocol):
+    async def summarize(self, summary: str, turns: list[dict]) -> str:
+        """Return `summary` updated with `turns`."""
+        ...
+
+
+def _format_turns(turns: list[dict]) -> str:
+    return "\n\n".join(
+        f"{'User' if t['role'] == 'user' else 'Assistant'}: {t['content']}" for t in turns
+    )
+
+
+class ClaudeSummarizer:
+    """Summarizes with a single tool-less model call."""
+
+    def __init__(self, model: str) -> None:
+        self.model = model
+
+    async def summarize(self, summary: str, turns: list[dict]) -> str:
+        from claude_agent_sdk import AssistantMessage, ClaudeAgentOptions, TextBlock, query
+
+        prompt = f"## Existing summary\n\n{summary or '(none)'}\n\n## New turns\n\n{_format_turns(turns)}"
+        options = ClaudeAgentOptions(
+            system_prompt=SUMMARY_PROMPT,
+            model=self.model,
+            max_turns=1,
+            allowed_tools=[],
+        )
+        parts: list[str] = []
+        async for msg in query(prompt=prompt, options=options):
+            if isinstance(msg, AssistantMessage):
+                parts.extend(b.text for b in msg.content if isinstance(b, TextBlock))
+        return "\n".join(parts).strip() or summary
+
+
+class StubSummarizer:
+    """Deterministic local summarizer: one truncated line per turn."""
+
+    def __init__(self, width: int = 80) -> None:
+        self.width = width
+
+    async def summarize(self, summary: str, turns: list[dict]) -> str:
+        lines = [summary] if summary else []
+        for t in turns:
+            prefix = "User" if t["role"] == "user" else "Assistant"
+            text = " ".join(t["content"].split())
+            lines.append(f"- {prefix}: {text[:self.width]}")
+        return "\n".join(lines)
+
+
+BACKENDS: dict[str, Callable[[Config], SummarizerBackend]] = {
+    "claude": lambda config: ClaudeSummarizer(config.summarizer_model or config.model),
+    "stub": lambda config: StubSummarizer(),
+}
+
+
+def _summary_path(key: str, sessions_dir: Path) -> Path:
+    return session._session_path(key, sessions_dir).with_name(f"{key}.summary.json")
+
+
+def load_summary(key: str, sessions_dir: Path) -> Summary | None:
+    """Return the stored summary for a chat, if any."""
+    path = _summary_path(key, sessions_dir)
+    try:
+        return Summary(**json.loads(path.read_text()))
+    except FileNotFoundError:
+        return None
+
+
+def save_summary(key: str, sessions_dir: Path, summary: Summary) -> None:
+    """Atomically replace the stored summary for a chat."""
+    path = _summary_path(key, sessions_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(asdict(summary)))
+    tmp.replace(path)
+
+
+class Summarizer:
+    """Schedules summary folds in the background, at most `concurrency` at once."""
+
+    def __init__(
+        self,
+        backend: SummarizerBackend,
+        after_turns: int,
+        keep_turns: int,
+        concurrency: int = 1,
+    ) -> None:
+        self.backend = backend
+        self.after_turns = after_turns
+        self.keep_turns = keep_turns
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._running: dict[Path, asyncio.Task[None]] = {}
+
+    def maybe_schedule(self, key: str, sessions_dir: Path) -> asyncio.Task[None] | None:
+        """Start a fold for this chat unless one is already running. Cheap to call per append."""
+        path = _summary_path(key, sessions_dir)
+        if path in self._running:
+            return None
+        task = asyncio.create_task(self._fold(key, sessions_dir))
+        self._running[path] = task
+        task.add_done_callback(lambda _: self._running.pop(path, None))
+        return task
+
+    async def _fold(self, key: str, sessions_dir: Path) -> None:
+        summary = load_summary(key, sessions_dir)
+        upto = summary.upto_ts if summary else 0.0
+        # Only the tail can be unsummarized once the summarizer is keeping up
+        tail = session.get_entries(key, limit=self.after_turns + self.keep_turns + 1, sessions_dir=sessions_dir)
+        pending = [t for t in tail if t.ts > upto]
+        if len(pending) <= self.after_turns:
+            return
+        fold = pending[:-self.keep_turns] if self.keep_turns else pending
+        async with self._semaphore:
+            try:
+                text = await self.backend.summarize(summary.text if summary else "", [t.to_dict() for t in fold])
+            except Exception:
+                logger.exception("Summarizing %s failed", key)
+                return
+        save_summary(key, sessions_dir, Summary(
+            text=text,
+            upto_ts=fold[-1].ts,
+            turns=(summary.turns if summary else 0) + len(fold),
+        ))
+
+    async def wait(self) -> None:
+        """Wait for every running fold to finish."""
+        while self._running:
+            await asyncio.gather(*self._running.values(), return_exceptions=True)
+
+
+_summarizer: tuple[tuple, Summarizer] | None = None
+
+
+def get_summarizer(config: Config) -> Summarizer | None:
+    """Return the shared summarizer for these settings, or None if disabled."""
+    global _summarizer
+    if not config.summarize_after_turns:
+        return None
+    settings = (
+        config.summarizer_backend, config.summarizer_model or config.model,
+        config.summarize_after_turns, config.summary_keep_turns, config.summarizer_concurrency,
+    )
+    if _summarizer is None or _summarizer[0] != settings:
+        backend = BACKENDS[config.summarizer_backend](config)
+        _summarizer = (settings, Summarizer(
+            backend, config.summarize_after_turns, config.summary_keep_turns, config.summarizer_concurrency,
+        ))
+    return _summarizer[1]
@@ -0,0 +1,157 @@
+"""Event-loop lag watchdog (``loop_watchdog_ms``).
+
+A heartbeat coroutine measures how late the loop wakes it up. A helper
+thread watches the heartbeat; once it is more than the threshold overdue,
+the loop thread is stuck in synchronous code. The helper then captures
+that thread's stack and the running task, and prints where it is blocked.
+Counters are available from `stats()` and the HTTP channel's ``/metrics``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from dataclasses import asdict, dataclass
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 0.05
+STACK_DEPTH = 12  # frames printed per stall
+LAG_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000)
+
+_active: LoopWatchdog | None = None
+
+
+@dataclass
+class Stall:
+    at: float  # wall-clock time of the capture
+    lag_ms: float  # how long the loop had been blocked when captured
+    task: str | None
+    coroutine: str | None
+    frame: str  # innermost frame: the blocking call
+    caveclaw_frame: str | None  # innermost frame in caveclaw's own code
+    stack: list[str]
+
+
+def _where(frame: traceback.FrameSummary) -> str:
+    return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+
+def _current_task(loop: asyncio.AbstractEventLoop | None) -> asyncio.Task | None:
+    # asyncio.current_task() must be called from the loop's thread; reading the
+    # registry directly is the only way to ask from the helper thread.
+    try:
+        return asyncio.tasks._current_tasks.get(loop)  # type: ignore[attr-defined]
+    except AttributeError:
+        return None
+
+
+class LoopWatchdog:
+    """Measures event-loop scheduling delay and captures stacks of long stalls."""
+
+    def __init__(self, threshold: float, interval: float = HEARTBEAT_SECONDS) -> None:
+        self.threshold = threshold
+        self.interval = interval
+        self.samples = 0
+        self.stalls = 0  # heartbeats delayed by >= threshold
+        self.captures = 0  # stalls caught in the act by the helper thread
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.buckets = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.last_stall: Stall | None = None
+        self._beat = 0.0
+        self._reported = 0.0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread_id: int | None = None
+        self._stop = threading.Event()
+
+    async def run(self) -> None:
+        """Heartbeat until cancelled; starts and stops the helper thread."""
+        global _active
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        helper = threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True)
+        helper.start()
+        _active = self
+        try:
+            while True:
+                start = time.monotonic()
+                self._beat = start
+                await asyncio.sleep(self.interval)
+                self._record(max(0.0, time.monotonic() - start - self.interval))
+        finally:
+            self._stop.set()
+            if _active is self:
+                _active = None
+
+    def _record(self, lag: float) -> None:
+        self.samples += 1
+        self.lag_total += lag
+        self.lag_max = max(self.lag_max, lag)
+        ms = lag * 1000
+        i = 0
+        while i < len(LAG_BUCKETS_MS) and ms > LAG_BUCKETS_MS[i]:
+            i += 1
+        self.buckets[i] += 1
+        if lag >= self.threshold:
+            self.stalls += 1
+
+    def _monitor(self) -> None:
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._beat
+            overdue = time.monotonic() - beat - self.interval
+            if beat != self._reported and overdue >= self.threshold:
+                self._reported = beat  # one capture per stall
+                self.capture(overdue)
+
+    def capture(self, lag: float) -> Stall | None:
+        """Record and print what the loop thread is doing right now."""
+        frame = sys._current_frames().get(self._thread_id) if self._thread_id else None
+        if frame is None:
+            return None
+        stack = traceback.extract_stack(frame)[-STACK_DEPTH:]
+        task = _current_task(self._loop)
+        coro = task.get_coro() if task is not None else None
+        ours = [f for f in stack if "/caveclaw/" in f.filename.replace("\\", "/")]
+        stall = Stall(
+            at=time.time(),
+            lag_ms=round(lag * 1000, 1),
+            task=task.get_name() if task is not None else None,
+            coroutine=getattr(coro, "__qualname__", None),
+            frame=_where(stack[-1]),
+            caveclaw_frame=_where(ours[-1]) if ours else None,
+            stack=traceback.format_list(stack),
+        )
+        self.captures += 1
+        self.last_stall = stall
+        logger.warning(
+            "Event loop blocked for %.0f+ ms in %s (%s) at %s\n%s",
+            stall.lag_ms, stall.coroutine or "a callback", stall.task or "no task",
+            stall.caveclaw_frame or stall.frame, "".join(stall.stack).rstrip(),
+        )
+        return stall
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        labels = [f"<={b}ms" for b in LAG_BUCKETS_MS] + [f">{LAG_BUCKETS_MS[-1]}ms"]
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "samples": self.samples,
+            "stalls": self.stalls,
+            "captures": self.captures,
+            "lag_mean_ms": round(self.lag_total / self.samples * 1000, 3) if self.samples else 0.0,
+            "lag_max_ms": round(self.lag_max * 1000, 3),
+            "lag_buckets": dict(zip(labels, self.buckets)),
+            "last_stall": asdict(self.last_stall) if self.last_stall else None,
+        }
+
+
+def active() -> LoopWatchdog | None:
+    """The running watchdog, if any."""
+    return _active
@@ -6,10 +6,22 @@ from pathlib import Path
 
 import pytest
 
+from caveclaw import db
+from caveclaw.registry import registry
 from caveclaw.bus import Attachment, InboundMessage, MessageBus
 from caveclaw.config import Config
 
 
+@pytest.fixture(autouse=True)
+def _close_db(monkeypatch, tmp_path):
+    """Give each test its own database and close pooled connections afterwards."""
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "caveclaw.db")
+    db.init_db()
+    yield
+    db.close_db()
+    registry.invalidate()
+
+
 @pytest.fixture
 def config() -> Config:
     """A Config with all defaults."""
@@ -5,7 +5,7 @@ from unittest.mock import AsyncMock, MagicMock
 import caveclaw.config as config_mod
 from caveclaw.agent import _build_attachment_prompt, _build_system_prompt, _extract_text, handle_message
 from caveclaw.bus import InboundMessage, MessageBus
-from caveclaw.config import Config
+from caveclaw.config import AgentConfig, Config
 
 
 # --- Pure logic tests ---
@@ -23,6 +23,16 @@ def test_build_system_prompt_with_memory(workspace):
     assert "user likes coffee" in prompt
 
 
+def test_build_system_prompt_structured_memory(workspace):
+    notes = "\n".join(f"- fact {i} about topic{i}" for i in range(500))
+    (workspace / "MEMORY.md").write_text(f"## Core\n- user is Sam\n\n## Notes\n{notes}")
+    agent_cfg = AgentConfig(memory_mode="structured", memory_token_budget=100)
+    prompt = _build_system_prompt(workspace, "tell me about topic42", agent_cfg)
+    assert "user is Sam" in prompt
+    assert "fact 42 about topic42" in prompt
+    assert "topic43" not in prompt
+
+
 def test_build_system_prompt_empty_workspace(tmp_path):
     assert _build_system_prompt(tmp_path) == ""
 
@@ -114,6 +124,29 @@ async def test_handle_message_publishes_response(monkeypatch, tmp_path, template
     assert out.chat_id == "s1"
 
 
+async def test_handle_message_passes_agent_sdk_options(monkeypatch, tmp_path, templates_dir):
+    agents_dir = tmp_path / "agents"
+    monkeypatch.setattr(config_mod, "AGENTS_DIR", agents_dir)
+    monkeypatch.setattr(config_mod, "TEMPLATES_DIR", templates_dir)
+    (templates_dir / "grocer" / "TOOLS.md").write_text("---\ndisallowed_tools: [WebSearch]\n---\n")
+    cfg = Config(agents={"grocer": AgentConfig(max_turns=4)})
+
+    mock_client = AsyncMock()
+    mock_client.receive_response = MagicMock(return_value=_async_iter([]))
+    mock_client_class = MagicMock()
+    mock_client_class.return_value.__aenter__ = AsyncMock(return_value=mock_client)
+    mock_client_class.return_value.__aexit__ = AsyncMock(return_value=False)
+    import caveclaw.agent as agent_mod
+    monkeypatch.setattr(agent_mod, "ClaudeSDKClient", mock_client_class)
+
+    msg = InboundMessage(channel="test", sender_id="u", chat_id="s4", content="hi", agent_name="grocer")
+    await handle_message(msg, cfg, MessageBus())
+    options = mock_client_class.call_args.kwargs["options"]
+    assert options.disallowed_tools == ["WebSearch"]
+    assert options.max_turns == 4
+    assert options.permission_mode == "bypassPermissions"
+
+
 async def test_handle_message_no_response_fallback(monkeypatch, tmp_path, templates_dir):
     agents_dir = tmp_path / "agents"
     monkeypatch.setattr(config_mod, "AGENTS_DIR", agents_dir)
@@ -138,3 +171,108 @@ async def test_handle_message_no_response_fallback(monkeypatch, tmp_path, templa
 
     out = await bus.consume_outbound()
     assert out.content == "(no response)"
+
+
+async def test_handle_message_sends_summary_instead_of_old_turns(monkeypatch, tmp_path, templates_dir):
+    from caveclaw import session, summarize
+
+    agents_dir = tmp_path / "agents"
+    monkeypatch.setattr(config_mod, "AGENTS_DIR", agents_dir)
+    monkeypatch.setattr(config_mod, "TEMPLATES_DIR", templates_dir)
+    cfg = Config(summarize_after_turns=100, summarizer_backend="stub")
+    sessions_dir = agents_dir / "claw" / "sessions"
+    for i in range(4):
+        session.append("s3", "user", f"old turn {i}", sessions_dir=sessions_dir)
+    history = session.get_history("s3", sessions_dir=sessions_dir)
+    summarize.save_summary("s3", sessions_dir, summarize.Summary("- talked about turns 0-2", history[2]["ts"], 3))
+
+    mock_client = AsyncMock()
+    mock_client.receive_response = MagicMock(return_value=_async_iter([]))
+    mock_client_class = MagicMock()
+    mock_client_class.return_value.__aenter__ = AsyncMock(return_value=mock_client)
+    mock_client_class.return_value.__aexit__ = AsyncMock(return_value=False)
+    import caveclaw.agent as agent_mod
+    monkeypatch.setattr(agent_mod, "ClaudeSDKClient", mock_client_class)
+
+    bus = MessageBus()
+    await handle_message(InboundMessage(channel="test", sender_id="u", chat_id="s3", content="hi"), cfg, bus)
+    prompt = mock_client_class.call_args.kwargs["options"].system_prompt
+    assert "## Conversation Summary" in prompt
+    assert "talked about turns 0-2" in prompt
+    assert "old turn 3" in prompt
+    assert "old turn 1" not in prompt
+
+
+async def test_handle_message_routes_quick_turns(monkeypatch, tmp_path, templates_dir):
+    from caveclaw import session
+    from caveclaw.router import RoutingRules
+
+    monkeypatch.setattr(config_mod, "AGENTS_DIR", tmp_path / "agents")
+    monkeypatch.setattr(config_mod, "TEMPLATES_DIR", templates_dir)
+    rules = RoutingRules(fast_model="claude-haiku-4-5")
+    cfg = Config(agents={"grocer": AgentConfig(routing=rules)})
+
+    mock_client = AsyncMock()
+    mock_client.receive_response = MagicMock(side_effect=lambda: _async_iter([]))
+    mock_client_class = MagicMock()
+    mock_client_class.return_value.__aenter__ = AsyncMock(return_value=mock_client)
+    mock_client_class.return_value.__aexit__ = AsyncMock(return_value=False)
+    import caveclaw.agent as agent_mod
+    monkeypatch.setattr(agent_mod, "ClaudeSDKClient", mock_client_class)
+
+    for content in ("add milk", "Plan meals for the week around what's in the fridge"):
+        msg = InboundMessage(channel="test", sender_id="u", chat_id="s7", content=content, agent_name="grocer")
+        await handle_message(msg, cfg, MessageBus())
+    models = [c.kwargs["options"].model for c in mock_client_class.call_args_list]
+    assert models == ["claude-haiku-4-5", "claude-sonnet-4-6"]
+
+    sessions_dir = tmp_path / "agents" / "grocer" / "sessions"
+    replies = [h for h in session.get_history("s7", sessions_dir=sessions_dir) if h["role"] == "assistant"]
+    assert [(r["route"], r["route_reason"]) for r in replies] == [("fast", "short"), ("full", "keyword:plan")]
+    assert all("latency_ms" in r for r in replies)
+
+
+def _fake_factory(latency_ms):
+    from caveclaw.fakesdk import FakeProfile, FakeSDKClient
+
+    return lambda options=None: FakeSDKClient(options, FakeProfile(latency_ms=latency_ms, tokens=3))
+
+
+async def test_agent_loop_drains_in_flight_when_bus_closes(monkeypatch, tmp_path, templates_dir):
+    import asyncio
+
+    from caveclaw.agent import agent_loop
+
+    monkeypatch.setattr(config_mod, "AGENTS_DIR", tmp_path / "agents")
+    monkeypatch.setattr(config_mod, "TEMPLATES_DIR", templates_dir)
+    bus = MessageBus()
+    loop = asyncio.create_task(agent_loop(Config(), bus, client_factory=_fake_factory(50)))
+    for i in range(3):
+        await bus.publish_inbound(InboundMessage(channel="test", sender_id="u", chat_id=f"c{i}", content="hi"))
+    bus.close()
+    await asyncio.wait_for(loop, 5)  # returns on its own once the replies are out
+    replies = [await bus.consume_outbound() for _ in range(3)]
+    assert sorted(r.chat_id for r in replies) == ["c0", "c1", "c2"]
+
+
+async def test_cancelled_turn_is_recorded_as_interrupted(monkeypatch, tmp_path, templates_dir):
+    import asyncio
+
+    from caveclaw import session
+    from caveclaw.agent import INTERRUPTED_REPLY, agent_loop
+
+    monkeypatch.setattr(config_mod, "AGENTS_DIR", tmp_path / "agents")
+    monkeypatch.setattr(config_mod, "TEMPLATES_DIR", templates_dir)
+    bus = MessageBus()
+    loop = asyncio.create_task(agent_loop(Config(), bus, client_factory=_fake_factory(10_000)))
+    msg = InboundMessage(channel="test", sender_id="u", chat_id="c1", content="hi")
+    await bus.publish_inbound(msg)
+    while "model_start" not in msg.timings:
+        await asyncio.sleep(0.01)
+    loop.cancel()
+    await asyncio.gather(loop, return_exceptions=True)
+
+    assert (await bus.consume_outbound()).content == INTERRUPTED_REPLY
+    history = session.get_history("c1", sessions_dir=tmp_path / "agents" / "claw" / "sessions")
+    assert [h["role"] for h in history] == ["user", "assistant"]
+    assert history[-1]["interrupted"] is True
@@ -0,0 +1,80 @@
+"""Tests for batch mode."""
+
+import asyncio
+import json
+
+import pytest
+
+import caveclaw.agent as agent_mod
+from caveclaw.batch import completed_ids, read_items, run_batch
+from caveclaw.bus import OutboundMessage
+from caveclaw.config import Config
+
+
+@pytest.fixture
+def fake_agent(monkeypatch):
+    """Replace handle_message with an echo that tracks peak concurrency."""
+    state = {"active": 0, "peak": 0, "seen": []}
+
+    async def fake_handle(message, config, bus, client_factory=None, plan=None):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        state["seen"].append(message.content)
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        if message.content == "boom":
+            raise RuntimeError("kaboom")
+        await bus.publish_outbound(OutboundMessage(
+            channel=message.channel, chat_id=message.chat_id,
+            content=f"{message.agent_name}: {message.content}",
+        ))
+
+    monkeypatch.setattr(agent_mod, "handle_message", fake_handle)
+    return state
+
+
+def _write_jsonl(path, records):
+    path.write_text("".join(json.dumps(r) + "\n" for r in records))
+
+
+def _results(path):
+    return {r["id"]: r for r in map(json.loads, path.read_text().splitlines())}
+
+
+def test_read_items_defaults_ids_and_skips_bad_lines(tmp_path):
+    path = tmp_path / "in.jsonl"
+    path.write_text('{"prompt": "a"}\n\nnot json\n{"id": 7, "prompt": "b"}\n{"id": 8}\n')
+    assert [(i["id"], i["prompt"]) for i in read_items(path)] == [("1", "a"), ("7", "b")]
+
+
+async def test_run_batch_bounded_and_writes_results(tmp_path, fake_agent):
+    src, out = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_jsonl(src, [{"id": i, "prompt": f"p{i}"} for i in range(10)] + [{"id": "x", "prompt": "hi", "agent": "shadow"}])
+    stats = await run_batch(Config(), "claw", src, out, concurrency=3)
+    assert (stats.done, stats.failed, stats.skipped) == (11, 0, 0)
+    assert fake_agent["peak"] == 3
+    results = _results(out)
+    assert results["4"]["reply"] == "claw: p4"
+    assert results["x"]["reply"] == "shadow: hi"
+
+
+async def test_run_batch_resumes_and_retries_failures(tmp_path, fake_agent):
+    src, out = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_jsonl(src, [{"id": "a", "prompt": "one"}, {"id": "b", "prompt": "two"}])
+    out.write_text(json.dumps({"id": "a", "reply": "old"}) + "\n" + json.dumps({"id": "b", "error": "timed out"}) + "\n")
+    stats = await run_batch(Config(), "claw", src, out)
+    assert (stats.done, stats.skipped) == (1, 1)
+    assert fake_agent["seen"] == ["two"]
+    assert completed_ids(out) == {"a", "b"}
+
+
+async def test_run_batch_records_handler_errors_and_retries_them(tmp_path, fake_agent):
+    src, out = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    _write_jsonl(src, [{"id": 1, "prompt": "boom"}, {"id": 2, "prompt": "fine"}])
+    stats = await run_batch(Config(), "claw", src, out, timeout=1)
+    assert (stats.done, stats.failed) == (1, 1)
+    assert _results(out)["1"]["error"] == "Error: kaboom"
+    assert completed_ids(out) == {"2"}
+    stats = await run_batch(Config(), "claw", src, out, timeout=1)
+    assert (stats.failed, stats.skipped) == (1, 1)
+    assert fake_agent["seen"] == ["boom", "fine", "boom"]
@@ -0,0 +1,79 @@
+"""Tests for the fake SDK backend and the pipeline benchmark."""
+
+import json
+
+import pytest
+
+import caveclaw.config as config_mod
+from caveclaw import bench
+from caveclaw.agent import handle_message
+from caveclaw.bus import InboundMessage, MessageBus
+from caveclaw.config import Config
+from caveclaw.fakesdk import FakeProfile, FakeSDKClient
+
+
+@pytest.fixture
+def agents(monkeypatch, tmp_path, templates_dir):
+    monkeypatch.setattr(config_mod, "AGENTS_DIR", tmp_path / "agents")
+    monkeypatch.setattr(config_mod, "TEMPLATES_DIR", templates_dir)
+    return tmp_path / "agents"
+
+
+async def _reply(prompt, profile):
+    async with FakeSDKClient(profile=profile) as client:
+        await client.query(prompt)
+        return [m async for m in client.receive_response()]
+
+
+async def test_fake_client_is_deterministic():
+    profile = FakeProfile(latency_ms=0, tokens=5)
+    [a] = await _reply("hello", profile)
+    [b] = await _reply("hello", profile)
+    [c] = await _reply("other", profile)
+    assert a.content[0].text == b.content[0].text != c.content[0].text
+    assert len(a.content[0].text.split()) == 5
+
+
+async def test_model_backend_fake(agents):
+    bus = MessageBus()
+    msg = InboundMessage(channel="test", sender_id="u", chat_id="s1", content="hi")
+    await handle_message(msg, Config(model_backend="fake"), bus)
+    out = await bus.consume_outbound()
+    assert out.content.startswith("tok")
+    assert msg.timings["model_end"] - msg.timings["model_start"] >= 0.2
+
+
+def test_stage_stats_percentiles():
+    st = bench.stage_stats([i / 1000 for i in range(1, 101)])
+    assert st.count == 100
+    assert st.p50_ms == pytest.approx(50.5)
+    assert st.p99_ms == pytest.approx(99.01)
+    assert st.max_ms == pytest.approx(100)
+    assert bench.stage_stats([0.005]).p95_ms == pytest.approx(5)
+
+
+def test_replay_traffic_interleaves_user_turns(tmp_path):
+    paths = []
+    for n, turns in enumerate([["a1", "a2"], ["b1"]]):
+        path = tmp_path / f"s{n}.jsonl"
+        lines = []
+        for t in turns:
+            lines.append(json.dumps({"ts": 0, "role": "user", "content": t}))
+            lines.append(json.dumps({"ts": 0, "role": "assistant", "content": "ok"}))
+        path.write_text("\n".join(lines) + "\n")
+        paths.append(path)
+    traffic = bench.replay_traffic(paths)
+    assert [(r.chat_id, r.content) for r in traffic] == [
+        ("replay-0", "a1"), ("replay-1", "b1"), ("replay-0", "a2"),
+    ]
+
+
+async def test_run_bench_reports_every_stage(agents):
+    traffic = bench.synthetic_traffic(30, chats=3)
+    profile = FakeProfile(latency_ms=10, jitter_ms=5)
+    report = await bench.run_bench(Config(), traffic, rate=500, profile=profile)
+    assert report.completed == 30
+    assert set(report.stages) == set(bench.STAGES)
+    assert 5 <= report.stages["model"].p50_ms < 100
+    assert report.stages["total"].p50_ms >= report.stages["model"].p50_ms
+    assert json.loads(json.dumps(report.to_dict()))["completed"] == 30
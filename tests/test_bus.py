@@ -1,6 +1,10 @@
 """Tests for the async message bus."""
 
-from caveclaw.bus import Attachment, InboundMessage, MessageBus, OutboundMessage
+import asyncio
+
+import pytest
+
+from caveclaw.bus import Attachment, BusClosed, InboundMessage, MessageBus, OutboundMessage
 
 
 def test_attachment_fields():
@@ -51,3 +55,59 @@ async def test_bus_fifo_order(bus):
         await bus.publish_inbound(m)
     for m in msgs:
         assert await bus.consume_inbound() is m
+
+
+async def test_expect_reply_resolves_and_still_queues(bus):
+    future = bus.expect_reply("discord", "123")
+    msg = OutboundMessage(channel="discord", chat_id="123", content="hi")
+    await bus.publish_outbound(msg)
+    assert future.result() is msg
+    assert await bus.consume_outbound() is msg
+
+
+async def test_expect_reply_consume_skips_queue(bus):
+    future = bus.expect_reply("cli", "s", consume=True)
+    await bus.publish_outbound(OutboundMessage(channel="cli", chat_id="s", content="mine"))
+    assert future.result().content == "mine"
+    assert bus._outbound.empty()
+
+
+async def test_expect_reply_ignores_other_chats_and_cancelled(bus):
+    cancelled = bus.expect_reply("cli", "s")
+    cancelled.cancel()
+    waiting = bus.expect_reply("cli", "s")
+    await bus.publish_outbound(OutboundMessage(channel="cli", chat_id="other", content="x"))
+    assert not waiting.done()
+    await bus.publish_outbound(OutboundMessage(channel="cli", chat_id="s", content="y"))
+    assert waiting.result().content == "y"
+
+
+async def test_partials_reach_open_streams_only(bus):
+    bus.publish_partial(OutboundMessage(channel="http", chat_id="s", content="dropped"))
+    stream = bus.open_stream("http", "s")
+    bus.publish_partial(OutboundMessage(channel="http", chat_id="s", content="step 1"))
+    assert (await stream.get()).content == "step 1"
+    bus.close_stream("http", "s")
+    bus.publish_partial(OutboundMessage(channel="http", chat_id="s", content="late"))
+    assert stream.empty()
+
+
+async def test_closed_bus_drains_then_raises(bus, inbound_message):
+    await bus.publish_inbound(inbound_message)
+    bus.close()
+    with pytest.raises(BusClosed):
+        await bus.publish_inbound(inbound_message)
+    assert await bus.consume_inbound() is inbound_message
+    for _ in range(2):  # stays closed for every consumer
+        with pytest.raises(BusClosed):
+            await bus.consume_inbound()
+
+
+async def test_join_outbound_waits_for_delivery(bus):
+    await bus.publish_outbound(OutboundMessage(channel="c", chat_id="1", content="x"))
+    join = asyncio.create_task(bus.join_outbound())
+    await bus.consume_outbound()
+    await asyncio.sleep(0)
+    assert not join.done()
+    bus.outbound_done()
+    await asyncio.wait_for(join, 1)
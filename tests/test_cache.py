@@ -0,0 +1,91 @@
+"""Tests for the opt-in response cache."""
+
+import pytest
+
+import caveclaw.config as config_mod
+from caveclaw import cache, db
+from caveclaw.agent import handle_message
+from caveclaw.bus import InboundMessage, MessageBus
+from caveclaw.cache import ResponseCacheConfig
+from caveclaw.config import AgentConfig, Config
+from caveclaw.fakesdk import FakeProfile, FakeSDKClient
+from caveclaw.registry import registry
+
+
+@pytest.fixture(autouse=True)
+def _fresh_stats(monkeypatch):
+    monkeypatch.setattr(cache, "stats", cache.CacheStats())
+
+
+@pytest.fixture
+def agents(monkeypatch, tmp_path, templates_dir):
+    monkeypatch.setattr(config_mod, "AGENTS_DIR", tmp_path / "agents")
+    monkeypatch.setattr(config_mod, "TEMPLATES_DIR", templates_dir)
+    return tmp_path / "agents"
+
+
+def test_cache_key_covers_what_shapes_the_reply(agents, sample_attachment):
+    agent = registry.get(Config(), "claw")
+    key = cache.cache_key(agent, "m", "What is  the Capital?")
+    assert key == cache.cache_key(agent, "m", "what is the capital?")
+    assert key != cache.cache_key(agent, "other", "what is the capital?")
+    assert key != cache.cache_key(agent, "m", "what is the capital?", [sample_attachment])
+    assert key != cache.cache_key(agent, "m", "what is the capital?", history="User: hi")
+
+    (agents / "claw" / "MEMORY.md").write_text("The user lives in Oslo.\n")
+    registry.invalidate()
+    assert key != cache.cache_key(registry.get(Config(), "claw"), "m", "what is the capital?")
+
+
+async def test_store_evicts_least_recently_used():
+    cfg = ResponseCacheConfig(max_entries=2)
+    for k in ("a", "b"):
+        await cache.store(k, "claw", f"reply {k}", cfg)
+    assert await cache.lookup("a") == "reply a"
+    db.close_db()  # flush the last_used update
+    await cache.store("c", "claw", "reply c", cfg)
+    assert await cache.lookup("b") is None
+    assert await cache.lookup("a") == "reply a"
+    assert cache.stats.evictions == 1
+    assert (cache.stats.hits, cache.stats.misses) == (2, 1)
+
+
+async def test_expired_replies_miss_and_are_swept():
+    await cache.store("a", "claw", "reply", ResponseCacheConfig(ttl_seconds=-1))
+    assert await cache.lookup("a") is None
+    assert db.sweep_expired() == 1
+
+
+async def test_clear_cached_replies_by_agent():
+    cfg = ResponseCacheConfig()
+    await cache.store("a", "claw", "reply a", cfg)
+    await cache.store("b", "shadow", "reply b", cfg)
+    db.close_db()  # flush the queued writes
+    assert db.clear_cached_replies("claw") == 1
+    assert await cache.lookup("a") is None
+    assert await cache.lookup("b") == "reply b"
+    assert db.clear_cached_replies() == 1
+    assert await cache.lookup("b") is None
+
+
+async def test_cache_hit_skips_the_model(agents):
+    calls = []
+
+    def factory(options=None):
+        calls.append(options.model)
+        return FakeSDKClient(options, FakeProfile(latency_ms=0, tokens=3))
+
+    cfg = Config(agents={"claw": AgentConfig(response_cache=ResponseCacheConfig())})
+    bus = MessageBus()
+    replies = []
+    for chat in ("c1", "c2", "c1"):
+        msg = InboundMessage(channel="test", sender_id="u", chat_id=chat, content="Opening hours?")
+        await handle_message(msg, cfg, bus, client_factory=factory)
+        replies.append((await bus.consume_outbound()).content)
+    assert len(calls) == 1
+    assert len(set(replies)) == 1
+    assert cache.stats.to_dict()["hit_rate"] == round(2 / 3, 3)
+    from caveclaw import session
+
+    history = session.get_history("c1", sessions_dir=agents / "claw" / "sessions")
+    assert [h.get("cached") for h in history if h["role"] == "assistant"] == [None, True]
@@ -2,6 +2,9 @@
 
 import json
 
+import pytest
+from pydantic import ValidationError
+
 import caveclaw.config as config_mod
 from caveclaw.config import AgentConfig, Config
 
@@ -24,6 +27,14 @@ def test_config_custom_fields():
     assert c.max_attachment_bytes == 5_000_000
 
 
+def test_config_rejects_unknown_log_settings():
+    assert Config(log_level="DEBUG").log_level == "DEBUG"
+    with pytest.raises(ValidationError):
+        Config(log_level="verbose")
+    with pytest.raises(ValidationError):
+        Config(log_format="xml")
+
+
 def test_agent_dir(monkeypatch, tmp_path):
     agents = tmp_path / "agents"
     monkeypatch.setattr(config_mod, "AGENTS_DIR", agents)
@@ -118,3 +129,37 @@ def test_load_config_env_overrides_file(monkeypatch, tmp_path):
     monkeypatch.setenv("DISCORD_TOKEN", "env-token-wins")
     c = config_mod.load_config()
     assert c.discord_token == "env-token-wins"
+
+
+# --- SDK option profiles ---
+
+
+def test_parse_front_matter():
+    text = "---\nallowed_tools: [Read, Bash]\nmax_turns: 5\ndisallowed_tools:\n  - WebSearch\n  - WebFetch\n---\n\n# Tools\n"
+    fields, body = config_mod.parse_front_matter(text)
+    assert fields == {
+        "allowed_tools": ["Read", "Bash"],
+        "max_turns": 5,
+        "disallowed_tools": ["WebSearch", "WebFetch"],
+    }
+    assert body == "# Tools\n"
+
+
+def test_parse_front_matter_absent():
+    assert config_mod.parse_front_matter("# Tools\n---\n") == ({}, "# Tools\n---\n")
+
+
+def test_resolve_sdk_options_defaults(tmp_path):
+    assert config_mod.resolve_sdk_options(Config(), "claw", tmp_path) == {"permission_mode": "bypassPermissions"}
+
+
+def test_resolve_sdk_options_front_matter_and_config(tmp_path):
+    (tmp_path / "TOOLS.md").write_text("---\ndisallowed_tools: [WebSearch]\nmax_turns: 8\nbogus: 1\n---\n")
+    c = Config(agents={"grocer": AgentConfig(max_turns=3, allowed_tools=["Read"])})
+    options = config_mod.resolve_sdk_options(c, "grocer", tmp_path)
+    assert options == {
+        "permission_mode": "bypassPermissions",
+        "disallowed_tools": ["WebSearch"],
+        "max_turns": 3,
+        "allowed_tools": ["Read"],
+    }
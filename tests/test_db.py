@@ -1,5 +1,8 @@
 """Tests for SQLite state and scheduled tasks."""
 
+import asyncio
+import threading
+
 import pytest
 
 import caveclaw.db as db_mod
@@ -56,3 +59,227 @@ def test_get_due_tasks_returns_enabled():
 def test_get_due_tasks_empty():
     db_mod.init_db()
     assert db_mod.get_due_tasks() == []
+
+
+def test_connections_use_wal():
+    db_mod.init_db()
+    with db_mod._db().read() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+
+def test_connections_are_reused():
+    db_mod.init_db()
+    with db_mod._db().read() as first:
+        pass
+    with db_mod._db().read() as second:
+        assert second is first
+
+
+def test_concurrent_readers_and_writers():
+    db_mod.init_db()
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(50):
+                db_mod.set_state(f"k{n}", str(i))
+                assert db_mod.get_state(f"k{n}") == str(i)
+        except Exception as e:  # pragma: no cover - surfaced below
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert db_mod.get_state("k7") == "49"
+
+
+def test_close_db_reopens_on_next_use():
+    db_mod.init_db()
+    db_mod.set_state("key", "kept")
+    db_mod.close_db()
+    assert db_mod.get_state("key") == "kept"
+
+
+async def test_async_state_round_trip():
+    db_mod.init_db()
+    await db_mod.aset_state("color", "green")
+    assert await db_mod.aget_state("color") == "green"
+    assert await db_mod.aget_state("missing", "fallback") == "fallback"
+
+
+async def test_async_writes_are_batched():
+    db_mod.init_db()
+    await asyncio.gather(*(db_mod.aset_state(f"k{i}", str(i)) for i in range(200)))
+    values = await asyncio.gather(*(db_mod.aget_state(f"k{i}") for i in range(200)))
+    assert values == [str(i) for i in range(200)]
+
+
+async def test_async_failed_write_does_not_undo_batch():
+    db_mod.init_db()
+    bad = db_mod._run_async(lambda conn: conn.execute("INSERT INTO nope VALUES (1)"), write=True)
+    good = db_mod.aset_state("ok", "yes")
+    results = await asyncio.gather(bad, good, return_exceptions=True)
+    assert isinstance(results[0], Exception)
+    assert db_mod.get_state("ok") == "yes"
+
+
+async def test_async_tasks():
+    db_mod.init_db()
+    task_id = await db_mod.aadd_task("t", "* * * * *", "cmd")
+    tasks = await db_mod.aget_due_tasks()
+    assert [t["id"] for t in tasks] == [task_id]
+
+
+def test_add_task_with_delivery_fields():
+    db_mod.init_db()
+    task_id = db_mod.add_task("t", "0 9 * * *", "cmd", agent="grocer", channel="discord", chat_id="42")
+    task = db_mod.get_task(task_id)
+    assert task["agent"] == "grocer"
+    assert task["channel"] == "discord"
+    assert task["chat_id"] == "42"
+    assert task["misfire"] == "once"
+
+
+def test_add_task_bumps_version():
+    db_mod.init_db()
+    db_mod.add_task("t", "* * * * *", "cmd")
+    first = db_mod.get_state(db_mod.TASKS_VERSION_KEY)
+    db_mod.add_task("u", "* * * * *", "cmd")
+    assert db_mod.get_state(db_mod.TASKS_VERSION_KEY) != first
+
+
+def test_disabled_tasks_are_listed_but_not_due():
+    db_mod.init_db()
+    task_id = db_mod.add_task("t", "* * * * *", "cmd")
+    db_mod.set_task_enabled(task_id, False)
+    assert db_mod.get_due_tasks() == []
+    assert [t["id"] for t in db_mod.list_tasks()] == [task_id]
+
+
+def test_task_runs_round_trip():
+    db_mod.init_db()
+    task_id = db_mod.add_task("t", "* * * * *", "cmd")
+    run_id = db_mod.start_task_run(task_id, 100.0)
+    db_mod.finish_task_run(run_id, 105.0, "ok")
+    [run] = db_mod.get_task_runs(task_id)
+    assert (run["started_at"], run["finished_at"], run["result"]) == (100.0, 105.0, "ok")
+    assert db_mod.get_task(task_id)["last_run_at"] == 100.0
+
+
+def test_init_db_migrates_old_tasks_table():
+    with db_mod._db().write() as conn:
+        conn.execute(
+            "CREATE TABLE scheduled_tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, "
+            "cron TEXT NOT NULL, command TEXT NOT NULL, enabled INTEGER DEFAULT 1, created_at REAL)"
+        )
+        conn.execute("INSERT INTO scheduled_tasks (name, cron, command) VALUES ('old', '* * * * *', 'x')")
+    db_mod.init_db()
+    [task] = db_mod.list_tasks()
+    assert task["misfire"] == "once"
+    assert task["channel"] == "scheduler"
+
+
+# --- namespaces, TTL, batch ops and cache ---
+
+
+def test_namespaced_keys():
+    db_mod.init_db()
+    db_mod.set_state("123", "shadow", namespace="channel")
+    assert db_mod.get_state("channel:123") == "shadow"
+    assert db_mod.get_state("123", namespace="channel") == "shadow"
+    assert db_mod.get_state("123", namespace="user") is None
+
+
+def test_ttl_expires_lazily(monkeypatch):
+    db_mod.init_db()
+    now = [1000.0]
+    monkeypatch.setattr(db_mod.time, "time", lambda: now[0])
+    db_mod.set_state("flag", "on", ttl=60)
+    assert db_mod.get_state("flag") == "on"
+    now[0] += 61
+    assert db_mod.get_state("flag", "gone") == "gone"
+
+
+def test_sweep_expired_removes_only_expired(monkeypatch):
+    db_mod.init_db()
+    now = [1000.0]
+    monkeypatch.setattr(db_mod.time, "time", lambda: now[0])
+    db_mod.set_state("short", "x", ttl=10)
+    db_mod.set_state("long", "y", ttl=1000)
+    db_mod.set_state("forever", "z")
+    now[0] += 11
+    assert db_mod.sweep_expired() == 1
+    assert db_mod.get_many(["short", "long", "forever"]) == {"long": "y", "forever": "z"}
+
+
+def test_set_many_and_get_many():
+    db_mod.init_db()
+    db_mod.set_many({"a": "1", "b": "2"}, namespace="ns")
+    assert db_mod.get_many(["a", "b", "c"], namespace="ns") == {"a": "1", "b": "2"}
+    assert db_mod.list_state("ns") == {"a": "1", "b": "2"}
+
+
+def test_delete_state():
+    db_mod.init_db()
+    db_mod.set_state("k", "v")
+    assert db_mod.delete_state("k") is True
+    assert db_mod.get_state("k") is None
+    assert db_mod.delete_state("k") is False
+
+
+def test_reads_are_served_from_cache():
+    db_mod.init_db()
+    db_mod.set_state("k", "v")
+    cache = db_mod._db().cache
+    hits = cache.hits
+    for _ in range(5):
+        assert db_mod.get_state("k") == "v"
+    assert cache.hits == hits + 5
+
+
+def test_cache_is_updated_on_write():
+    db_mod.init_db()
+    db_mod.set_state("k", "v1")
+    assert db_mod.get_state("k") == "v1"
+    db_mod.set_state("k", "v2")
+    assert db_mod.get_state("k") == "v2"
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(db_mod, "STATE_CACHE_SIZE", 3)
+    db_mod.init_db()
+    db_mod.set_many({str(i): str(i) for i in range(10)})
+    assert len(db_mod._db().cache._data) == 3
+
+
+def test_fresh_read_sees_external_writes():
+    db_mod.init_db()
+    db_mod.set_state("k", "mine")
+    assert db_mod.get_state("k") == "mine"
+    # Simulate another process writing the row directly
+    with db_mod._db().read() as conn:
+        conn.execute("UPDATE state SET value = 'theirs' WHERE key = 'k'")
+    assert db_mod.get_state("k") == "mine"
+    assert db_mod.get_state("k", fresh=True) == "theirs"
+
+
+def test_rolled_back_write_does_not_reach_cache():
+    db_mod.init_db()
+    db_mod.set_state("k", "before")
+    with pytest.raises(RuntimeError):
+        with db_mod._db().write() as conn:
+            db_mod._write_state(conn, {"k": "after"}, None)
+            raise RuntimeError
+    assert db_mod.get_state("k") == "before"
+
+
+async def test_async_batch_ops_and_ttl():
+    db_mod.init_db()
+    await db_mod.aset_many({"x": "1", "y": "2"}, namespace="ns", ttl=60)
+    assert await db_mod.aget_many(["x", "y"], namespace="ns") == {"x": "1", "y": "2"}
+    assert await db_mod.adelete_state("x", namespace="ns") is True
+    assert await db_mod.aget_state("x", namespace="ns") is None
@@ -0,0 +1,146 @@
+"""Tests for load-aware degradation."""
+
+import asyncio
+
+import pytest
+from pydantic import ValidationError
+
+import caveclaw.agent as agent_mod
+import caveclaw.config as config_mod
+from caveclaw import degrade, session
+from caveclaw.agent import agent_loop, handle_message
+from caveclaw.bus import InboundMessage, MessageBus, OutboundMessage
+from caveclaw.config import Config
+from caveclaw.degrade import DegradeConfig, LoadController, plan_for
+
+CFG = DegradeConfig(inflight=[2, 4, 6, 8], queue_wait_ms=[100, 200, 300, 400], cooldown_seconds=10)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_steps_up_immediately_on_either_signal():
+    load = LoadController(Clock())
+    assert load.observe(0, 0.0, CFG).level == 0
+    assert load.observe(4, 0.0, CFG).name == "fast"
+    plan = load.observe(9, 0.0, CFG)
+    assert plan.shed and plan.skip_extras and plan.fast_model and plan.history_turns == 10
+    load = LoadController(Clock())
+    assert load.observe(0, 5.0, CFG).level == 4  # 5s wait, smoothed to 1.5s
+
+
+def test_steps_down_with_hysteresis():
+    clock = Clock()
+    load = LoadController(clock)
+    load.observe(6, 0.0, CFG)
+    assert load.level == 3
+    # Below the level-3 threshold but not under recover_ratio of it: stay
+    clock.now = 100
+    assert load.observe(4, 0.0, CFG).level == 3
+    clock.now = 200
+    assert load.observe(4, 0.0, CFG).level == 3
+    # Calm after t=200; one level per cooldown
+    clock.now = 205
+    assert load.observe(0, 0.0, CFG).level == 3
+    clock.now = 209
+    assert load.observe(0, 0.0, CFG).level == 3
+    clock.now = 210
+    assert load.observe(0, 0.0, CFG).level == 2
+    clock.now = 235
+    assert load.observe(0, 0.0, CFG).level == 0
+    assert load.transitions == 3
+
+
+def test_recovers_after_idle_gap():
+    clock = Clock()
+    load = LoadController(clock)
+    assert load.observe(70, 5.0, CFG).shed
+    # An hour with no messages is cooldown already served
+    clock.now = 3600
+    assert load.observe(0, 0.0, CFG).level == 0
+    clock.now = 3610
+    assert load.observe(0, 0.0, CFG).level == 0
+
+
+def test_thresholds_need_one_per_level():
+    for bad in ([10, 20], [1, 2, 3, 4, 5], [4, 3, 2, 1]):
+        with pytest.raises(ValidationError):
+            DegradeConfig(inflight=bad)
+        with pytest.raises(ValidationError):
+            DegradeConfig(queue_wait_ms=bad)
+    assert DegradeConfig(inflight=[1, 1, 2, 3]).inflight == [1, 1, 2, 3]
+
+
+def test_plan_for_levels():
+    assert plan_for(0, CFG) == degrade.NORMAL
+    assert plan_for(1, CFG).history_turns == 10 and not plan_for(1, CFG).fast_model
+
+
+async def test_agent_loop_sheds_under_load(monkeypatch):
+    started = []
+    release = asyncio.Event()
+
+    async def slow_handle(message, config, bus, client_factory=None, plan=None):
+        started.append(plan.name)
+        await release.wait()
+        await bus.publish_outbound(OutboundMessage(message.channel, message.chat_id, "done"))
+
+    monkeypatch.setattr(agent_mod, "handle_message", slow_handle)
+    bus = MessageBus()
+    cfg = Config(degrade=DegradeConfig(inflight=[1, 2, 3, 4], queue_wait_ms=[1e9] * 4, busy_message="busy"))
+    loop = asyncio.create_task(agent_loop(cfg, bus))
+    for i in range(6):
+        await bus.publish_inbound(InboundMessage(channel="t", sender_id="u", chat_id=str(i), content="hi"))
+        await asyncio.sleep(0.01)
+    assert started == ["normal", "trim", "fast", "lean"]
+    busy = await bus.consume_outbound()
+    assert busy.content == "busy"
+    assert degrade.active().shed == 2
+    release.set()
+    await asyncio.sleep(0.01)
+    loop.cancel()
+    await asyncio.gather(loop, return_exceptions=True)
+    assert degrade.active() is None
+
+
+async def test_handle_message_applies_plan(monkeypatch, tmp_path, templates_dir):
+    from unittest.mock import AsyncMock, MagicMock
+
+    from caveclaw import memory as mem
+
+    monkeypatch.setattr(config_mod, "AGENTS_DIR", tmp_path / "agents")
+    monkeypatch.setattr(config_mod, "TEMPLATES_DIR", templates_dir)
+    logged = []
+    monkeypatch.setattr(mem, "append_history", lambda ws, text: logged.append(text))
+
+    async def no_messages():
+        return
+        yield
+
+    client = AsyncMock()
+    client.receive_response = MagicMock(side_effect=no_messages)
+    client_class = MagicMock()
+    client_class.return_value.__aenter__ = AsyncMock(return_value=client)
+    client_class.return_value.__aexit__ = AsyncMock(return_value=False)
+    cfg = Config(degrade=DegradeConfig(history_turns=2, fast_model="claude-haiku-4-5"))
+    sessions_dir = tmp_path / "agents" / "claw" / "sessions"
+    for i in range(6):
+        session.append("c", "user", f"old {i}", sessions_dir=sessions_dir)
+
+    msg = InboundMessage(channel="t", sender_id="u", chat_id="c", content="hi")
+    await handle_message(msg, cfg, MessageBus(), client_class, plan_for(3, cfg.degrade))
+    options = client_class.call_args.kwargs["options"]
+    assert options.model == "claude-haiku-4-5"
+    assert "old 3" not in options.system_prompt and "old 5" in options.system_prompt
+    assert logged == []
+    reply = session.get_history("c", sessions_dir=sessions_dir)[-1]
+    assert (reply["model"], reply["degraded"]) == ("claude-haiku-4-5", "lean")
+
+    await handle_message(msg, cfg, MessageBus(), client_class)
+    assert client_class.call_args.kwargs["options"].model == "claude-sonnet-4-6"
+    assert len(logged) == 1
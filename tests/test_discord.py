@@ -41,6 +41,55 @@ def test_split_message_no_newline():
     assert chunks[2] == "x" * 500
 
 
+def test_split_message_keeps_code_fences_balanced():
+    code = "\n".join(f"print({i})" for i in range(600))
+    text = f"Here you go:\n```python\n{code}\n```\nDone."
+    chunks = discord_mod._split_message(text)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk) <= 2000
+        assert chunk.count("```") % 2 == 0
+    assert chunks[1].startswith("```python\n")
+    assert chunks[-1].endswith("Done.")
+
+
+def test_split_message_preserves_content():
+    text = "\n".join(f"line {i} " + "y" * (i % 90) for i in range(2000))
+    chunks = discord_mod._split_message(text)
+    assert all(len(c) <= 2000 for c in chunks)
+    assert "\n".join(chunks).split() == text.split()
+
+
+def test_split_message_large_input_is_fast():
+    text = ("word " * 30 + "\n") * 40_000  # ~6 MB
+    start = time.perf_counter()
+    chunks = discord_mod._split_message(text)
+    assert time.perf_counter() - start < 2.0
+    assert all(len(c) <= 2000 for c in chunks)
+
+
+# --- _send_reply ---
+
+
+async def test_send_reply_short_sends_chunks():
+    channel = MagicMock()
+    channel.send = AsyncMock()
+    await discord_mod._send_reply(channel, "hello", max_chunks=4)
+    channel.send.assert_awaited_once_with("hello")
+
+
+async def test_send_reply_long_attaches_file():
+    channel = MagicMock()
+    channel.send = AsyncMock()
+    text = ("a" * 100 + "\n") * 200  # ~20 KB, well over 4 chunks
+    await discord_mod._send_reply(channel, text, max_chunks=4)
+    channel.send.assert_awaited_once()
+    args, kwargs = channel.send.call_args
+    assert "Full reply attached" in args[0]
+    assert len(args[0]) <= 2000
+    assert kwargs["file"].filename == "reply.md"
+
+
 # --- _available_agents ---
 
 
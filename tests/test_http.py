@@ -0,0 +1,166 @@
+"""Tests for the HTTP channel."""
+
+import asyncio
+import json
+
+import pytest
+
+import caveclaw.agent as agent_mod
+from caveclaw.agent import agent_loop
+from caveclaw.bus import MessageBus, OutboundMessage
+from caveclaw.channels.http import HTTPChannel
+from caveclaw.config import Config
+from caveclaw.reload import ConfigWatcher
+
+
+async def fake_handle(message, config, bus, client_factory=None, plan=None):
+    bus.publish_partial(OutboundMessage(message.channel, message.chat_id, "thinking..."))
+    await asyncio.sleep(0.01 if message.content != "slow" else 0.2)
+    await bus.publish_outbound(OutboundMessage(
+        message.channel, message.chat_id, f"{message.agent_name} says {message.content}",
+    ))
+
+
+@pytest.fixture
+async def server(monkeypatch, tmp_path):
+    """Start the HTTP channel on a free port; yields a function to change settings."""
+    monkeypatch.setattr(agent_mod, "handle_message", fake_handle)
+    watcher = ConfigWatcher(Config(http_max_concurrency=2), tmp_path / "config.json")
+    bus = MessageBus()
+    loop_task = asyncio.create_task(agent_loop(watcher.current, bus, watcher))
+    srv = await asyncio.start_server(HTTPChannel(bus, watcher).serve_connection, "127.0.0.1", 0)
+    port = srv.sockets[0].getsockname()[1]
+    yield port, watcher
+    srv.close()
+    loop_task.cancel()
+
+
+class Client:
+    """A minimal keep-alive HTTP/1.1 client."""
+
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+
+    @classmethod
+    async def connect(cls, port):
+        return cls(*await asyncio.open_connection("127.0.0.1", port))
+
+    async def request(self, method, path, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        head = [f"{method} {path} HTTP/1.1", "Host: test", f"Content-Length: {len(data)}"]
+        head += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        self.writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + data)
+        status = int((await self.reader.readline()).split()[1])
+        resp_headers = {}
+        while (line := await self.reader.readline()) != b"\r\n":
+            name, _, value = line.decode().partition(":")
+            resp_headers[name.lower()] = value.strip()
+        if resp_headers.get("transfer-encoding") == "chunked":
+            body = b""
+            while size := int((await self.reader.readline()).strip(), 16):
+                body += await self.reader.readexactly(size)
+                await self.reader.readline()
+            await self.reader.readline()
+            return status, resp_headers, body.decode()
+        body = await self.reader.readexactly(int(resp_headers["content-length"]))
+        return status, resp_headers, json.loads(body)
+
+    def close(self):
+        self.writer.close()
+
+
+def _events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+async def test_single_message_and_keep_alive(server):
+    port, _ = server
+    client = await Client.connect(port)
+    status, _, body = await client.request("POST", "/v1/messages", {"content": "hi", "chat_id": "c1"})
+    assert status == 200
+    assert len(body.pop("correlation_id")) == 12
+    assert body == {"chat_id": "c1", "agent": "claw", "reply": "claw says hi"}
+    # Same connection, second request
+    status, headers, body = await client.request("GET", "/health")
+    assert (status, body) == (200, {"status": "ok"})
+    assert headers["connection"] == "keep-alive"
+    client.close()
+
+
+async def test_batch_returns_results_in_order(server):
+    port, _ = server
+    client = await Client.connect(port)
+    messages = [{"content": f"m{i}", "agent": "shadow"} for i in range(5)]
+    status, _, body = await client.request("POST", "/v1/messages", {"messages": messages})
+    assert status == 200
+    assert [r["reply"] for r in body["results"]] == [f"shadow says m{i}" for i in range(5)]
+    client.close()
+
+
+async def test_stream_sends_deltas_and_replies(server):
+    port, _ = server
+    client = await Client.connect(port)
+    batch = {"messages": [{"content": "slow", "chat_id": "a"}, {"content": "fast", "chat_id": "b"}]}
+    status, headers, text = await client.request(
+        "POST", "/v1/messages", batch, {"Accept": "text/event-stream"},
+    )
+    assert status == 200
+    assert headers["content-type"] == "text/event-stream"
+    events = _events(text)
+    assert [e for e, _ in events].count("delta") == 2
+    replies = [d for e, d in events if e == "reply"]
+    assert [r["chat_id"] for r in replies] == ["b", "a"]  # in completion order
+    assert events[-1] == ("done", {"count": 2})
+    # The chunked stream leaves the connection reusable
+    status, _, _ = await client.request("GET", "/health")
+    assert status == 200
+    client.close()
+
+
+async def test_rejects_bad_requests(server):
+    port, watcher = server
+    client = await Client.connect(port)
+    assert (await client.request("POST", "/v1/messages", {"content": ""}))[0] == 400
+    dupes = {"messages": [{"content": "x", "chat_id": "same"}, {"content": "y", "chat_id": "same"}]}
+    assert (await client.request("POST", "/v1/messages", dupes))[0] == 400
+    assert (await client.request("GET", "/v1/messages"))[0] == 405
+    assert (await client.request("GET", "/nope"))[0] == 404
+    watcher.current = Config(http_token="s3cret")
+    assert (await client.request("POST", "/v1/messages", {"content": "hi"}))[0] == 401
+    auth = {"Authorization": "Bearer s3cret"}
+    assert (await client.request("POST", "/v1/messages", {"content": "hi"}, auth))[0] == 200
+    client.close()
+
+
+async def test_concurrency_bound_returns_503(server):
+    port, _ = server
+    clients = [await Client.connect(port) for _ in range(3)]
+    slow = [asyncio.create_task(c.request("POST", "/v1/messages", {"content": "slow"})) for c in clients[:2]]
+    await asyncio.sleep(0.05)
+    status, headers, _ = await clients[2].request("POST", "/v1/messages", {"content": "hi"})
+    assert status == 503
+    assert headers["retry-after"] == "1"
+    assert [s for s, _, _ in await asyncio.gather(*slow)] == [200, 200]
+    for c in clients:
+        c.close()
+
+
+async def test_metrics_reports_loop_watchdog(server):
+    from caveclaw.watchdog import LoopWatchdog
+
+    port, _ = server
+    dog = asyncio.create_task(LoopWatchdog(threshold=1.0, interval=0.01).run())
+    await asyncio.sleep(0.05)
+    client = await Client.connect(port)
+    status, _, body = await client.request("GET", "/metrics")
+    assert status == 200
+    assert body["loop"]["samples"] > 0
+    dog.cancel()
+    await asyncio.gather(dog, return_exceptions=True)
+    _, _, body = await client.request("GET", "/metrics")
+    assert body["loop"] is None
+    client.close()
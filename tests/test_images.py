@@ -0,0 +1,70 @@
+"""Tests for attachment image preprocessing."""
+
+import pytest
+
+from caveclaw import images
+from caveclaw.bus import Attachment
+from caveclaw.config import AgentConfig, Config, resolve_image_max_edge
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture
+def big_photo(tmp_path):
+    """A noisy 1600x1200 JPEG with EXIF metadata."""
+    path = tmp_path / "abc123_photo.jpg"
+    img = Image.effect_noise((1600, 1200), 64).convert("RGB")
+    exif = Image.Exif()
+    exif[0x010F] = "PhoneMaker"  # Make
+    img.save(path, format="JPEG", quality=95, exif=exif)
+    return Attachment(
+        path=str(path),
+        filename="photo.jpg",
+        content_type="image/jpeg",
+        size=path.stat().st_size,
+    )
+
+
+def test_optimize_image_downscales_and_strips_metadata(big_photo, tmp_path):
+    dest = tmp_path / "out.webp"
+    size = images.optimize_image(big_photo.path, str(dest), 512, 80, "webp")
+    assert size == dest.stat().st_size
+    with Image.open(dest) as out:
+        assert max(out.size) == 512
+        assert out.format == "WEBP"
+        assert not out.getexif()
+
+
+async def test_preprocess_points_at_optimized_copy(big_photo):
+    [result] = await images.preprocess_attachments([big_photo], max_edge=512, quality=70)
+    assert result.path.endswith(".opt.webp")
+    assert result.content_type == "image/webp"
+    assert result.original_path == big_photo.path
+    assert result.original_size == big_photo.size
+    assert result.size < big_photo.size
+    # The original stays on disk next to the optimized copy
+    with Image.open(result.original_path) as original:
+        assert original.size == (1600, 1200)
+
+
+async def test_preprocess_passes_through_gif(sample_attachment):
+    gif = Attachment(path=sample_attachment.path, filename="a.gif", content_type="image/gif", size=10)
+    assert await images.preprocess_attachments([gif], max_edge=512) == [gif]
+
+
+async def test_preprocess_keeps_original_on_failure(sample_attachment):
+    # sample_attachment is not a decodable PNG
+    [result] = await images.preprocess_attachments([sample_attachment], max_edge=512)
+    assert result is sample_attachment
+
+
+async def test_preprocess_rejects_unknown_format(big_photo):
+    with pytest.raises(ValueError):
+        await images.preprocess_attachments([big_photo], max_edge=512, fmt="bmp")
+
+
+def test_resolve_image_max_edge():
+    c = Config(image_max_edge=1024, agents={"grocer": AgentConfig(image_max_edge=512)})
+    assert resolve_image_max_edge(c, "grocer") == 512
+    assert resolve_image_max_edge(c, "claw") == 1024
+    assert resolve_image_max_edge(Config(), "claw") is None
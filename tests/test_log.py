@@ -0,0 +1,83 @@
+"""Tests for the logging pipeline."""
+
+import asyncio
+import io
+import json
+import logging
+
+import pytest
+
+from caveclaw.agent import _reply_to
+from caveclaw.bus import InboundMessage
+from caveclaw.log import correlation_id, setup_logging, stop_logging
+
+
+@pytest.fixture
+def stream():
+    """Route caveclaw logging to a buffer; restore the logger afterwards."""
+    logger = logging.getLogger("caveclaw")
+    saved = logger.handlers[:], logger.level, logger.propagate
+    buf = io.StringIO()
+    yield buf
+    stop_logging()
+    logger.handlers, logger.level, logger.propagate = saved[0], saved[1], saved[2]
+
+
+def _lines(buf):
+    stop_logging()  # flushes the queue
+    return [json.loads(line) for line in buf.getvalue().splitlines()]
+
+
+def test_json_records_carry_correlation_id_and_extras(stream):
+    setup_logging("DEBUG", "json", stream=stream)
+    log = logging.getLogger("caveclaw.test")
+    token = correlation_id.set("abc123")
+    try:
+        log.info("hello %s", "world", extra={"chat_id": "c1"})
+    finally:
+        correlation_id.reset(token)
+    log.warning("no context")
+    first, second = _lines(stream)
+    assert first["msg"] == "hello world"
+    assert (first["correlation_id"], first["chat_id"], first["level"]) == ("abc123", "c1", "INFO")
+    assert "correlation_id" not in second
+
+
+def test_exceptions_keep_their_traceback(stream):
+    setup_logging("INFO", "json", stream=stream)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logging.getLogger("caveclaw.test").exception("failed")
+    (entry,) = _lines(stream)
+    assert "ValueError: boom" in entry["exc"]
+
+
+def test_debug_sampling_keeps_or_drops_a_message_whole(stream):
+    setup_logging("DEBUG", "json", debug_sample=0.5, stream=stream)
+    log = logging.getLogger("caveclaw.test")
+    for i in range(200):
+        token = correlation_id.set(f"id{i}")
+        log.debug("one")
+        log.debug("two")
+        log.info("always")
+        correlation_id.reset(token)
+    entries = _lines(stream)
+    debug = [e["correlation_id"] for e in entries if e["level"] == "DEBUG"]
+    assert sum(e["level"] == "INFO" for e in entries) == 200
+    assert 0 < len(set(debug)) < 200
+    assert all(debug.count(cid) == 2 for cid in set(debug))
+
+
+async def test_correlation_id_is_per_message_and_task():
+    a, b = InboundMessage("http", "u", "c", "hi"), InboundMessage("http", "u", "c", "hi")
+    assert a.correlation_id != b.correlation_id
+    assert _reply_to(a, "yo").correlation_id == a.correlation_id
+
+    async def handle(message):
+        correlation_id.set(message.correlation_id)
+        await asyncio.sleep(0)
+        return correlation_id.get()
+
+    assert await asyncio.gather(handle(a), handle(b)) == [a.correlation_id, b.correlation_id]
+    assert correlation_id.get() is None
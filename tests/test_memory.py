@@ -1,5 +1,10 @@
 """Tests for MEMORY.md and HISTORY.md persistence."""
 
+import asyncio
+import gzip
+import os
+import time
+
 from caveclaw import memory
 
 
@@ -42,3 +47,167 @@ def test_history_append_format(tmp_path):
     assert text.startswith("- [")
     assert "test event" in text
     assert text.endswith("\n")
+
+
+# --- Structured memory ---
+
+GROCERY_MEMORY = """\
+Household of two; vegetarian.
+
+## Preferences
+- No cilantro
+- Oat milk, never dairy
+
+## Grocery List
+
+### Trader Joe's
+- [ ] Eggs (dozen)
+- [ ] Orange juice
+
+### Safeway
+- [ ] Paper towels
+- [ ] Dish soap
+
+## Core
+- Budget is $150 per week
+"""
+
+
+def test_parse_memory_items_and_headings():
+    items = memory.parse_memory(GROCERY_MEMORY)
+    texts = [i.text for i in items]
+    assert "- [ ] Paper towels" in texts
+    towels = items[texts.index("- [ ] Paper towels")]
+    assert towels.headings == ("## Grocery List", "### Safeway")
+    assert not towels.pinned
+
+
+def test_parse_memory_pins_preamble_and_core():
+    pinned = [i.text for i in memory.parse_memory(GROCERY_MEMORY) if i.pinned]
+    assert pinned == ["Household of two; vegetarian.", "- Budget is $150 per week"]
+
+
+def test_parse_memory_keeps_code_blocks_whole():
+    items = memory.parse_memory("## Notes\n```\n- not a bullet\n\nstill code\n```\n- real bullet\n")
+    assert items[0].text == "```\n- not a bullet\n\nstill code\n```"
+    assert items[1].text == "- real bullet"
+
+
+def test_index_ranks_relevant_items():
+    index = memory.MemoryIndex(memory.parse_memory(GROCERY_MEMORY))
+    results = index.search("do we need dish soap?", top_k=2)
+    assert results[0][1].text == "- [ ] Dish soap"
+
+
+def test_select_memory_returns_whole_file_within_budget(tmp_path):
+    memory.write_memory(tmp_path, GROCERY_MEMORY)
+    selected = memory.select_memory(tmp_path, "anything", token_budget=10_000)
+    assert "Paper towels" in selected
+    assert memory.PARTIAL_MEMORY_NOTE not in selected
+
+
+def test_select_memory_bounds_prompt_size(tmp_path):
+    filler = "\n".join(f"- note {i} about the garden shed" for i in range(2000))
+    memory.write_memory(tmp_path, GROCERY_MEMORY + "\n## Misc\n" + filler)
+    selected = memory.select_memory(tmp_path, "dish soap", top_k=3, token_budget=200)
+    assert memory.estimate_tokens(selected) < 250
+    assert "Dish soap" in selected
+    assert "### Safeway" in selected
+    assert "Budget is $150" in selected  # pinned core always included
+    assert memory.PARTIAL_MEMORY_NOTE in selected
+
+
+def test_memory_index_is_cached_until_file_changes(tmp_path):
+    memory.write_memory(tmp_path, "- first")
+    index = memory.memory_index(tmp_path)
+    assert memory.memory_index(tmp_path) is index
+    memory.write_memory(tmp_path, "- first\n- second item")
+    assert memory.memory_index(tmp_path) is not index
+
+
+# --- Buffered, rotating history ---
+
+
+def test_read_history_tail(tmp_path):
+    for i in range(1000):
+        memory.append_history(tmp_path, f"event {i}")
+    tail = memory.read_history(tmp_path, tail=3).splitlines()
+    assert len(tail) == 3
+    assert tail[-1].endswith("event 999")
+    assert tail[0].endswith("event 997")
+
+
+def test_read_history_tail_short_file(tmp_path):
+    memory.append_history(tmp_path, "only")
+    assert memory.read_history(tmp_path, tail=10) == memory.read_history(tmp_path)
+
+
+def test_read_history_range(tmp_path):
+    for i in range(10):
+        memory.append_history(tmp_path, f"event {i}")
+    lines = memory.read_history_range(tmp_path, 2, 4)
+    assert [line.split("] ")[1].strip() for line in lines] == ["event 2", "event 3"]
+    assert memory.read_history_range(tmp_path / "missing", 0) == []
+
+
+async def test_flusher_buffers_appends(tmp_path):
+    flusher = asyncio.create_task(memory.run_history_flusher(interval=3600))
+    await asyncio.sleep(0)
+    memory.append_history(tmp_path, "buffered")
+    assert memory.read_history(tmp_path) == ""
+    flusher.cancel()
+    await asyncio.gather(flusher, return_exceptions=True)
+    assert "buffered" in memory.read_history(tmp_path)
+
+
+async def test_flusher_wakes_on_size_threshold(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory, "HISTORY_FLUSH_BYTES", 100)
+    flusher = asyncio.create_task(memory.run_history_flusher(interval=3600))
+    await asyncio.sleep(0)
+    for i in range(5):
+        memory.append_history(tmp_path, f"event {i}")
+    await asyncio.sleep(0.1)
+    assert "event 4" in memory.read_history(tmp_path)
+    flusher.cancel()
+    await asyncio.gather(flusher, return_exceptions=True)
+
+
+async def test_flusher_survives_write_errors(tmp_path, caplog):
+    blocked = tmp_path / "blocked"
+    blocked.write_text("")  # a file where the workspace directory should be
+    flusher = asyncio.create_task(memory.run_history_flusher(interval=0.01))
+    await asyncio.sleep(0)
+    memory.append_history(blocked, "lost")
+    memory.append_history(tmp_path / "ok", "kept")
+    await asyncio.sleep(0.1)
+    assert not flusher.done()
+    assert "Writing HISTORY.md" in caplog.text
+    assert "kept" in memory.read_history(tmp_path / "ok")
+    memory.append_history(tmp_path / "ok", "later")
+    await asyncio.sleep(0.1)
+    assert "later" in memory.read_history(tmp_path / "ok")
+    flusher.cancel()
+    await asyncio.gather(flusher, return_exceptions=True)
+
+
+def test_history_rotates_by_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory, "HISTORY_MAX_BYTES", 200)
+    for i in range(20):
+        memory.append_history(tmp_path, f"event {i:02d} " + "x" * 20)
+    archives = memory.history_archives(tmp_path)
+    assert archives
+    archived = "".join(gzip.open(a, "rt").read() for a in archives)
+    combined = archived + memory.read_history(tmp_path)
+    assert combined.count("event") == 20
+    assert len(memory.read_history(tmp_path)) < 200 + 50
+
+
+def test_history_rotates_daily(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory, "HISTORY_ROTATE_DAILY", True)
+    memory.append_history(tmp_path, "yesterday")
+    old = time.time() - 2 * 24 * 3600
+    os.utime(tmp_path / "HISTORY.md", (old, old))
+    memory.append_history(tmp_path, "today")
+    assert len(memory.history_archives(tmp_path)) == 1
+    assert "yesterday" not in memory.read_history(tmp_path)
+    assert "today" in memory.read_history(tmp_path)
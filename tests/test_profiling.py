@@ -0,0 +1,72 @@
+"""Tests for live profiling."""
+
+import asyncio
+import os
+import signal
+import time
+
+import pytest
+
+from caveclaw import profiling
+from caveclaw.profiling import Profiler
+
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    n = 0
+    while time.perf_counter() < end:
+        n += 1
+    return n
+
+
+def test_cpu_profile_writes_report_and_folded_stacks(tmp_path):
+    prof = Profiler(tmp_path)
+    assert "started" in prof.toggle_cpu()
+    assert "running" in prof.status()
+    spin(0.2)
+    message = prof.toggle_cpu()
+    [report] = tmp_path.glob("cpu-*.txt")
+    assert str(report) in message
+    text = report.read_text()
+    assert "spin (test_profiling.py" in text
+    folded = report.with_suffix(".folded").read_text()
+    assert any(line.startswith("MainThread;") and "spin" in line for line in folded.splitlines())
+    assert "CPU profiler: off" in prof.status()
+
+
+def test_memory_snapshots_diff_against_previous(tmp_path):
+    prof = Profiler(tmp_path)
+    try:
+        assert "started" in prof.memory_snapshot()
+        hoard = [bytearray(1000) for _ in range(2000)]
+        prof.memory_snapshot()
+        [report] = tmp_path.glob("mem-*.txt")
+        text = report.read_text()
+        assert "changes since the previous snapshot" in text
+        assert "test_profiling.py" in text
+        del hoard
+    finally:
+        assert prof.stop_memory() == "Memory tracing stopped."
+
+
+async def test_run_action_rejects_unknown():
+    assert "Unknown profile action" in await profiling.run_action("nope")
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGUSR1"), reason="Unix signals only")
+async def test_sigusr1_toggles_cpu_profiler(monkeypatch, tmp_path):
+    prof = Profiler(tmp_path)
+    monkeypatch.setattr(profiling, "profiler", prof)
+    assert profiling.install_signal_handlers()
+    try:
+        os.kill(os.getpid(), signal.SIGUSR1)
+        await asyncio.sleep(0.05)
+        assert prof.sampler is not None
+        os.kill(os.getpid(), signal.SIGUSR1)
+        await asyncio.sleep(0.1)
+        assert prof.sampler is None
+        assert list(tmp_path.glob("cpu-*.txt"))
+    finally:
+        loop = asyncio.get_running_loop()
+        loop.remove_signal_handler(signal.SIGUSR1)
+        loop.remove_signal_handler(signal.SIGUSR2)
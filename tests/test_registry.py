@@ -0,0 +1,89 @@
+"""Tests for the in-process agent registry."""
+
+import os
+
+import pytest
+
+import caveclaw.config as config_mod
+from caveclaw.config import AgentConfig, Config
+from caveclaw.registry import AgentRegistry
+
+
+@pytest.fixture
+def agents(monkeypatch, tmp_path, templates_dir):
+    agents = tmp_path / "agents"
+    monkeypatch.setattr(config_mod, "AGENTS_DIR", agents)
+    monkeypatch.setattr(config_mod, "TEMPLATES_DIR", templates_dir)
+    return agents
+
+
+def _touch(path, text):
+    """Write `text` and bump the mtime so the change is visible at any resolution."""
+    before = path.stat().st_mtime_ns if path.exists() else 0
+    path.write_text(text)
+    os.utime(path, ns=(before + 10**9, before + 10**9))
+
+
+def test_get_provisions_and_caches(agents):
+    reg = AgentRegistry(check_interval=60)
+    config = Config(agents={"claw": AgentConfig(model="claude-opus-4-6")})
+    agent = reg.get(config, "claw")
+    assert agent.model == "claude-opus-4-6"
+    assert agent.workspace == agents / "claw"
+    assert "You are claw" in agent.soul
+    assert agent.sdk_options["permission_mode"] == "bypassPermissions"
+    assert reg.get(config, "claw") is agent
+
+
+def test_cached_descriptor_ignores_edits_until_invalidated(agents):
+    reg = AgentRegistry(check_interval=60)
+    config = Config()
+    agent = reg.get(config, "claw")
+    _touch(agent.workspace / "SOUL.md", "# Soul\n\nYou are Rex.\n")
+    assert reg.get(config, "claw") is agent
+    reg.invalidate("claw")
+    assert "Rex" in reg.get(config, "claw").soul
+
+
+def test_refresh_rereads_only_changed_files(agents):
+    reg = AgentRegistry(check_interval=0)
+    config = Config()
+    agent = reg.get(config, "claw")
+    _touch(agent.workspace / "MEMORY.md", "user likes tea")
+    updated = reg.get(config, "claw")
+    assert updated is not agent
+    assert updated.memory == "user likes tea"
+    assert updated.soul is agent.soul
+    assert updated.sdk_options is agent.sdk_options
+    assert reg.get(config, "claw") is updated
+
+
+def test_tools_front_matter_feeds_sdk_options(agents):
+    reg = AgentRegistry(check_interval=0)
+    config = Config(agents={"claw": AgentConfig(max_turns=5)})
+    agent = reg.get(config, "claw")
+    _touch(agent.workspace / "TOOLS.md", "---\ndisallowed_tools: [WebFetch]\n---\n# Tools\n")
+    agent = reg.get(config, "claw")
+    assert agent.sdk_options["disallowed_tools"] == ["WebFetch"]
+    assert agent.sdk_options["max_turns"] == 5
+    assert agent.tools == "# Tools\n"
+
+
+def test_new_config_rebuilds_descriptors(agents):
+    reg = AgentRegistry(check_interval=60)
+    first = reg.get(Config(), "claw")
+    second = reg.get(Config(model="claude-haiku-4-5"), "claw")
+    assert first.model != second.model == "claude-haiku-4-5"
+
+
+def test_structured_system_prompt_uses_index(agents):
+    reg = AgentRegistry(check_interval=0)
+    notes = "\n".join(f"- fact {i} about topic{i}" for i in range(500))
+    config = Config(agents={"claw": AgentConfig(memory_mode="structured", memory_token_budget=100)})
+    workspace = reg.get(config, "claw").workspace
+    _touch(workspace / "MEMORY.md", f"## Core\n- user is Sam\n\n## Notes\n{notes}")
+    prompt = reg.get(config, "claw").system_prompt("tell me about topic42")
+    assert "You are claw" in prompt
+    assert "user is Sam" in prompt
+    assert "fact 42 about topic42" in prompt
+    assert "topic43" not in prompt
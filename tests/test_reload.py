@@ -0,0 +1,92 @@
+"""Tests for config hot-reload."""
+
+import asyncio
+import json
+import logging
+import os
+
+import pytest
+
+from caveclaw.agent import agent_loop
+from caveclaw.bus import InboundMessage
+from caveclaw.config import AgentConfig, Config
+from caveclaw.reload import ConfigWatcher, diff_config
+
+
+def _write(path, data):
+    before = path.stat().st_mtime_ns if path.exists() else 0
+    path.write_text(json.dumps(data))
+    os.utime(path, ns=(before + 10**9, before + 10**9))
+
+
+@pytest.fixture
+def cfg_path(tmp_path):
+    path = tmp_path / "config.json"
+    _write(path, {"model": "claude-sonnet-4-6"})
+    return path
+
+
+def test_diff_config_lists_changes_and_redacts_token():
+    old = Config(discord_token="abc")
+    new = Config(
+        discord_token="xyz",
+        default_agent="shadow",
+        agents={"grocer": AgentConfig(model="claude-haiku-4-5")},
+    )
+    lines = diff_config(old, new)
+    assert "default_agent: 'claw' -> 'shadow'" in lines
+    assert "discord_token: '***' -> '***' (restart required)" in lines
+    assert any(line.startswith("agents.grocer.model: None -> 'claude-haiku-4-5'") for line in lines)
+    assert diff_config(old, old) == []
+
+
+def test_diff_config_redacts_http_token():
+    lines = diff_config(Config(http_token="old-secret"), Config(http_token="new-secret"))
+    assert lines == ["http_token: '***' -> '***'"]
+    assert diff_config(Config(), Config(http_token="s3cret")) == ["http_token: None -> '***'"]
+
+
+def test_check_swaps_snapshot_on_change(cfg_path, caplog):
+    caplog.set_level(logging.INFO)
+    watcher = ConfigWatcher(Config(), cfg_path)
+    assert not watcher.check()
+    first = watcher.current
+    _write(cfg_path, {"discord_routing": {"123": "grocer"}})
+    assert watcher.check()
+    assert watcher.current is not first
+    assert watcher.current.discord_routing == {"123": "grocer"}
+    assert "discord_routing.123: None -> 'grocer'" in caplog.text
+
+
+def test_check_keeps_snapshot_on_invalid_file(cfg_path, caplog):
+    watcher = ConfigWatcher(Config(), cfg_path)
+    current = watcher.current
+    cfg_path.write_text("{not json")
+    os.utime(cfg_path, ns=(1, 1))
+    assert not watcher.check()
+    _write(cfg_path, {"discord_max_chunks": "lots"})
+    assert not watcher.check()
+    assert watcher.current is current
+    assert caplog.text.count("Ignoring invalid") == 2
+
+
+async def test_agent_loop_uses_latest_snapshot(monkeypatch, bus, cfg_path):
+    import caveclaw.agent as agent_mod
+
+    seen = []
+
+    async def fake_handle(message, config, bus, client_factory=None, plan=None):
+        seen.append(config.default_agent)
+
+    monkeypatch.setattr(agent_mod, "handle_message", fake_handle)
+    watcher = ConfigWatcher(Config(), cfg_path)
+    loop = asyncio.create_task(agent_loop(watcher.current, bus, watcher))
+    msg = InboundMessage(channel="test", sender_id="u", chat_id="c", content="hi")
+    await bus.publish_inbound(msg)
+    await asyncio.sleep(0.01)
+    _write(cfg_path, {"default_agent": "shadow"})
+    watcher.check()
+    await bus.publish_inbound(msg)
+    await asyncio.sleep(0.01)
+    loop.cancel()
+    assert seen == ["claw", "shadow"]
@@ -0,0 +1,53 @@
+"""Tests for model routing."""
+
+from caveclaw.router import RoutingRules, route_message
+
+RULES = RoutingRules(fast_model="claude-haiku-4-5", max_chars=40, max_history=10)
+MAIN = "claude-sonnet-4-6"
+
+
+def _route(content, attachments=False, history=0, rules=RULES):
+    return route_message(content, attachments, history, MAIN, rules)
+
+
+def test_short_turns_go_fast():
+    route = _route("thanks, got it")
+    assert (route.model, route.tier, route.reason) == ("claude-haiku-4-5", "fast", "keyword:thanks")
+    assert _route("add milk").reason == "short"
+
+
+def test_work_goes_to_configured_model():
+    assert _route("short", attachments=True).reason == "attachments"
+    assert _route("fix ```x = 1```").reason == "code"
+    assert _route("Why is the sky blue?").reason == "keyword:why"
+    assert _route("x" * 41).reason == "length"
+    assert _route("add milk", history=11).reason == "history"
+    assert all(_route(c).model == MAIN for c in ("Explain this", "x" * 41))
+
+
+def test_keywords_match_whole_words():
+    assert _route("nowhere").reason == "short"  # contains "how"
+    assert _route("Thank you!").reason == "keyword:thank you"
+
+
+def test_fast_keyword_still_respects_length_cap():
+    assert _route("thanks " + "x" * 100).reason == "length"
+
+
+def test_fast_keywords_never_override_history_or_length():
+    rules = RoutingRules(fast_model="claude-haiku-4-5")
+    tax = (
+        "Thanks. No wait, one more: if I add the home office deduction and the mileage, "
+        "does that change my quarterly estimate, and should I file the state return separately?"
+    )
+    assert 160 < len(tax) <= 320
+    assert _route(tax, history=100, rules=rules).reason == "history"
+    assert _route(tax, rules=rules).reason == "length"
+    memo = "ok so now summarize the last three meetings into a memo for the team, with action items and owners"
+    assert _route(memo, history=100, rules=rules).reason == "history"
+    assert _route("thanks!", history=100, rules=rules).reason == "history"
+
+
+def test_default_fast_keywords_skip_ambiguous_words():
+    rules = RoutingRules(fast_model="claude-haiku-4-5")
+    assert not {"ok", "no", "yes", "add", "remove"} & set(rules.fast_keywords)
@@ -0,0 +1,156 @@
+"""Tests for cron parsing and the task scheduler."""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+import caveclaw.db as db_mod
+from caveclaw.bus import MessageBus, OutboundMessage
+from caveclaw.config import Config
+from caveclaw.scheduler import CronExpr, Scheduler, parse_cron
+
+
+@pytest.fixture(autouse=True)
+def _isolate_db(monkeypatch, tmp_path):
+    monkeypatch.setattr(db_mod, "DB_PATH", tmp_path / "test.db")
+    db_mod.init_db()
+
+
+def _ts(*args) -> float:
+    return datetime(*args).timestamp()
+
+
+class FakeClock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+# --- CronExpr ---
+
+
+def test_cron_every_minute():
+    assert parse_cron("* * * * *").next_after(_ts(2026, 1, 1, 10, 0, 30)) == _ts(2026, 1, 1, 10, 1)
+
+
+def test_cron_daily_at_nine():
+    cron = parse_cron("0 9 * * *")
+    assert cron.next_after(_ts(2026, 1, 1, 8, 59)) == _ts(2026, 1, 1, 9, 0)
+    assert cron.next_after(_ts(2026, 1, 1, 9, 0)) == _ts(2026, 1, 2, 9, 0)
+
+
+def test_cron_steps_ranges_and_lists():
+    cron = CronExpr("*/15 8-10 * * *")
+    assert cron.minutes == (0, 15, 30, 45)
+    assert cron.hours == (8, 9, 10)
+    assert cron.next_after(_ts(2026, 1, 1, 10, 50)) == _ts(2026, 1, 2, 8, 0)
+    assert CronExpr("5,10 * * * *").minutes == (5, 10)
+
+
+def test_cron_weekday_names_and_sunday_alias():
+    # 2026-01-03 is a Saturday
+    assert parse_cron("0 9 * * mon-fri").next_after(_ts(2026, 1, 3, 0, 0)) == _ts(2026, 1, 5, 9, 0)
+    assert CronExpr("0 0 * * 7").weekdays == (0,)
+
+
+def test_cron_day_or_weekday_when_both_restricted():
+    # 1st of the month OR Monday; 2026-01-05 is a Monday
+    cron = parse_cron("0 0 1 * mon")
+    assert cron.next_after(_ts(2026, 1, 1, 12, 0)) == _ts(2026, 1, 5, 0, 0)
+
+
+def test_cron_month_rollover_and_macros():
+    assert parse_cron("@monthly").next_after(_ts(2026, 12, 15)) == _ts(2027, 1, 1)
+    assert parse_cron("0 0 29 2 *").next_after(_ts(2026, 3, 1)) == _ts(2028, 2, 29)
+
+
+def test_cron_invalid():
+    with pytest.raises(ValueError):
+        CronExpr("* * * *")
+    with pytest.raises(ValueError):
+        CronExpr("60 * * * *")
+    with pytest.raises(ValueError):
+        CronExpr("0 0 31 2 *").next_after(_ts(2026, 1, 1))
+
+
+def test_parse_cron_is_cached():
+    assert parse_cron("0 * * * *") is parse_cron("0 * * * *")
+
+
+# --- Scheduler ---
+
+
+def _scheduler(now: float) -> tuple[Scheduler, FakeClock]:
+    clock = FakeClock(now)
+    return Scheduler(Config(), MessageBus(), clock=clock), clock
+
+
+def test_scheduler_orders_by_next_fire():
+    db_mod.add_task("hourly", "0 * * * *", "a")
+    db_mod.add_task("quarter", "*/15 * * * *", "b")
+    sched, clock = _scheduler(_ts(2026, 1, 1, 10, 1))
+    with db_mod._db().write() as conn:
+        conn.execute("UPDATE scheduled_tasks SET last_run_at = ?", (clock.now,))
+    sched.load()
+    assert sched.next_fire() == _ts(2026, 1, 1, 10, 15)
+
+    clock.now = _ts(2026, 1, 1, 10, 15)
+    due = sched.pop_due()
+    assert [t["name"] for _, t in due] == ["quarter"]
+    assert sched.next_fire() == _ts(2026, 1, 1, 10, 30)
+
+
+@pytest.mark.parametrize("policy, expected", [("skip", 0), ("once", 1), ("all", 3)])
+def test_scheduler_misfire_policies(policy, expected):
+    task_id = db_mod.add_task("t", "0 * * * *", "cmd", misfire=policy)
+    db_mod.start_task_run(task_id, _ts(2026, 1, 1, 9, 0))
+    # Down from 09:00 until 12:30 — missed 10:00, 11:00 and 12:00
+    sched, _ = _scheduler(_ts(2026, 1, 1, 12, 30))
+    sched.load()
+    assert len(sched.pop_due()) == expected
+    assert sched.next_fire() == _ts(2026, 1, 1, 13, 0)
+
+
+def test_scheduler_skips_invalid_cron():
+    db_mod.add_task("bad", "not a cron", "cmd")
+    sched, _ = _scheduler(_ts(2026, 1, 1))
+    sched.load()
+    assert sched.next_fire() is None
+
+
+async def test_execute_dispatches_and_records_run():
+    task_id = db_mod.add_task("digest", "0 9 * * *", "summarize the news", agent="shadow")
+    sched, clock = _scheduler(_ts(2026, 1, 1, 9, 0))
+    bus = sched.bus
+
+    async def fake_agent():
+        msg = await bus.consume_inbound()
+        assert msg.agent_name == "shadow"
+        assert msg.content == "summarize the news"
+        await bus.publish_outbound(OutboundMessage(channel=msg.channel, chat_id=msg.chat_id, content="done"))
+
+    agent = asyncio.create_task(fake_agent())
+    result = await sched.execute(db_mod.get_task(task_id), _ts(2026, 1, 1, 9, 0))
+    await agent
+    assert result == "done"
+    # Replies to the scheduler channel are not queued for delivery
+    assert bus._outbound.empty()
+
+    [run] = db_mod.get_task_runs(task_id)
+    assert run["result"] == "done"
+    assert run["finished_at"] is not None
+    assert db_mod.get_task(task_id)["last_run_at"] == _ts(2026, 1, 1, 9, 0)
+
+
+async def test_run_reloads_when_tasks_change():
+    sched = Scheduler(Config(), MessageBus(), refresh_seconds=0.01)
+    runner = asyncio.create_task(sched.run())
+    await asyncio.sleep(0.05)
+    assert sched.next_fire() is None
+    db_mod.add_task("new", "0 * * * *", "cmd", misfire="skip")
+    await asyncio.sleep(0.1)
+    runner.cancel()
+    assert sched.next_fire() is not None
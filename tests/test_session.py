@@ -2,20 +2,20 @@
 
 import json
 
-from caveclaw import session
+from caveclaw import db, jsonl, session
 
 
 def test_get_or_create_creates_file(tmp_path):
     sessions_dir = tmp_path / "sessions"
     path = session.get_or_create("chat1", sessions_dir)
     assert path.exists()
-    assert path.parent == sessions_dir
+    assert path.parent.parent == sessions_dir
 
 
 def test_append_writes_jsonl(tmp_path):
     sessions_dir = tmp_path / "sessions"
     session.append("chat1", "user", "hello", sessions_dir=sessions_dir)
-    path = sessions_dir / "chat1.jsonl"
+    path = session._session_path("chat1", sessions_dir)
     line = json.loads(path.read_text().strip())
     assert line["role"] == "user"
     assert line["content"] == "hello"
@@ -26,7 +26,7 @@ def test_append_with_attachments(tmp_path):
     sessions_dir = tmp_path / "sessions"
     att = [{"filename": "pic.png", "path": "/tmp/pic.png", "content_type": "image/png", "size": 100}]
     session.append("chat1", "user", "see image", sessions_dir=sessions_dir, attachments=att)
-    path = sessions_dir / "chat1.jsonl"
+    path = session._session_path("chat1", sessions_dir)
     line = json.loads(path.read_text().strip())
     assert line["attachments"] == att
 
@@ -34,7 +34,7 @@ def test_append_with_attachments(tmp_path):
 def test_append_without_attachments_omits_key(tmp_path):
     sessions_dir = tmp_path / "sessions"
     session.append("chat1", "user", "hi", sessions_dir=sessions_dir)
-    path = sessions_dir / "chat1.jsonl"
+    path = session._session_path("chat1", sessions_dir)
     line = json.loads(path.read_text().strip())
     assert "attachments" not in line
 
@@ -66,3 +66,83 @@ def test_get_history_missing_session(tmp_path):
 
 def test_get_history_none_sessions_dir():
     assert session.get_history("anything") == []
+
+
+def test_get_entries_returns_typed_records(tmp_path):
+    sessions_dir = tmp_path / "sessions"
+    session.append("chat1", "assistant", "hi", sessions_dir=sessions_dir, meta={"model": "fast"})
+    [entry] = session.get_entries("chat1", sessions_dir=sessions_dir)
+    assert isinstance(entry, session.Entry)
+    assert (entry.role, entry.content, entry.attachments) == ("assistant", "hi", None)
+    assert entry.meta == {"model": "fast"}
+    assert not hasattr(entry, "__dict__")
+    # Meta fields stay flat on the line, as before
+    assert session.get_history("chat1", sessions_dir=sessions_dir)[0]["model"] == "fast"
+
+
+def test_get_entries_reads_only_the_tail(tmp_path):
+    sessions_dir = tmp_path / "sessions"
+    path = session.get_or_create("chat1", sessions_dir)
+    with path.open("a") as f:
+        for i in range(5000):
+            f.write(json.dumps({"ts": float(i), "role": "user", "content": f"msg-{i} ✓"}) + "\n")
+    entries = session.get_entries("chat1", limit=3, sessions_dir=sessions_dir)
+    assert [e.content for e in entries] == ["msg-4997 ✓", "msg-4998 ✓", "msg-4999 ✓"]
+
+
+def test_stdlib_codec_fallback(tmp_path, monkeypatch):
+    monkeypatch.setattr(jsonl, "orjson", None)
+    sessions_dir = tmp_path / "sessions"
+    session.append("chat1", "user", "héllo", sessions_dir=sessions_dir)
+    line = session._session_path("chat1", sessions_dir).read_text(encoding="utf-8")
+    assert "héllo" in line  # still human-readable
+    assert session.get_entries("chat1", sessions_dir=sessions_dir)[0].content == "héllo"
+
+
+def test_sessions_are_sharded(tmp_path):
+    sessions_dir = tmp_path / "sessions"
+    for i in range(20):
+        session.append(f"chat{i}", "user", "hi", sessions_dir=sessions_dir)
+    assert not list(sessions_dir.glob("*.jsonl"))
+    assert len(list(sessions_dir.glob("*/*.jsonl"))) == 20
+    assert len({p.name for p in sessions_dir.iterdir()}) > 1
+
+
+def test_flat_sessions_move_into_their_shard(tmp_path):
+    sessions_dir = tmp_path / "sessions"
+    sessions_dir.mkdir()
+    (sessions_dir / "old.jsonl").write_text(json.dumps({"ts": 1.0, "role": "user", "content": "hi"}) + "\n")
+    (sessions_dir / "old.summary.json").write_text("{}")
+    assert session.get_history("old", sessions_dir=sessions_dir)[0]["content"] == "hi"
+    path = session._session_path("old", sessions_dir)
+    assert path.parent != sessions_dir
+    assert path.with_name("old.summary.json").exists()
+    assert not (sessions_dir / "old.jsonl").exists()
+
+
+def test_append_updates_catalog(tmp_path):
+    sessions_dir = tmp_path / "sessions"
+    session.append("chat1", "user", "hello", sessions_dir=sessions_dir, agent="claw")
+    session.append("chat1", "assistant", "hi", sessions_dir=sessions_dir, agent="claw")
+    db.close_db()  # waits for the queued catalog writes
+    row = db.get_session("claw", "chat1")
+    assert row["messages"] == 2
+    assert row["bytes"] == session._session_path("chat1", sessions_dir).stat().st_size
+    assert row["first_ts"] <= row["last_ts"]
+
+
+def test_scan_and_remove(tmp_path):
+    sessions_dir = tmp_path / "sessions"
+    for key in ("a", "b"):
+        session.append(key, "user", "one", sessions_dir=sessions_dir)
+        session.append(key, "assistant", "two", sessions_dir=sessions_dir)
+    rows = sorted(session.scan(sessions_dir), key=lambda r: r["chat_id"])
+    assert [(r["chat_id"], r["messages"]) for r in rows] == [("a", 2), ("b", 2)]
+    db.replace_sessions("claw", rows)
+    assert {s["chat_id"] for s in db.list_sessions("claw")} == {"a", "b"}
+    assert db.list_sessions("claw", idle_before=0) == []
+
+    assert session.remove("a", sessions_dir) == rows[0]["bytes"]
+    assert session.get_history("a", sessions_dir=sessions_dir) == []
+    db.delete_sessions("claw", ["a"])
+    assert [s["chat_id"] for s in db.list_sessions()] == ["b"]
@@ -0,0 +1,32 @@
+"""Tests for CLI startup cost."""
+
+from caveclaw import startup
+
+SAMPLE = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   _io
+import time:       300 |        450 |     pydantic.version
+import time:       200 |        650 |   pydantic
+import time:      1000 |       1650 | caveclaw.config
+"""
+
+
+def test_parse_importtime():
+    timings = startup.parse_importtime(SAMPLE)
+    assert [t.module for t in timings] == ["_io", "pydantic.version", "pydantic", "caveclaw.config"]
+    assert timings[1].depth == 2
+    assert timings[3].depth == 0
+    assert startup.total_ms(timings) == 1.65
+    assert [t.module for t in startup.heaviest_packages(timings)] == ["pydantic", "_io"]
+
+
+def test_loaded_heavy_modules():
+    timings = startup.parse_importtime(SAMPLE + "import time:   5 |   5 | discord.ext\n")
+    assert startup.loaded_heavy_modules(timings) == ["discord"]
+
+
+def test_help_stays_within_import_budget():
+    timings = startup.measure(startup.TARGETS["caveclaw --help"])
+    assert timings, "no -X importtime output"
+    assert startup.loaded_heavy_modules(timings) == []
+    assert startup.total_ms(timings) < startup.HELP_BUDGET_MS
@@ -0,0 +1,101 @@
+"""Tests for rolling conversation summaries."""
+
+from typing import get_args
+
+import pytest
+from pydantic import ValidationError
+
+from caveclaw import session, summarize
+from caveclaw.config import Config
+
+
+def _chat(sessions_dir, n, key="chat1"):
+    for i in range(n):
+        session.append(key, "user" if i % 2 == 0 else "assistant", f"turn {i}", sessions_dir=sessions_dir)
+
+
+async def test_stub_summarizer_is_deterministic():
+    stub = summarize.StubSummarizer(width=10)
+    turns = [{"role": "user", "content": "hello   there world"}, {"role": "assistant", "content": "hi"}]
+    text = await stub.summarize("- earlier", turns)
+    assert text == "- earlier\n- User: hello ther\n- Assistant: hi"
+    assert await stub.summarize("- earlier", turns) == text
+
+
+def test_summary_round_trip(tmp_path):
+    summarize.save_summary("c", tmp_path, summarize.Summary("text", 12.5, 4))
+    assert summarize.load_summary("c", tmp_path) == summarize.Summary("text", 12.5, 4)
+    assert summarize.load_summary("missing", tmp_path) is None
+
+
+async def test_fold_skips_small_chats(tmp_path):
+    _chat(tmp_path, 5)
+    s = summarize.Summarizer(summarize.StubSummarizer(), after_turns=10, keep_turns=2)
+    s.maybe_schedule("chat1", tmp_path)
+    await s.wait()
+    assert summarize.load_summary("chat1", tmp_path) is None
+
+
+async def test_fold_keeps_recent_turns(tmp_path):
+    _chat(tmp_path, 12)
+    s = summarize.Summarizer(summarize.StubSummarizer(), after_turns=10, keep_turns=4)
+    s.maybe_schedule("chat1", tmp_path)
+    await s.wait()
+    summary = summarize.load_summary("chat1", tmp_path)
+    assert summary.turns == 8
+    assert "turn 7" in summary.text
+    assert "turn 8" not in summary.text
+    history = session.get_history("chat1", sessions_dir=tmp_path)
+    assert summary.upto_ts == history[7]["ts"]
+
+
+async def test_fold_is_incremental(tmp_path):
+    _chat(tmp_path, 12)
+    s = summarize.Summarizer(summarize.StubSummarizer(), after_turns=10, keep_turns=4)
+    s.maybe_schedule("chat1", tmp_path)
+    await s.wait()
+    _chat(tmp_path, 8, key="chat1")
+    s.maybe_schedule("chat1", tmp_path)
+    await s.wait()
+    summary = summarize.load_summary("chat1", tmp_path)
+    assert summary.turns == 16
+    assert summary.text.count("- User: turn 0") == 2  # old fold kept, new turns appended
+
+
+async def test_one_fold_per_chat_at_a_time(tmp_path):
+    _chat(tmp_path, 12)
+    s = summarize.Summarizer(summarize.StubSummarizer(), after_turns=10, keep_turns=4)
+    assert s.maybe_schedule("chat1", tmp_path) is not None
+    assert s.maybe_schedule("chat1", tmp_path) is None
+    await s.wait()
+
+
+async def test_failed_backend_leaves_summary_alone(tmp_path):
+    class Broken:
+        async def summarize(self, summary, turns):
+            raise RuntimeError("model down")
+
+    _chat(tmp_path, 12)
+    s = summarize.Summarizer(Broken(), after_turns=10, keep_turns=4)
+    s.maybe_schedule("chat1", tmp_path)
+    await s.wait()
+    assert summarize.load_summary("chat1", tmp_path) is None
+
+
+def test_get_summarizer_disabled_by_default():
+    assert summarize.get_summarizer(Config()) is None
+
+
+def test_get_summarizer_reuses_instance():
+    cfg = Config(summarize_after_turns=20, summarizer_backend="stub")
+    first = summarize.get_summarizer(cfg)
+    assert isinstance(first.backend, summarize.StubSummarizer)
+    assert summarize.get_summarizer(cfg) is first
+    assert summarize.get_summarizer(Config(summarize_after_turns=30, summarizer_backend="stub")) is not first
+
+
+def test_unknown_backend_is_rejected_by_config():
+    with pytest.raises(ValidationError):
+        Config(summarize_after_turns=5, summarizer_backend="nope")
+    # Every backend the config accepts exists
+    assert set(get_args(Config.model_fields["summarizer_backend"].annotation)) == set(summarize.BACKENDS)
@@ -47,6 +47,13 @@ def test_grocer_tools_mentions_sqlite():
     assert "SQLite" in content
 
 
+def test_grocer_tools_disables_web_tools():
+    from caveclaw.config import parse_front_matter
+
+    fields, _ = parse_front_matter((AGENTS_DIR / "grocer" / "TOOLS.md").read_text())
+    assert "WebSearch" in fields["disallowed_tools"]
+
+
 def test_all_agents_have_soul():
     for agent_dir in AGENTS_DIR.iterdir():
         if agent_dir.is_dir():
@@ -0,0 +1,44 @@
+"""Tests for the event-loop lag watchdog."""
+
+import asyncio
+import time
+
+from caveclaw import watchdog
+from caveclaw.watchdog import LoopWatchdog
+
+
+async def blocking_handler():
+    time.sleep(0.3)  # synchronous work on the loop
+
+
+async def test_watchdog_captures_blocking_coroutine(caplog):
+    dog = LoopWatchdog(threshold=0.1, interval=0.01)
+    runner = asyncio.create_task(dog.run())
+    await asyncio.sleep(0.05)
+    assert watchdog.active() is dog
+    await asyncio.create_task(blocking_handler(), name="handler-1")
+    await asyncio.sleep(0.05)
+    runner.cancel()
+    await asyncio.gather(runner, return_exceptions=True)
+
+    assert watchdog.active() is None
+    assert dog.stalls == 1
+    assert dog.captures == 1
+    stall = dog.last_stall
+    assert stall.task == "handler-1"
+    assert stall.coroutine == "blocking_handler"
+    assert "test_watchdog.py" in stall.frame and "blocking_handler" in stall.frame
+    assert "Event loop blocked" in caplog.text
+
+
+async def test_watchdog_stats_without_stalls():
+    dog = LoopWatchdog(threshold=1.0, interval=0.01)
+    runner = asyncio.create_task(dog.run())
+    await asyncio.sleep(0.1)
+    runner.cancel()
+    await asyncio.gather(runner, return_exceptions=True)
+    stats = dog.stats()
+    assert stats["samples"] >= 3
+    assert stats["stalls"] == stats["captures"] == 0
+    assert sum(stats["lag_buckets"].values()) == stats["samples"]
+    assert stats["last_stall"] is None